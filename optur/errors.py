@@ -4,6 +4,7 @@ ALREADY_EXISTS = 1
 NOT_FOUND = 2
 UNINITIALIZED = 3
 INCOMPATIBLE_SEARCHSPACE = 4
+CONFLICT = 5
 
 
 class PrunedException(Exception):
@@ -35,3 +36,8 @@ class UnInitializedError(StatusError):
 class InCompatibleSearchSpaceError(StatusError):
     def __init__(self, message: str) -> None:
         super().__init__(message, INCOMPATIBLE_SEARCHSPACE)
+
+
+class ConflictError(StatusError):
+    def __init__(self, message: str) -> None:
+        super().__init__(message, CONFLICT)
@@ -1,27 +1,37 @@
+from typing import Optional
+
 from optur.proto.sampler_pb2 import RandomSamplerConfig, SamplerConfig, TPESamplerConfig
+from optur.proto.study_pb2 import WorkerID
 from optur.samplers.random import RandomSampler
-from optur.samplers.sampler import Sampler
+from optur.samplers.sampler import Sampler, create_rng
 from optur.samplers.tpe import TPESampler
 
 
-def create_sampler(sampler_config: SamplerConfig) -> Sampler:
+def create_sampler(sampler_config: SamplerConfig, worker_id: Optional[WorkerID] = None) -> Sampler:
+    """Create a sampler from the config.
+
+    Samplers of different ``worker_id`` use independent random streams derived from
+    ``sampler_config.seed``. See :func:`~optur.samplers.sampler.create_rng`.
+    """
+    rng = create_rng(sampler_config=sampler_config, worker_id=worker_id)
     if sampler_config.HasField("random"):
-        return RandomSampler(sampler_config=sampler_config)
+        return RandomSampler(sampler_config=sampler_config, rng=rng)
     if sampler_config.HasField("tpe"):
-        return TPESampler(sampler_config=sampler_config)
+        return TPESampler(sampler_config=sampler_config, rng=rng)
     raise NotImplementedError("")  # TODO(tsuzuku)
 
 
-def create_random_sampler() -> Sampler:
-    return RandomSampler(sampler_config=SamplerConfig(random=RandomSamplerConfig()))
+def create_random_sampler(seed: Optional[int] = None) -> Sampler:
+    return RandomSampler(sampler_config=SamplerConfig(random=RandomSamplerConfig(), seed=seed))
 
 
-def create_tpe_sampler() -> Sampler:
+def create_tpe_sampler(seed: Optional[int] = None) -> Sampler:
     return TPESampler(
         sampler_config=SamplerConfig(
             tpe=TPESamplerConfig(
                 n_startup_trials=20,
                 n_ei_candidates=14,
-            )
+            ),
+            seed=seed,
         )
     )
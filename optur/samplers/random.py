@@ -1,37 +1,145 @@
-import random
-from typing import Optional, Sequence
+import math
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    import numpy.typing as npt
+except ImportError:
+    pass
 
 from optur.proto.sampler_pb2 import SamplerConfig
 from optur.proto.search_space_pb2 import Distribution, ParameterValue, SearchSpace
 from optur.proto.study_pb2 import Target
-from optur.samplers.sampler import Sampler
+from optur.samplers.sampler import JointSampleResult, Sampler
+
+
+def _is_supported(distribution: Distribution) -> bool:
+    return (
+        distribution.HasField("int_distribution")
+        or distribution.HasField("float_distribution")
+        or distribution.HasField("categorical_distribution")
+    )
+
+
+def _to_parameter_value(distribution: Distribution, sample: Any) -> ParameterValue:
+    if distribution.HasField("int_distribution"):
+        return ParameterValue(int_value=int(sample))
+    elif distribution.HasField("float_distribution"):
+        return ParameterValue(double_value=float(sample))
+    else:
+        assert distribution.HasField("categorical_distribution")
+        return distribution.categorical_distribution.choices[int(sample)]
 
 
 class RandomSampler(Sampler):
-    def __init__(self, sampler_config: SamplerConfig) -> None:
+    def __init__(
+        self, sampler_config: SamplerConfig, rng: Optional[np.random.Generator] = None
+    ) -> None:
         assert sampler_config.HasField("random")
-        super().__init__(sampler_config=sampler_config)
+        super().__init__(sampler_config=sampler_config, rng=rng)
+        self._search_space: Optional[SearchSpace] = None
 
     def init(self, search_space: Optional[SearchSpace], targets: Sequence[Target]) -> None:
-        pass
+        self._search_space = search_space
+
+    def joint_sample(
+        self,
+        fixed_parameters: Optional[Dict[str, ParameterValue]] = None,
+    ) -> JointSampleResult:
+        return self.joint_sample_batch(n=1, fixed_parameters=fixed_parameters)[0]
+
+    def joint_sample_batch(
+        self,
+        n: int,
+        fixed_parameters: Optional[Dict[str, ParameterValue]] = None,
+    ) -> List[JointSampleResult]:
+        """Sample all parameters in the search space by :meth:`sample_batch`.
+
+        When the search space is not given to :meth:`init`, parameters are sampled one by one
+        when they are suggested.
+        """
+        search_space = self._search_space or SearchSpace()
+        return [
+            JointSampleResult(parameters=parameters, system_attrs={})
+            for parameters in self.sample_parameters(
+                search_space=search_space, n=n, fixed_parameters=fixed_parameters
+            )
+        ]
+
+    def sample_parameters(
+        self,
+        search_space: SearchSpace,
+        n: int,
+        fixed_parameters: Optional[Dict[str, ParameterValue]] = None,
+    ) -> List[Dict[str, ParameterValue]]:
+        """Sample ``n`` sets of parameters in the search space.
+
+        Fixed parameters are included as they are, and parameters with unsupported
+        distributions are omitted.
+        """
+        fixed_parameters = fixed_parameters or {}
+        distributions = {
+            name: distribution
+            for name, distribution in search_space.distributions.items()
+            if name not in fixed_parameters and _is_supported(distribution)
+        }
+        samples = self.sample_batch(search_space=SearchSpace(distributions=distributions), n=n)
+        ret: List[Dict[str, ParameterValue]] = []
+        for idx in range(n):
+            parameters = {
+                name: _to_parameter_value(distribution, samples[name][idx])
+                for name, distribution in distributions.items()
+            }
+            parameters.update(fixed_parameters)
+            ret.append(parameters)
+        return ret
+
+    def sample_batch(self, search_space: SearchSpace, n: int) -> Dict[str, "npt.NDArray[Any]"]:
+        """Sample ``n`` values of each parameter in the search space.
+
+        Returns:
+            Mapping from parameter names to arrays of shape ``(n,)``.
+            Arrays of int and float distributions contain the values, and arrays of
+            categorical distributions contain indices of the choices.
+        """
+        return {
+            name: self._sample_array(distribution=distribution, n=n)
+            for name, distribution in search_space.distributions.items()
+        }
 
     def sample(self, distribution: Distribution) -> ParameterValue:
         """Sample a parameter."""
+        return _to_parameter_value(
+            distribution, self._sample_array(distribution=distribution, n=1)[0]
+        )
+
+    def _sample_array(self, distribution: Distribution, n: int) -> "npt.NDArray[Any]":
+        ret: "npt.NDArray[Any]"
         if distribution.HasField("int_distribution"):
-            # TODO(tsuzuku): Support log_scale.
-            int_value = random.randint(
-                distribution.int_distribution.low,
-                distribution.int_distribution.high,
+            int_d = distribution.int_distribution
+            if not int_d.log_scale:
+                ret = self._rng.integers(int_d.low, int_d.high, endpoint=True, size=n)
+                return ret
+            # Each integer takes the range of width one around it in the log scale.
+            values = np.exp(
+                self._rng.uniform(math.log(int_d.low - 0.5), math.log(int_d.high + 0.5), size=n)
             )
-            return ParameterValue(int_value=int_value)
+            ret = np.clip(np.round(values).astype(np.int64), int_d.low, int_d.high)
+            return ret
         elif distribution.HasField("float_distribution"):
-            # TODO(tsuzuku): Support log_scale.
-            double_value = (
-                distribution.float_distribution.low
-                + (distribution.float_distribution.high - distribution.float_distribution.low)
-                * random.random()
+            float_d = distribution.float_distribution
+            if not float_d.log_scale:
+                ret = float_d.low + (float_d.high - float_d.low) * self._rng.random(size=n)
+                return ret
+            values = np.exp(
+                self._rng.uniform(math.log(float_d.low), math.log(float_d.high), size=n)
             )
-            return ParameterValue(double_value=double_value)
+            # `exp(log(x))` might not be exactly `x`.
+            ret = np.clip(values, float_d.low, float_d.high)
+            return ret
         else:
             assert distribution.HasField("categorical_distribution")
-            return random.choice(distribution.categorical_distribution.choices)
+            choices = distribution.categorical_distribution.choices
+            ret = self._rng.integers(len(choices), size=n)
+            return ret
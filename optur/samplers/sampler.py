@@ -1,12 +1,15 @@
 import abc
-from typing import Dict, NamedTuple, Optional, Sequence
+import zlib
+from typing import Dict, List, NamedTuple, Optional, Sequence
 
+import numpy as np
 from google.protobuf.timestamp_pb2 import Timestamp
 
 from optur.proto.sampler_pb2 import SamplerConfig
 from optur.proto.search_space_pb2 import Distribution, ParameterValue, SearchSpace
 from optur.proto.study_pb2 import AttributeValue, Target
 from optur.proto.study_pb2 import Trial as TrialProto
+from optur.proto.study_pb2 import WorkerID
 
 
 class JointSampleResult(NamedTuple):
@@ -14,10 +17,47 @@ class JointSampleResult(NamedTuple):
     system_attrs: Dict[str, AttributeValue]
 
 
+def create_rng(
+    sampler_config: SamplerConfig, worker_id: Optional[WorkerID] = None
+) -> np.random.Generator:
+    """Create a random number generator for a sampler.
+
+    When ``sampler_config.seed`` is set, the generator of each worker uses a stream spawned
+    from the seed by the worker's ``client_id`` and ``thread_id``, so streams of workers are
+    independent and reproducible. When ``worker_id`` is :obj:`None`, the root stream is used.
+    Otherwise, the generator is seeded by the OS entropy.
+    """
+    if not sampler_config.HasField("seed"):
+        return np.random.default_rng()
+    if worker_id is None:
+        return np.random.default_rng(np.random.SeedSequence(sampler_config.seed))
+    # This is the same as spawning a child for the client and then a grandchild for the thread
+    # by `SeedSequence.spawn`, without creating the preceding siblings.
+    seed_sequence = np.random.SeedSequence(
+        sampler_config.seed,
+        spawn_key=(zlib.crc32(worker_id.client_id.encode()), worker_id.thread_id),
+    )
+    return np.random.default_rng(seed_sequence)
+
+
 class Sampler(abc.ABC):
-    def __init__(self, sampler_config: SamplerConfig) -> None:
+    """Base class of samplers.
+
+    Args:
+        sampler_config:
+            Configuration of the sampler.
+        rng:
+            A random number generator. Samplers must not use global random states so that
+            workers in different threads do not contend and results are reproducible.
+            Defaults to :func:`create_rng` of the ``sampler_config``.
+    """
+
+    def __init__(
+        self, sampler_config: SamplerConfig, rng: Optional[np.random.Generator] = None
+    ) -> None:
         self._sampler_config = sampler_config
         self._last_update_time: Optional[Timestamp] = None
+        self._rng = rng if rng is not None else create_rng(sampler_config=sampler_config)
 
     @property
     def last_update_time(self) -> Optional[Timestamp]:
@@ -61,6 +101,18 @@ class Sampler(abc.ABC):
             system_attrs={},
         )
 
+    def joint_sample_batch(
+        self,
+        n: int,
+        fixed_parameters: Optional[Dict[str, ParameterValue]] = None,
+    ) -> List[JointSampleResult]:
+        """Perform joint-sampling for ``n`` trials at once.
+
+        Samplers can override this method to share the computation among the trials.
+        The results should be as diverse as ``n`` independent calls of :meth:`joint_sample`.
+        """
+        return [self.joint_sample(fixed_parameters=fixed_parameters) for _ in range(n)]
+
     @abc.abstractclassmethod
     def sample(self, distribution: Distribution) -> ParameterValue:
         """Sample a parameter.
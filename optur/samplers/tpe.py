@@ -1,6 +1,6 @@
 import abc
 import math
-from typing import Any, Dict, Optional, Sequence
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
 
 import numpy as np
 
@@ -12,7 +12,6 @@ except ImportError:
 from optur.proto.sampler_pb2 import RandomSamplerConfig, SamplerConfig
 from optur.proto.search_space_pb2 import Distribution, ParameterValue, SearchSpace
 from optur.proto.study_pb2 import AttributeValue, Target
-from optur.proto.study_pb2 import Trial
 from optur.proto.study_pb2 import Trial as TrialProto
 from optur.samplers.random import RandomSampler
 from optur.samplers.sampler import JointSampleResult, Sampler
@@ -24,28 +23,48 @@ from optur.utils.sorted_trials import (
 )
 
 _N_RERFERENCED_TRIALS_KEY = "smpl.tpe.n"
+# The maximum number of elements of temporary arrays in `_UnivariateKDE.log_pdf`.
+_MAX_LOG_PDF_CHUNK_ELEMENTS = 1 << 20
 
 
 class TPESampler(Sampler):
-    def __init__(self, sampler_config: SamplerConfig) -> None:
-        super().__init__(sampler_config=sampler_config)
+    def __init__(
+        self, sampler_config: SamplerConfig, rng: Optional[np.random.Generator] = None
+    ) -> None:
+        super().__init__(sampler_config=sampler_config, rng=rng)
         assert sampler_config.HasField("tpe")
         assert sampler_config.tpe.n_ei_candidates > 0
         self._tpe_config = sampler_config.tpe
-        self._fallback_sampler = RandomSampler(SamplerConfig(random=RandomSamplerConfig()))
+        self._fallback_sampler = RandomSampler(
+            SamplerConfig(random=RandomSamplerConfig()), rng=self._rng
+        )
         self._search_space_tracker: Optional[SearchSpaceTracker] = None
         self._sorted_trials: Optional[SortedTrials] = None
+        self._observations = _ObservationColumns()
+        # Slots of `self._observations` in the order of `self._sorted_trials` and
+        # the generation of `self._sorted_trials` when the slots are computed.
+        self._sorted_slots: Optional[Tuple[int, "npt.NDArray[np.int_]"]] = None
+        # Alias tables of the weights of D_l and D_g, and the generations of
+        # `self._sorted_trials` and `self._observations` when the tables are built.
+        self._alias_tables: Optional[
+            Tuple[Tuple[int, int], Tuple["_AliasTable", "_AliasTable"]]
+        ] = None
 
     def init(self, search_space: Optional[SearchSpace], targets: Sequence[Target]) -> None:
         # We need to clear all caches because a set of "valid" past trials changes
         # by this operation.
-        self._fallback_sampler = RandomSampler(SamplerConfig(random=RandomSamplerConfig()))
+        self._fallback_sampler = RandomSampler(
+            SamplerConfig(random=RandomSamplerConfig()), rng=self._rng
+        )
         self._search_space_tracker = SearchSpaceTracker(search_space=search_space)
         self._sorted_trials = SortedTrials(
             trial_filter=TrialQualityFilter(filter_unknown=True),
             trial_key_generator=TrialKeyGenerator(targets),
             trial_comparator=None,
         )
+        self._observations = _ObservationColumns()
+        self._sorted_slots = None
+        self._alias_tables = None
         # We need all past trials in the next sync because we cleared the cache.
         self.update_timestamp(timestamp=None)
 
@@ -55,64 +74,194 @@ class TPESampler(Sampler):
         self._fallback_sampler.sync(trials=trials)
         self._sorted_trials.sync(trials=trials)
         self._search_space_tracker.sync(trials=trials)
+        self._observations.sync(trials=trials)
 
     def joint_sample(
         self,
         fixed_parameters: Optional[Dict[str, ParameterValue]] = None,
     ) -> JointSampleResult:
+        return self.joint_sample_batch(n=1, fixed_parameters=fixed_parameters)[0]
+
+    def joint_sample_batch(
+        self,
+        n: int,
+        fixed_parameters: Optional[Dict[str, ParameterValue]] = None,
+    ) -> List[JointSampleResult]:
+        assert self._sorted_trials is not None
+        assert self._search_space_tracker is not None
+        fixed_parameters = fixed_parameters or {}
+        search_space = self._search_space_tracker.current_search_space
+        # Trials prefetched by `Study.prefetch` have all parameters fixed. Skip building KDEs.
+        all_fixed = all(
+            name in fixed_parameters or distribution.HasField("unknown_distribution")
+            for name, distribution in search_space.distributions.items()
+        )
+        kdes = None if all_fixed else self._create_kdes()
+        if kdes is None:
+            # Startup trials draw the known part of the search space in a single batch.
+            return [
+                JointSampleResult(parameters=parameters, system_attrs={})
+                for parameters in self._fallback_sampler.sample_parameters(
+                    search_space=search_space, n=n, fixed_parameters=fixed_parameters
+                )
+            ]
+        kde_l, kde_g = kdes
+        # Draw `n_ei_candidates` candidates for each trial in a single pass, and pick the best
+        # one from each group so that the results are as diverse as independent calls.
+        n_candidates = self._tpe_config.n_ei_candidates
+        samples = kde_l.sample(
+            fixed_parameters=fixed_parameters, k=n * n_candidates, rng=self._rng
+        )
+        log_pdf_l = kde_l.log_pdf(samples)
+        log_pdf_g = kde_g.log_pdf(samples)
+        scores = (log_pdf_l - log_pdf_g).reshape(n, n_candidates)
+        best_sample_indices = np.argmax(scores, axis=1) + np.arange(n) * n_candidates
+        system_attrs = {
+            _N_RERFERENCED_TRIALS_KEY: AttributeValue(int_value=self._sorted_trials.n_trials()),
+        }
+        ret: List[JointSampleResult] = []
+        for best_sample_idx in best_sample_indices:
+            best_sample = {name: sample[best_sample_idx] for name, sample in samples.items()}
+            parameters = kde_l.sample_to_value(best_sample)
+            parameters.update(fixed_parameters)
+            ret.append(JointSampleResult(parameters=parameters, system_attrs=system_attrs.copy()))
+        return ret
+
+    def _create_kdes(self) -> Optional[Tuple["_UnivariateKDE", "_UnivariateKDE"]]:
         assert self._sorted_trials is not None
         assert self._search_space_tracker is not None
         sorted_trials = self._sorted_trials.to_list()
         if len(sorted_trials) < self._tpe_config.n_startup_trials:
-            return JointSampleResult(parameters={}, system_attrs={})
+            return None
         search_space = self._search_space_tracker.current_search_space
         # TODO(tsuzuku): Extend to MOTPE.
         half_idx = len(sorted_trials) // 2
         _less_half_trials = sorted_trials[:half_idx]
         _greater_half_trials = sorted_trials[half_idx:]
         if not _less_half_trials or not _greater_half_trials:
-            return JointSampleResult(parameters={}, system_attrs={})
+            return None
+        slots = self._get_sorted_slots()
+        weights_l = self._observations.weights(slots[:half_idx])
+        weights_g = self._observations.weights(slots[half_idx:])
+        # Weights do not change until the next sync, so the tables are reused until then.
+        generations = (self._sorted_trials.generation, self._observations.generation)
+        if self._alias_tables is None or self._alias_tables[0] != generations:
+            self._alias_tables = (generations, (_AliasTable(weights_l), _AliasTable(weights_g)))
+        alias_table_l, alias_table_g = self._alias_tables[1]
         kde_l = _UnivariateKDE(  # D_l
             search_space=search_space,
             trials=_less_half_trials,
-            weights=self._calculate_sample_weights(_less_half_trials),
+            weights=weights_l,
+            observations=self._observations.get(search_space, slots[:half_idx]),
+            alias_table=alias_table_l,
         )
         kde_g = _UnivariateKDE(  # D_g
             search_space=search_space,
             trials=_greater_half_trials,
-            weights=self._calculate_sample_weights(_greater_half_trials),
-        )
-        samples = kde_l.sample(
-            fixed_parameters=fixed_parameters or {}, k=self._tpe_config.n_ei_candidates
-        )
-        log_pdf_l = kde_l.log_pdf(samples)
-        log_pdf_g = kde_g.log_pdf(samples)
-        best_sample_idx = np.argmax(log_pdf_l - log_pdf_g)
-        best_sample = {name: sample[best_sample_idx] for name, sample in samples.items()}
-        return JointSampleResult(
-            parameters=kde_l.sample_to_value(best_sample),
-            system_attrs={
-                _N_RERFERENCED_TRIALS_KEY: AttributeValue(
-                    int_value=self._sorted_trials.n_trials()
-                ),
-            },
+            weights=weights_g,
+            observations=self._observations.get(search_space, slots[half_idx:]),
+            alias_table=alias_table_g,
         )
+        return kde_l, kde_g
+
+    def _get_sorted_slots(self) -> "npt.NDArray[np.int_]":
+        assert self._sorted_trials is not None
+        generation = self._sorted_trials.generation
+        if self._sorted_slots is None or self._sorted_slots[0] != generation:
+            self._sorted_slots = (
+                generation,
+                self._observations.slots(self._sorted_trials.to_list()),
+            )
+        return self._sorted_slots[1]
 
     def sample(self, distribution: Distribution) -> ParameterValue:
         return self._fallback_sampler.sample(distribution=distribution)
 
-    def _calculate_sample_weights(self, trials: Sequence[Trial]) -> "npt.NDArray[np.float64]":
-        weights: "npt.NDArray[np.float64]" = np.asarray(
-            [
-                trial.system_attrs[_N_RERFERENCED_TRIALS_KEY].int_value + 1
-                if _N_RERFERENCED_TRIALS_KEY in trial.system_attrs
-                else 1
-                for trial in trials
-            ],
-            dtype=np.float64,
+
+class _ObservationColumns:
+    """Parameter values of trials in columnar layout.
+
+    Each trial is assigned to a slot, and each column stores the values of a parameter
+    of all slots. Only trials passed to :meth:`sync` are read, so the cost of a sync is
+    proportional to the number of updated trials rather than all trials.
+    """
+
+    def __init__(self) -> None:
+        self._slots: Dict[str, int] = {}
+        # Mapping from a parameter name to values and whether the values are set.
+        self._values: Dict[str, "npt.NDArray[np.float64]"] = {}
+        self._valid: Dict[str, "npt.NDArray[np.bool_]"] = {}
+        # The number of trials that referred to the trial when it was sampled, plus one.
+        self._weights: "npt.NDArray[np.float64]" = np.ones(shape=(0,), dtype=np.float64)
+        # Incremented when the columns are updated.
+        self.generation = 0
+
+    def sync(self, trials: Sequence[TrialProto]) -> None:
+        if trials:
+            self.generation += 1
+        for trial in trials:
+            slot = self._slots.get(trial.trial_id)
+            if slot is None:
+                slot = len(self._slots)
+                self._slots[trial.trial_id] = slot
+                if slot >= len(self._weights):
+                    self._grow(2 * slot + 1)
+            else:
+                # Parameters might be removed in the new version of the trial.
+                for valid in self._valid.values():
+                    valid[slot] = False
+            for name, parameter in trial.parameters.items():
+                if name not in self._values:
+                    self._values[name] = np.ones_like(self._weights)
+                    self._valid[name] = np.zeros(shape=self._weights.shape, dtype=np.bool_)
+                value = parameter.value
+                if value.HasField("int_value"):
+                    self._values[name][slot] = value.int_value
+                elif value.HasField("double_value"):
+                    self._values[name][slot] = value.double_value
+                else:
+                    continue
+                self._valid[name][slot] = True
+            if _N_RERFERENCED_TRIALS_KEY in trial.system_attrs:
+                self._weights[slot] = trial.system_attrs[_N_RERFERENCED_TRIALS_KEY].int_value + 1
+            else:
+                self._weights[slot] = 1
+
+    def _grow(self, capacity: int) -> None:
+        def _resize(array: "npt.NDArray[Any]", fill_value: Any) -> "npt.NDArray[Any]":
+            ret = np.full(shape=(capacity,), fill_value=fill_value, dtype=array.dtype)
+            ret[: len(array)] = array
+            return ret
+
+        self._weights = _resize(self._weights, 1.0)
+        self._values = {name: _resize(values, 1.0) for name, values in self._values.items()}
+        self._valid = {name: _resize(valid, False) for name, valid in self._valid.items()}
+
+    def slots(self, trials: Sequence[TrialProto]) -> "npt.NDArray[np.int_]":
+        """Return slots of the trials. All trials must be synced beforehand."""
+        return np.fromiter(
+            (self._slots[trial.trial_id] for trial in trials), dtype=np.int64, count=len(trials)
         )
-        weights /= weights.sum()
-        return weights
+
+    def weights(self, slots: "npt.NDArray[np.int_]") -> "npt.NDArray[np.float64]":
+        weights = self._weights[slots]
+        ret: "npt.NDArray[np.float64]" = weights / weights.sum()
+        return ret
+
+    def get(
+        self, search_space: SearchSpace, slots: "npt.NDArray[np.int_]"
+    ) -> Dict[str, Tuple["npt.NDArray[np.float64]", "npt.NDArray[np.bool_]"]]:
+        """Return values of parameters in the search space and whether they are set."""
+        ret: Dict[str, Tuple["npt.NDArray[np.float64]", "npt.NDArray[np.bool_]"]] = {}
+        for name in search_space.distributions:
+            if name in self._values:
+                ret[name] = (self._values[name][slots], self._valid[name][slots])
+            else:
+                ret[name] = (
+                    np.ones(shape=slots.shape, dtype=np.float64),
+                    np.zeros(shape=slots.shape, dtype=np.bool_),
+                )
+        return ret
 
 
 # The Gaussian kernel is used for continuous parameters.
@@ -123,18 +272,25 @@ class _UnivariateKDE:
         search_space: SearchSpace,
         trials: Sequence[TrialProto],
         weights: "npt.NDArray[np.float64]",
+        observations: Optional[
+            Mapping[str, Tuple["npt.NDArray[np.float64]", "npt.NDArray[np.bool_]"]]
+        ] = None,
+        alias_table: Optional["_AliasTable"] = None,
     ) -> None:
         assert trials
         assert weights.shape == (len(trials),), str(weights.shape) + ":" + str(len(trials))
         self._search_space = search_space
         n_distribution = len(search_space.distributions)
         self.weights = weights
+        # Built lazily because KDEs used only for `log_pdf` do not need it.
+        self._alias_table = alias_table
         self._distributions: Dict[str, _MixturedDistribution] = {
             name: _MixturedDistribution(
                 name=name,
                 distribution=distribution,
                 trials=trials,
                 n_distribution=n_distribution,
+                observations=observations[name] if observations is not None else None,
             )
             for name, distribution in search_space.distributions.items()
             if not distribution.HasField("unknown_distribution")
@@ -147,29 +303,179 @@ class _UnivariateKDE:
         }
 
     def sample(
-        self, fixed_parameters: Dict[str, ParameterValue], k: int
+        self,
+        fixed_parameters: Dict[str, ParameterValue],
+        k: int,
+        rng: Optional[np.random.Generator] = None,
     ) -> Dict[str, "npt.NDArray[Any]"]:
+        if rng is None:
+            rng = np.random.default_rng()
         ret: Dict[str, "npt.NDArray[Any]"] = {}
         for name in self._distributions:
             if name in fixed_parameters:
-                raise NotImplementedError()
-            active = np.argmax(np.random.multinomial(1, self.weights, size=(k,)), axis=-1)
-            ret[name] = self._distributions[name].sample(active_indices=active)
+                # Fixed parameters take the same value in all samples, so they never
+                # change the ranking of the samples.
+                continue
+            if self._alias_table is None:
+                self._alias_table = _AliasTable(self.weights)
+            active = self._alias_table.sample(k, rng=rng)
+            ret[name] = self._distributions[name].sample(active_indices=active, rng=rng)
         return ret
 
-    def log_pdf(self, observations: Dict[str, "npt.NDArray[Any]"]) -> "npt.NDArray[np.float64]":
-        ret = np.zeros(shape=(1,))
-        weights = np.log(self.weights)[None]
-        for name, samples in observations.items():
-            log_pdf = self._distributions[name].log_pdf(samples)
-            # TODO(tsuzuku): Improve numerical stability.
-            ret = ret + np.log(np.exp(log_pdf + weights).sum(axis=1))
+    def log_pdf(
+        self, observations: Dict[str, "npt.NDArray[Any]"], chunk_size: Optional[int] = None
+    ) -> "npt.NDArray[np.float64]":
+        """Return the log-density of the samples.
+
+        Kernels of all parameters are evaluated together as a
+        ``(n_parameters, n_samples, chunk_size)`` array per chunk of trials, and the mixture
+        is reduced by a streaming log-sum-exp, so the peak memory is bounded by the chunk size
+        rather than the number of trials.
+
+        Args:
+            observations:
+                Mapping from parameter names to samples of shape ``(n_samples,)``.
+            chunk_size:
+                The number of trials evaluated at once. When this argument is :obj:`None`,
+                it's chosen so that the temporary arrays have at most
+                ``_MAX_LOG_PDF_CHUNK_ELEMENTS`` elements.
+        """
+        if not observations:
+            return np.zeros(shape=(1,))
+        distributions = [self._distributions[name] for name in observations]
+        kernels = [distribution.kernel for distribution in distributions]
+        x = np.stack(
+            [
+                distribution.to_kernel_space(samples)
+                for distribution, samples in zip(distributions, observations.values())
+            ]
+        )
+        log_weights = np.log(self.weights)
+        logistic_kernels = [
+            kernel
+            for kernel in kernels
+            if isinstance(kernel, _TruncatedLogisticMixturedDistribution)
+        ]
+        if len(logistic_kernels) != len(kernels):
+            ret: "npt.NDArray[np.float64]" = np.zeros(shape=x.shape[1:])
+            for kernel, x_d in zip(kernels, x):
+                ret += _logsumexp(kernel.log_pdf(x_d) + log_weights[None], axis=-1)
+            return ret
+        n_dimensions, n_samples = x.shape
+        n_trials = len(log_weights)
+        if chunk_size is None:
+            chunk_size = max(1, _MAX_LOG_PDF_CHUNK_ELEMENTS // (n_dimensions * n_samples))
+        # Running maximum and sum of `exp(log_pdf - maximum)` of each dimension and sample.
+        max_log_pdf = np.full(shape=(n_dimensions, n_samples), fill_value=-np.inf)
+        sum_pdf = np.zeros(shape=(n_dimensions, n_samples))
+        for begin in range(0, n_trials, chunk_size):
+            chunk = slice(begin, begin + chunk_size)
+            # Parameters of the kernels are stacked per chunk so that the peak memory does not
+            # grow with the number of trials.
+            loc = np.stack([kernel.loc[chunk] for kernel in logistic_kernels])
+            scale = np.stack([kernel.safe_scale[chunk] for kernel in logistic_kernels])
+            offset = np.stack([kernel.log_normalizer[chunk] for kernel in logistic_kernels])
+            offset -= log_weights[None, chunk]
+            log_pdf = _logistic_log_pdf(x[:, :, None], loc=loc[:, None], scale=scale[:, None])
+            log_pdf -= offset[:, None]
+            new_max_log_pdf = np.maximum(max_log_pdf, log_pdf.max(axis=2))
+            log_pdf -= new_max_log_pdf[..., None]
+            sum_pdf *= np.exp(max_log_pdf - new_max_log_pdf)
+            sum_pdf += np.exp(log_pdf, out=log_pdf).sum(axis=2)
+            max_log_pdf = new_max_log_pdf
+        ret = (max_log_pdf + np.log(sum_pdf)).sum(axis=0)
+        return ret
+
+
+class _AliasTable:
+    """Walker's alias table to draw indices with given probabilities in constant time.
+
+    Each of the ``n`` cells is split into the cell's own index and an alias. An index is
+    drawn by choosing a cell uniformly and then choosing the index or the alias.
+
+    The table is built without Python loops by the sweeping construction of
+    Hübschle-Schneider and Sanders, "Parallel Weighted Random Sampling", 2019.
+    Light items (``n * p < 1``) take aliases from heavy items in order, and a heavy item
+    becomes light itself when the remaining mass goes below one, which is expressed by
+    prefix sums of deficits of light items and excesses of heavy items.
+
+    Args:
+        weights:
+            Probabilities of indices. They must sum up to one.
+    """
+
+    def __init__(self, weights: "npt.NDArray[np.float64]") -> None:
+        n = len(weights)
+        q = weights * n
+        light = np.flatnonzero(q < 1.0)
+        heavy = np.flatnonzero(q >= 1.0)
+        self.prob: "npt.NDArray[np.float64]" = np.ones(shape=(n,), dtype=np.float64)
+        self.alias: "npt.NDArray[np.int_]" = np.arange(n)
+        if len(light) == 0 or len(heavy) == 0:
+            # All items have the same probability.
+            return
+        # Cumulative deficits of light items and cumulative excesses of heavy items.
+        deficits = np.cumsum(1.0 - q[light])
+        excesses = np.cumsum(q[heavy] - 1.0)
+        # Cumulative deficits before each light item.
+        starts = np.concatenate(([0.0], deficits[:-1]))
+        # A heavy item gives mass to a light item while its donations before the light
+        # item are below its excess. An exhausted heavy item is not a donor even on ties.
+        donors = np.searchsorted(excesses, starts, side="right")
+        self.prob[light] = q[light]
+        self.alias[light] = heavy[np.minimum(donors, len(heavy) - 1)]
+        # A heavy item becomes light when the last light item that its excess reaches
+        # needs more than the excess, and the next heavy item fills its cell.
+        last_reached = np.searchsorted(starts, excesses, side="left") - 1
+        becomes_light = (last_reached >= 0) & (deficits[last_reached] > excesses)
+        becomes_light[-1] = False  # The remainder of the last heavy item is rounding errors.
+        becomes_light_idx = np.flatnonzero(becomes_light)
+        self.prob[heavy[becomes_light_idx]] = np.clip(
+            1.0 - (deficits[last_reached[becomes_light_idx]] - excesses[becomes_light_idx]),
+            0.0,
+            1.0,
+        )
+        self.alias[heavy[becomes_light_idx]] = heavy[becomes_light_idx + 1]
+
+    def sample(self, k: int, rng: np.random.Generator) -> "npt.NDArray[np.int_]":
+        cells = rng.integers(len(self.prob), size=k)
+        ret: "npt.NDArray[np.int_]" = np.where(
+            rng.random(size=k) < self.prob[cells], cells, self.alias[cells]
+        )
         return ret
 
 
+def _logsumexp(a: "npt.NDArray[np.float64]", axis: int) -> "npt.NDArray[np.float64]":
+    max_a = a.max(axis=axis, keepdims=True)
+    ret: "npt.NDArray[np.float64]" = np.log(np.exp(a - max_a).sum(axis=axis)) + max_a.squeeze(
+        axis=axis
+    )
+    return ret
+
+
+def _logistic_log_pdf(
+    x: "npt.NDArray[np.float64]", loc: "npt.NDArray[np.float64]", scale: "npt.NDArray[np.float64]"
+) -> "npt.NDArray[np.float64]":
+    """Log-density of logistic distributions without the normalization by ``scale``.
+
+    The density is symmetric, so ``log(exp(-|z|) / (1 + exp(-|z|)) ** 2)`` is used to avoid
+    overflows.
+    """
+    z = x - loc
+    np.abs(z, out=z)
+    z /= scale
+    ret = np.exp(-z)
+    np.log1p(ret, out=ret)
+    ret *= -2.0
+    ret -= z
+    return ret
+
+
 class _MixturedDistributionBase(abc.ABC):
     @abc.abstractclassmethod
-    def sample(self, active_indices: "npt.NDArray[np.int_]") -> "npt.NDArray[Any]":
+    def sample(
+        self, active_indices: "npt.NDArray[np.int_]", rng: np.random.Generator
+    ) -> "npt.NDArray[Any]":
         pass
 
     @abc.abstractclassmethod
@@ -195,7 +501,9 @@ class _AitchisonAitken(_MixturedDistributionBase):
     def sample_to_value(self, sample: Any) -> ParameterValue:
         raise NotImplementedError()
 
-    def sample(self, active_indices: "npt.NDArray[np.int_]") -> "npt.NDArray[np.int_]":
+    def sample(
+        self, active_indices: "npt.NDArray[np.int_]", rng: np.random.Generator
+    ) -> "npt.NDArray[np.int_]":
         raise NotImplementedError()
 
     def log_pdf(self, x: "npt.NDArray[np.int_]") -> "npt.NDArray[np.float64]":
@@ -241,6 +549,11 @@ class _TruncatedLogisticMixturedDistribution(_MixturedDistributionBase):
         self.normalization_constant: "npt.NDArray[np.float64]" = (  # (1, n_observation)
             self.unnormalized_cdf(np.asarray([high])) - self.unnormalized_cdf(np.asarray([low]))
         )
+        self.safe_scale: "npt.NDArray[np.float64]" = np.maximum(scale, eps)
+        # Logarithm of the normalizer of the truncated densities.
+        self.log_normalizer: "npt.NDArray[np.float64]" = np.log(self.safe_scale) + np.log(
+            np.maximum(self.normalization_constant[0], eps)
+        )
 
     def quantized_log_pdf(
         self, x: "npt.NDArray[np.float64]", q: float
@@ -255,14 +568,16 @@ class _TruncatedLogisticMixturedDistribution(_MixturedDistributionBase):
         )
         return ret
 
-    def sample(self, active_indices: "npt.NDArray[np.int_]") -> "npt.NDArray[np.float64]":
+    def sample(
+        self, active_indices: "npt.NDArray[np.int_]", rng: np.random.Generator
+    ) -> "npt.NDArray[np.float64]":
         # TODO(tsuzuku): Check numerical stability.
         loc = self.loc[active_indices]
         scale = self.scale[active_indices]
         trunc_low = 1 / (1 + np.exp(-(self.low - loc) / scale))
         trunc_high = 1 / (1 + np.exp(-(self.high - loc) / scale))
 
-        p = np.random.uniform(trunc_low, trunc_high, size=active_indices.shape)
+        p = rng.uniform(trunc_low, trunc_high, size=active_indices.shape)
         ret: "npt.NDArray[np.float64]" = loc - scale * np.log(1 / p - 1)
         return ret
 
@@ -277,10 +592,8 @@ class _TruncatedLogisticMixturedDistribution(_MixturedDistributionBase):
         return ret
 
     def log_pdf(self, x: "npt.NDArray[np.float64]") -> "npt.NDArray[np.float64]":
-        cdf: "npt.NDArray[np.float64]" = self.unnormalized_cdf(x)
-        ret: "npt.NDArray[np.float64]" = np.log(cdf * (1 - cdf)) / np.maximum(
-            self.normalization_constant, self.eps
-        )
+        ret = _logistic_log_pdf(x[..., None], loc=self.loc[None], scale=self.safe_scale[None])
+        ret -= self.log_normalizer[None]
         return ret
 
     def sample_to_value(self, sample: Any) -> ParameterValue:
@@ -288,17 +601,35 @@ class _TruncatedLogisticMixturedDistribution(_MixturedDistributionBase):
 
 
 class _MixturedDistribution(_MixturedDistributionBase):
+    """A mixture of kernels centered at the observations.
+
+    Args:
+        name:
+            Name of the parameter.
+        distribution:
+            Distribution of the parameter.
+        trials:
+            Observed trials.
+        n_distribution:
+            The number of parameters in the search space.
+        observations:
+            Values of the parameter in the trials and whether the values are set.
+            When this argument is :obj:`None`, they are read from the trials.
+    """
+
     def __init__(
         self,
         name: str,
         distribution: Distribution,
         trials: Sequence[TrialProto],
         n_distribution: int,
+        observations: Optional[Tuple["npt.NDArray[np.float64]", "npt.NDArray[np.bool_]"]] = None,
     ) -> None:
         self._distribution = distribution
-        valid_examples: "npt.NDArray[np.bool_]" = np.asarray(
-            [name in trial.parameters for trial in trials]
-        )
+        if observations is None:
+            observations = self._read_observations(name=name, trials=trials)
+        values, valid_examples = observations
+        assert values.shape == valid_examples.shape == (len(trials),)
         n_observation = valid_examples.sum()
         self._kernel: _MixturedDistributionBase
         if distribution.HasField("int_distribution"):
@@ -307,13 +638,7 @@ class _MixturedDistribution(_MixturedDistributionBase):
                 low=float(int_d.low) - 0.5,
                 high=float(int_d.high) + 0.5,
                 log_scale=int_d.log_scale,
-                observations=np.asarray(
-                    [
-                        trial.parameters[name].value.int_value if name in trial.parameters else 1.0
-                        for trial in trials
-                    ],
-                    dtype=np.float64,
-                ),
+                observations=values,
                 valid=valid_examples,
                 n_observation=n_observation,
                 n_dimension=n_distribution,
@@ -324,15 +649,7 @@ class _MixturedDistribution(_MixturedDistributionBase):
                 low=float_d.low,
                 high=float_d.high,
                 log_scale=float_d.log_scale,
-                observations=np.asarray(
-                    [
-                        trial.parameters[name].value.double_value
-                        if name in trial.parameters
-                        else 1.0
-                        for trial in trials
-                    ],
-                    dtype=np.float64,
-                ),
+                observations=values,
                 valid=valid_examples,
                 n_observation=n_observation,
                 n_dimension=n_distribution,
@@ -344,6 +661,24 @@ class _MixturedDistribution(_MixturedDistributionBase):
         else:
             raise NotImplementedError(f"Unsupported distribution: {distribution}")
 
+    def _read_observations(
+        self, name: str, trials: Sequence[TrialProto]
+    ) -> Tuple["npt.NDArray[np.float64]", "npt.NDArray[np.bool_]"]:
+        valid_examples: "npt.NDArray[np.bool_]" = np.asarray(
+            [name in trial.parameters for trial in trials], dtype=np.bool_
+        )
+        if self._distribution.HasField("int_distribution"):
+            values = [
+                trial.parameters[name].value.int_value if name in trial.parameters else 1.0
+                for trial in trials
+            ]
+        else:
+            values = [
+                trial.parameters[name].value.double_value if name in trial.parameters else 1.0
+                for trial in trials
+            ]
+        return np.asarray(values, dtype=np.float64), valid_examples
+
     @staticmethod
     def _create_numerical_distribution(
         low: float,
@@ -371,11 +706,15 @@ class _MixturedDistribution(_MixturedDistributionBase):
             scale=scales,
         )
 
-    def sample(self, active_indices: "npt.NDArray[np.int_]") -> "npt.NDArray[Any]":
+    def sample(
+        self, active_indices: "npt.NDArray[np.int_]", rng: Optional[np.random.Generator] = None
+    ) -> "npt.NDArray[Any]":
+        if rng is None:
+            rng = np.random.default_rng()
         ret: "npt.NDArray[Any]"
         if self._distribution.HasField("int_distribution"):
             int_d = self._distribution.int_distribution
-            samples = self._kernel.sample(active_indices=active_indices)
+            samples = self._kernel.sample(active_indices=active_indices, rng=rng)
             if int_d.log_scale:
                 samples = np.exp(samples)
             rounded_samples: "npt.NDArray[np.int_]" = np.round(  # type: ignore[no-untyped-call]
@@ -385,27 +724,35 @@ class _MixturedDistribution(_MixturedDistributionBase):
             return ret
         elif self._distribution.HasField("float_distribution"):
             float_d = self._distribution.float_distribution
-            samples = self._kernel.sample(active_indices=active_indices)
+            samples = self._kernel.sample(active_indices=active_indices, rng=rng)
             if float_d.log_scale:
                 samples = np.exp(samples)
             ret = np.clip(a=samples, a_min=float_d.low, a_max=float_d.high)
             return ret
         raise NotImplementedError()
 
-    def log_pdf(self, x: "npt.NDArray[Any]") -> "npt.NDArray[np.float64]":
+    @property
+    def kernel(self) -> _MixturedDistributionBase:
+        return self._kernel
+
+    def to_kernel_space(self, x: "npt.NDArray[Any]") -> "npt.NDArray[Any]":
+        """Convert samples into the domain of the kernel."""
         if self._distribution.HasField("int_distribution"):
             int_d = self._distribution.int_distribution
             x = x.astype(np.float64)
             if int_d.log_scale:
                 x = np.log(x)
-            return self._kernel.log_pdf(x)
+            return x
         elif self._distribution.HasField("float_distribution"):
             float_d = self._distribution.float_distribution
             if float_d.log_scale:
                 x = np.log(x)
-            return self._kernel.log_pdf(x)
+            return x
         raise NotImplementedError()
 
+    def log_pdf(self, x: "npt.NDArray[Any]") -> "npt.NDArray[np.float64]":
+        return self._kernel.log_pdf(self.to_kernel_space(x))
+
     def sample_to_value(self, sample: Any) -> ParameterValue:
         if self._distribution.HasField("int_distribution"):
             return ParameterValue(int_value=sample)
@@ -1,4 +1,26 @@
-from optur.storages.builder import create_inmemory_storage, create_posix_storage
-from optur.storages.storage import Storage, StorageClient
+from optur.storages.async_storage import AsyncStorage, AsyncStorageClient
+from optur.storages.buffered import BufferedStorageClient
+from optur.storages.builder import (
+    create_async_inmemory_storage,
+    create_async_mysql_storage,
+    create_inmemory_storage,
+    create_mysql_storage,
+    create_posix_storage,
+)
+from optur.storages.shared_memory import SharedTrialLog
+from optur.storages.storage import SharedTrialLogClient, Storage, StorageClient
 
-__all__ = ["Storage", "StorageClient", "create_inmemory_storage", "create_posix_storage"]
+__all__ = [
+    "AsyncStorage",
+    "AsyncStorageClient",
+    "BufferedStorageClient",
+    "SharedTrialLog",
+    "SharedTrialLogClient",
+    "Storage",
+    "StorageClient",
+    "create_async_inmemory_storage",
+    "create_async_mysql_storage",
+    "create_inmemory_storage",
+    "create_mysql_storage",
+    "create_posix_storage",
+]
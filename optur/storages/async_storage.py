@@ -0,0 +1,207 @@
+import abc
+import asyncio
+import concurrent.futures
+import functools
+import threading
+from typing import Any, Callable, List, Optional, Sequence, TypeVar
+
+from google.protobuf.timestamp_pb2 import Timestamp
+
+from optur.proto import storage_pb2
+from optur.proto.study_pb2 import StudyInfo
+from optur.proto.study_pb2 import Trial as TrialProto
+from optur.storages.storage import StorageClient
+
+_T = TypeVar("_T")
+
+
+class AsyncStorageClient(abc.ABC):
+    """Awaitable counterpart of :class:`~optur.storages.StorageClient`.
+
+    See :class:`~optur.storages.StorageClient` for the semantics of each method.
+    """
+
+    @abc.abstractclassmethod
+    async def get_current_timestamp(self) -> Optional[Timestamp]:
+        pass
+
+    @abc.abstractclassmethod
+    async def get_studies(self, timestamp: Optional[Timestamp] = None) -> List[StudyInfo]:
+        pass
+
+    @abc.abstractclassmethod
+    async def get_trials(
+        self, study_id: Optional[str] = None, timestamp: Optional[Timestamp] = None
+    ) -> List[TrialProto]:
+        pass
+
+    @abc.abstractclassmethod
+    async def get_trial(self, trial_id: str, study_id: Optional[str] = None) -> TrialProto:
+        pass
+
+    @abc.abstractclassmethod
+    async def write_study(self, study: StudyInfo) -> None:
+        pass
+
+    @abc.abstractclassmethod
+    async def write_trial(self, trial: TrialProto) -> None:
+        pass
+
+    @abc.abstractclassmethod
+    async def write_trials(self, trials: Sequence[TrialProto]) -> None:
+        pass
+
+    @abc.abstractclassmethod
+    async def compare_and_write_trial(
+        self, trial: TrialProto, expected: Optional[TrialProto]
+    ) -> None:
+        pass
+
+    @abc.abstractclassmethod
+    async def execute_batch(
+        self, requests: Sequence[storage_pb2.Request]
+    ) -> List[storage_pb2.Reply]:
+        pass
+
+
+class AsyncStorage(AsyncStorageClient):
+    """An :class:`AsyncStorageClient` that wraps a blocking :class:`StorageClient`.
+
+    When ``executor`` is :obj:`None`, the wrapped client is called directly from the event
+    loop. This is suitable for storages that never block, such as the in-memory storage.
+    Otherwise, calls are run in the executor so that the event loop is not blocked by I/O.
+    Calls are serialized unless ``thread_safe`` is :obj:`True`, so executors with several
+    workers only help storages that are thread-safe.
+
+    Args:
+        storage:
+            A blocking client to wrap, typically a :class:`~optur.storages.Storage`.
+        executor:
+            An executor to run blocking calls.
+        thread_safe:
+            Whether the wrapped client can be called from several threads concurrently,
+            e.g., a :class:`~optur.storages.Storage` with a thread-safe backend.
+    """
+
+    def __init__(
+        self,
+        storage: StorageClient,
+        executor: Optional[concurrent.futures.Executor] = None,
+        *,
+        thread_safe: bool = False,
+    ) -> None:
+        self._storage = storage
+        self._executor = executor
+        self._blocking_client: StorageClient
+        # Serializes the calls from the executor and from `blocking_client`.
+        self._lock: Optional[threading.Lock]
+        if thread_safe:
+            self._lock = None
+            self._blocking_client = storage
+        else:
+            self._lock = threading.Lock()
+            self._blocking_client = _LockedStorageClient(storage=storage, lock=self._lock)
+
+    @property
+    def blocking_client(self) -> StorageClient:
+        """A blocking client that can be used from the event loop together with this client.
+
+        Trials created by :meth:`~optur.Study.optimize_async` use this client.
+        """
+        return self._blocking_client
+
+    async def _call(self, func: Callable[..., _T], **kwargs: Any) -> _T:
+        if self._executor is None:
+            return self._call_with_lock(func, **kwargs)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(self._call_with_lock, func, **kwargs)
+        )
+
+    def _call_with_lock(self, func: Callable[..., _T], **kwargs: Any) -> _T:
+        if self._lock is None:
+            return func(**kwargs)
+        with self._lock:
+            return func(**kwargs)
+
+    async def get_current_timestamp(self) -> Optional[Timestamp]:
+        return await self._call(self._storage.get_current_timestamp)
+
+    async def get_studies(self, timestamp: Optional[Timestamp] = None) -> List[StudyInfo]:
+        return await self._call(self._storage.get_studies, timestamp=timestamp)
+
+    async def get_trials(
+        self, study_id: Optional[str] = None, timestamp: Optional[Timestamp] = None
+    ) -> List[TrialProto]:
+        return await self._call(self._storage.get_trials, study_id=study_id, timestamp=timestamp)
+
+    async def get_trial(self, trial_id: str, study_id: Optional[str] = None) -> TrialProto:
+        return await self._call(self._storage.get_trial, trial_id=trial_id, study_id=study_id)
+
+    async def write_study(self, study: StudyInfo) -> None:
+        await self._call(self._storage.write_study, study=study)
+
+    async def write_trial(self, trial: TrialProto) -> None:
+        await self._call(self._storage.write_trial, trial=trial)
+
+    async def write_trials(self, trials: Sequence[TrialProto]) -> None:
+        await self._call(self._storage.write_trials, trials=trials)
+
+    async def compare_and_write_trial(
+        self, trial: TrialProto, expected: Optional[TrialProto]
+    ) -> None:
+        await self._call(self._storage.compare_and_write_trial, trial=trial, expected=expected)
+
+    async def execute_batch(
+        self, requests: Sequence[storage_pb2.Request]
+    ) -> List[storage_pb2.Reply]:
+        return await self._call(self._storage.execute_batch, requests=requests)
+
+    def shutdown(self) -> None:
+        """Shutdown the executor if exists."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+
+class _LockedStorageClient(StorageClient):
+    def __init__(self, storage: StorageClient, lock: threading.Lock) -> None:
+        self._storage = storage
+        self._lock = lock
+
+    def get_current_timestamp(self) -> Optional[Timestamp]:
+        with self._lock:
+            return self._storage.get_current_timestamp()
+
+    def get_studies(self, timestamp: Optional[Timestamp] = None) -> List[StudyInfo]:
+        with self._lock:
+            return self._storage.get_studies(timestamp=timestamp)
+
+    def get_trials(
+        self, study_id: Optional[str] = None, timestamp: Optional[Timestamp] = None
+    ) -> List[TrialProto]:
+        with self._lock:
+            return self._storage.get_trials(study_id=study_id, timestamp=timestamp)
+
+    def get_trial(self, trial_id: str, study_id: Optional[str] = None) -> TrialProto:
+        with self._lock:
+            return self._storage.get_trial(trial_id=trial_id, study_id=study_id)
+
+    def write_study(self, study: StudyInfo) -> None:
+        with self._lock:
+            self._storage.write_study(study=study)
+
+    def write_trial(self, trial: TrialProto) -> None:
+        with self._lock:
+            self._storage.write_trial(trial=trial)
+
+    def write_trials(self, trials: Sequence[TrialProto]) -> None:
+        with self._lock:
+            self._storage.write_trials(trials=trials)
+
+    def compare_and_write_trial(self, trial: TrialProto, expected: Optional[TrialProto]) -> None:
+        with self._lock:
+            self._storage.compare_and_write_trial(trial=trial, expected=expected)
+
+    def execute_batch(self, requests: Sequence[storage_pb2.Request]) -> List[storage_pb2.Reply]:
+        with self._lock:
+            return self._storage.execute_batch(requests=requests)
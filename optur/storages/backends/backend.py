@@ -1,5 +1,5 @@
 import abc
-from typing import List, Optional
+from typing import List, Optional, Sequence
 
 from google.protobuf.timestamp_pb2 import Timestamp
 
@@ -113,3 +113,36 @@ class StorageBackend(abc.ABC):
                 A :class:`~optur.proto.study_pb2.Trial` to write.
         """
         pass
+
+    @abc.abstractclassmethod
+    def compare_and_write_trial(self, trial: TrialProto, expected: Optional[TrialProto]) -> None:
+        """Write :class:`~optur.proto.study_pb2.Trial` only if the stored trial is ``expected``.
+
+        The comparison and the write are atomic with respect to other
+        :meth:`compare_and_write_trial` calls on the same trial.
+
+        Args:
+            trial:
+                A :class:`~optur.proto.study_pb2.Trial` to write.
+            expected:
+                The trial read from the storage, e.g., by :meth:`get_trial`.
+                :obj:`None` means that the trial must not exist.
+
+        Raises:
+            :class:`~optur.errors.ConflictError`:
+                If the stored trial is not ``expected``.
+        """
+        pass
+
+    @abc.abstractclassmethod
+    def write_trials(self, trials: Sequence[TrialProto]) -> None:
+        """Write multiple :class:`~optur.proto.study_pb2.Trial` to the storage.
+
+        This method is equivalent to calling :meth:`write_trial` for each trial in order,
+        but backends write them in bulk.
+
+        Args:
+            trials:
+                A sequence of :class:`~optur.proto.study_pb2.Trial` to write.
+        """
+        pass
@@ -0,0 +1,182 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Sequence, Set
+
+from google.protobuf.timestamp_pb2 import Timestamp
+
+from optur.proto.study_pb2 import StudyInfo
+from optur.proto.study_pb2 import Trial as TrialProto
+from optur.storages.backends.backend import StorageBackend
+
+# Finished trials are never updated, so they can be served from the cache.
+_FINISHED_STATES = (
+    TrialProto.State.COMPLETED,
+    TrialProto.State.PRUNED,
+    TrialProto.State.FAILED,
+)
+
+
+class _CachedTrial(NamedTuple):
+    trial: TrialProto
+    # Server-timestamp (in nanoseconds) taken after the trial was read.
+    # The trial was last updated before this timestamp.
+    observed_until: int
+
+
+class _CachedStudy:
+    def __init__(self) -> None:
+        # Serializes the refreshes of the study, and guards the attributes other than
+        # `counted_trial_ids`.
+        self.lock = threading.Lock()
+        self.trials: Dict[str, _CachedTrial] = {}
+        # All updates before this timestamp are reflected in ``trials``.
+        # `None` means that the study has never been loaded.
+        self.timestamp: Optional[Timestamp] = None
+        # Server-timestamp taken after the latest refresh.
+        self.refreshed_at: Optional[Timestamp] = None
+        # IDs of the trials counted in `_n_cached_trials` of the backend.
+        # Guarded by the lock of the backend, not by `lock`.
+        self.counted_trial_ids: Set[str] = set()
+
+
+def _copy_trial(trial: TrialProto) -> TrialProto:
+    ret = TrialProto()
+    ret.CopyFrom(trial)
+    return ret
+
+
+# This class is thread-safe as long as the wrapped backend is thread-safe.
+class CachingStorageBackend(StorageBackend):
+    """A read-through cache of trials in front of another :class:`StorageBackend`.
+
+    The cache keeps trials of recently read studies together with the server-timestamp up to
+    which they are known to be up to date.
+    :meth:`get_trials` of a study asks the wrapped backend only for trials updated after the
+    timestamp and answers the request from the cache, so that several
+    :class:`~optur.storages.Storage` instances in a process can share one warm cache
+    instead of each of them loading the whole study from NFS or MySQL.
+    Studies are evicted in least-recently-used order when the number of cached trials
+    exceeds ``max_cached_trials``.
+
+    Once a study is loaded, each refresh asks the wrapped backend for the current timestamp
+    only once.
+    Writes always go to the wrapped backend. :meth:`get_trial` serves finished trials from
+    the cache, and otherwise it gives the backend a hint about the study of the trial.
+    The backend must support :meth:`get_current_timestamp`; otherwise, every read goes to
+    the backend.
+
+    Args:
+        backend:
+            A backend to wrap.
+        max_cached_trials:
+            The maximum number of trials to cache.
+    """
+
+    def __init__(self, backend: StorageBackend, max_cached_trials: int = 100000) -> None:
+        super().__init__()
+        if max_cached_trials < 1:
+            raise ValueError("max_cached_trials must be positive.")
+        self._backend = backend
+        self._max_cached_trials = max_cached_trials
+        # Guards `_studies`, `_trial_studies`, and `_n_cached_trials`.
+        self._lock = threading.Lock()
+        self._studies: "OrderedDict[str, _CachedStudy]" = OrderedDict()
+        # Mapping from trial_id to study_id of the cached trials.
+        self._trial_studies: Dict[str, str] = {}
+        self._n_cached_trials = 0
+
+    def get_current_timestamp(self) -> Optional[Timestamp]:
+        return self._backend.get_current_timestamp()
+
+    def get_studies(self, timestamp: Optional[Timestamp] = None) -> List[StudyInfo]:
+        return self._backend.get_studies(timestamp=timestamp)
+
+    def get_trials(
+        self, study_id: Optional[str] = None, timestamp: Optional[Timestamp] = None
+    ) -> List[TrialProto]:
+        if study_id is None:
+            return self._backend.get_trials(study_id=study_id, timestamp=timestamp)
+        with self._lock:
+            study = self._studies.get(study_id)
+            if study is None:
+                study = _CachedStudy()
+                self._studies[study_id] = study
+            self._studies.move_to_end(study_id)
+        with study.lock:
+            # A refresh needs a timestamp before and after the read, and the timestamp after
+            # the previous refresh serves as the one before the read, so that only the first
+            # load asks the backend twice.
+            read_since = study.refreshed_at
+            if read_since is None:
+                read_since = self._backend.get_current_timestamp()
+            trials = self._backend.get_trials(study_id=study_id, timestamp=study.timestamp)
+            refreshed_at = self._backend.get_current_timestamp()
+            if read_since is None or refreshed_at is None:
+                # The backend does not support incremental loading.
+                return trials
+            for trial in trials:
+                cached = study.trials.get(trial.trial_id)
+                # Trials read again without changes keep the older timestamp.
+                if cached is None or cached.trial != trial:
+                    study.trials[trial.trial_id] = _CachedTrial(
+                        trial=trial, observed_until=refreshed_at.ToNanoseconds()
+                    )
+            study.timestamp = read_since
+            study.refreshed_at = refreshed_at
+            # A trial updated on or after the timestamp was read after the update.
+            threshold = None if timestamp is None else timestamp.ToNanoseconds()
+            ret = [
+                _copy_trial(cached.trial)
+                for cached in study.trials.values()
+                if threshold is None or cached.observed_until >= threshold
+            ]
+        with self._lock:
+            # The study might have been evicted during the refresh.
+            if self._studies.get(study_id) is study:
+                new_trial_ids = [
+                    trial.trial_id
+                    for trial in trials
+                    if trial.trial_id not in study.counted_trial_ids
+                ]
+                study.counted_trial_ids.update(new_trial_ids)
+                self._trial_studies.update((trial_id, study_id) for trial_id in new_trial_ids)
+                self._n_cached_trials += len(new_trial_ids)
+                self._evict()
+        return ret
+
+    def _evict(self) -> None:
+        # Keep at least the most recently used study.
+        while self._n_cached_trials > self._max_cached_trials and len(self._studies) > 1:
+            # Another thread might be refreshing the study, so only the IDs guarded by
+            # `_lock` are used here.
+            _, study = self._studies.popitem(last=False)
+            for trial_id in study.counted_trial_ids:
+                self._trial_studies.pop(trial_id, None)
+            self._n_cached_trials -= len(study.counted_trial_ids)
+
+    def get_trial(self, trial_id: str, study_id: Optional[str] = None) -> TrialProto:
+        with self._lock:
+            cached_study_id = self._trial_studies.get(trial_id)
+            study = None if cached_study_id is None else self._studies.get(cached_study_id)
+        if study is not None and (study_id is None or study_id == cached_study_id):
+            with study.lock:
+                cached = study.trials.get(trial_id)
+            if cached is not None and cached.trial.last_known_state in _FINISHED_STATES:
+                return _copy_trial(cached.trial)
+        # Other cached trials might be stale, but the study is a useful hint for the lookup.
+        if study_id is None:
+            study_id = cached_study_id
+        return self._backend.get_trial(trial_id=trial_id, study_id=study_id)
+
+    def write_study(self, study: StudyInfo) -> None:
+        self._backend.write_study(study=study)
+
+    def write_trial(self, trial: TrialProto) -> None:
+        # The written trial is loaded by the next `get_trials` with the server-side fields.
+        self._backend.write_trial(trial=trial)
+
+    def write_trials(self, trials: Sequence[TrialProto]) -> None:
+        self._backend.write_trials(trials=trials)
+
+    def compare_and_write_trial(self, trial: TrialProto, expected: Optional[TrialProto]) -> None:
+        self._backend.compare_and_write_trial(trial=trial, expected=expected)
@@ -1,10 +1,10 @@
 import bisect
 import datetime
-from typing import Dict, List, NamedTuple, Optional
+from typing import Dict, List, NamedTuple, Optional, Sequence
 
 from google.protobuf.timestamp_pb2 import Timestamp
 
-from optur.errors import NotFoundError
+from optur.errors import ConflictError, NotFoundError
 from optur.proto.study_pb2 import StudyInfo
 from optur.proto.study_pb2 import Trial as TrialProto
 from optur.storages.backends.backend import StorageBackend
@@ -24,6 +24,10 @@ def _timestamp_to_int(t: Timestamp) -> int:
     return t.seconds * 10 ** 9 + t.nanos
 
 
+# Compaction is not performed while the number of stale entries is smaller than this value.
+_MIN_STALE_ENTRIES_FOR_COMPACTION = 1024
+
+
 class _StudyData(NamedTuple):
     study_info: StudyInfo
     # Trials sorted by the ``last_update_time``.
@@ -31,11 +35,19 @@ class _StudyData(NamedTuple):
     # Since ``key`` argument of ``bisect.bisect_left`` is not supported in python<=3.9,
     # this field has type that have total order.
     sorted_trials: List[_TrialData]
+    # Mapping from trial_id to the latest entry of the trial in ``sorted_trials``.
+    # Other entries of the trial are stale.
+    latest_trials: Dict[str, _TrialData]
+
+    def is_latest(self, trial: _TrialData) -> bool:
+        return self.latest_trials[trial.trial_id] is trial
+
+    def n_stale_entries(self) -> int:
+        return len(self.sorted_trials) - len(self.latest_trials)
 
-    @staticmethod
-    def compaction(sorted_trials: List[_TrialData]) -> List[_TrialData]:
-        """Remove duplicated trials."""
-        return list({trial.trial_id: trial for trial in sorted_trials}.values())
+    def compaction(self) -> None:
+        """Remove stale entries from ``sorted_trials``."""
+        self.sorted_trials[:] = [trial for trial in self.sorted_trials if self.is_latest(trial)]
 
 
 # This class is not thread-safe, and it's okay.
@@ -110,7 +122,9 @@ class InMemoryStorageBackend(StorageBackend):
             left_idx = bisect.bisect_left(
                 study.sorted_trials, (_timestamp_to_int(timestamp) - 1, "", None)
             )
-        return [trial.trial for trial in study.compaction(study.sorted_trials[left_idx:])]
+        # Every stale entry after `left_idx` was replaced by a write after the timestamp,
+        # so this takes time proportional to the number of writes after the timestamp.
+        return [trial.trial for trial in study.sorted_trials[left_idx:] if study.is_latest(trial)]
 
     def get_trial(self, trial_id: str, study_id: Optional[str] = None) -> TrialProto:
         """Read a trial from the storage.
@@ -155,6 +169,7 @@ class InMemoryStorageBackend(StorageBackend):
             self._studies[study.study_id] = _StudyData(
                 study_info=new_study,
                 sorted_trials=[],
+                latest_trials={},
             )
 
     def write_trial(self, trial: TrialProto) -> None:
@@ -168,21 +183,57 @@ class InMemoryStorageBackend(StorageBackend):
             trial:
                 A :class:`~optur.proto.study_pb2.Trial` to write.
         """
-        if trial.study_id not in self._studies:
-            raise NotFoundError(
-                f"Study with study_id: '{trial.study_id}' does not exist. "
-                "Trial must have study_id and it must already exists."
-            )
-        study = self._studies[trial.study_id]
-        new_trial = TrialProto()
-        new_trial.CopyFrom(trial)
-        new_trial.last_update_time.CopyFrom(self.get_current_timestamp())
-        self._trials[trial.trial_id] = new_trial
-        study.sorted_trials.append(
-            _TrialData(
+        self.write_trials(trials=[trial])
+
+    def write_trials(self, trials: Sequence[TrialProto]) -> None:
+        """Write multiple :class:`~optur.proto.study_pb2.Trial` to the storage.
+
+        No trial is written when one of the trials belongs to a non-existent study.
+
+        Args:
+            trials:
+                A sequence of :class:`~optur.proto.study_pb2.Trial` to write.
+        """
+        for trial in trials:
+            if trial.study_id not in self._studies:
+                raise NotFoundError(
+                    f"Study with study_id: '{trial.study_id}' does not exist. "
+                    "Trial must have study_id and it must already exists."
+                )
+        timestamp = self.get_current_timestamp()
+        updated_studies: Dict[str, _StudyData] = {}
+        for trial in trials:
+            study = self._studies[trial.study_id]
+            new_trial = TrialProto()
+            new_trial.CopyFrom(trial)
+            new_trial.last_update_time.CopyFrom(timestamp)
+            self._trials[trial.trial_id] = new_trial
+            trial_data = _TrialData(
                 timestamp=_timestamp_to_int(new_trial.last_update_time),
                 trial_id=new_trial.trial_id,
                 trial=new_trial,
             )
-        )
-        # TODO(tsuzuku): Perform compaction so that the `sorted_trials` won't be that long.
+            study.sorted_trials.append(trial_data)
+            study.latest_trials[trial_data.trial_id] = trial_data
+            updated_studies[trial.study_id] = study
+        for study in updated_studies.values():
+            # Keep the memory usage proportional to the number of trials. Since the compaction
+            # runs only when at least half of the entries are stale, the amortized cost
+            # of the compaction is O(1) per write.
+            n_stale_entries = study.n_stale_entries()
+            if n_stale_entries >= max(_MIN_STALE_ENTRIES_FOR_COMPACTION, len(study.latest_trials)):
+                study.compaction()
+
+    def compare_and_write_trial(self, trial: TrialProto, expected: Optional[TrialProto]) -> None:
+        """Write a trial only if the stored trial is ``expected``.
+
+        Args:
+            trial:
+                A :class:`~optur.proto.study_pb2.Trial` to write.
+            expected:
+                The stored trial. :obj:`None` means that the trial must not exist.
+        """
+        current = self._trials.get(trial.trial_id)
+        if current != expected:
+            raise ConflictError(f"Trial with trial_id: '{trial.trial_id}' has been updated.")
+        self.write_trials(trials=[trial])
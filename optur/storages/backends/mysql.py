@@ -1,13 +1,19 @@
+import contextlib
+import queue
+import threading
 import time
-from typing import Any, Callable, List, Optional
+from typing import Any, Callable, Iterator, List, Optional, Sequence
 
 from google.protobuf.timestamp_pb2 import Timestamp
 
-from optur.errors import NotFoundError
+from optur.errors import ConflictError, NotFoundError
 from optur.proto.study_pb2 import StudyInfo
 from optur.proto.study_pb2 import Trial as TrialProto
 from optur.storages.backends.backend import StorageBackend
 
+# Bound the size of a multi-row INSERT statement.
+_MAX_ROWS_PER_INSERT = 1000
+
 
 def _retry(func: Callable[..., Any]) -> Any:
     def wrapped_func(self: "MySQLBackend", *args: Any, **kwargs: Any) -> Any:
@@ -17,8 +23,6 @@ def _retry(func: Callable[..., Any]) -> Any:
         retry_limit = self.retry_limit
         while retry_limit > 0:
             try:
-                if not self._connection.open:
-                    self._connection.connect()
                 return func(self, *args, **kwargs)
             except (
                 pymysql.err.DatabaseError,
@@ -36,9 +40,83 @@ def _retry(func: Callable[..., Any]) -> Any:
     return wrapped_func
 
 
+class _ConnectionPool:
+    """A thread-safe pool of connections.
+
+    Connections are created lazily up to ``pool_size``. When all connections are in use,
+    callers wait until one of them is returned.
+    """
+
+    def __init__(self, connect: Callable[[], Any], pool_size: int) -> None:
+        assert pool_size > 0
+        self._connect = connect
+        self._pool_size = pool_size
+        self._n_connections = 0
+        self._lock = threading.Lock()
+        # LIFO so that recently used (and thus likely alive) connections are reused first.
+        self._idle_connections: "queue.LifoQueue[Any]" = queue.LifoQueue()
+
+    @contextlib.contextmanager
+    def connection(self) -> Iterator[Any]:
+        connection = self._acquire()
+        try:
+            yield connection
+        except BaseException:
+            self._release_after_error(connection)
+            raise
+        self._idle_connections.put(connection)
+
+    def _release_after_error(self, connection: Any) -> None:
+        try:
+            connection.rollback()
+        except Exception:
+            # Do not return broken connections to the pool.
+            self._discard(connection)
+        else:
+            self._idle_connections.put(connection)
+
+    def _acquire(self) -> Any:
+        try:
+            connection = self._idle_connections.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                create = self._n_connections < self._pool_size
+                if create:
+                    self._n_connections += 1
+            if not create:
+                connection = self._idle_connections.get()
+            else:
+                try:
+                    return self._connect()
+                except BaseException:
+                    with self._lock:
+                        self._n_connections -= 1
+                    raise
+        if not connection.open:
+            connection.connect()
+        return connection
+
+    def _discard(self, connection: Any) -> None:
+        with self._lock:
+            self._n_connections -= 1
+        try:
+            connection.close()
+        except Exception:
+            # The connection is already broken.
+            pass
+
+
+# This class is thread-safe. Each operation uses one of the pooled connections.
 class MySQLBackend(StorageBackend):
     def __init__(
-        self, *, host: str, user: str, port: int = 3306, password: str, database: str
+        self,
+        *,
+        host: str,
+        user: str,
+        port: int = 3306,
+        password: str,
+        database: str,
+        pool_size: int = 1,
     ) -> None:
         super().__init__()
         try:
@@ -49,14 +127,22 @@ class MySQLBackend(StorageBackend):
             raise
 
         self._retry_limit = 1
-        self._connection = pymysql.connect(
-            user=user,
-            host=host,
-            port=port,
-            password=password,
-            database=database,
-            cursorclass=pymysql.cursors.DictCursor,
-        )
+
+        def _connect() -> Any:
+            return pymysql.connect(
+                user=user,
+                host=host,
+                port=port,
+                password=password,
+                database=database,
+                cursorclass=pymysql.cursors.DictCursor,
+                # Pooled connections must not keep the snapshot of a finished read, which
+                # would make later reads with the connection return stale trials.
+                # Writes still run in explicit transactions by `begin` and `commit`.
+                autocommit=True,
+            )
+
+        self._pool = _ConnectionPool(connect=_connect, pool_size=pool_size)
 
     @property
     def retry_limit(self) -> int:
@@ -64,28 +150,29 @@ class MySQLBackend(StorageBackend):
 
     @_retry
     def drop_all(self) -> None:
-        with self._connection.cursor() as cursor:
-            cursor.execute(query="DELETE FROM trial_data;")
-            cursor.execute(query="DELETE FROM trial;")
-            cursor.execute(query="DELETE FROM study_info;")
-            cursor.execute(query="DELETE FROM study;")
+        with self._pool.connection() as connection, connection.cursor() as cursor:
+            cursor.execute("DELETE FROM trial_data;")
+            cursor.execute("DELETE FROM trial;")
+            cursor.execute("DELETE FROM study_info;")
+            cursor.execute("DELETE FROM study;")
+            connection.commit()
 
     @_retry
     def init(self) -> None:
-        with self._connection.cursor() as cursor:
+        with self._pool.connection() as connection, connection.cursor() as cursor:
             query = """CREATE TABLE IF NOT EXISTS study (
                 study_id varchar(32) PRIMARY KEY,
                 timestamp TIMESTAMP(6) NOT NULL,
                 INDEX study_timestamp (timestamp, study_id)
             );"""
-            cursor.execute(query=query)
+            cursor.execute(query)
             query = """CREATE TABLE IF NOT EXISTS study_info
             (
                 study_id varchar(32) NOT NULL PRIMARY KEY,
                 info BLOB
             );
             """
-            cursor.execute(query=query)
+            cursor.execute(query)
             query = """CREATE TABLE IF NOT EXISTS trial (
                 trial_id varchar(32) PRIMARY KEY,
                 study_id varchar(32),
@@ -95,37 +182,36 @@ class MySQLBackend(StorageBackend):
                 INDEX trial_timestamp (timestamp, trial_id)
             );
             """
-            cursor.execute(query=query)
+            cursor.execute(query)
             query = """CREATE TABLE IF NOT EXISTS trial_data (
                 trial_id varchar(32) PRIMARY KEY,
                 data BLOB
             );
             """
-            cursor.execute(query=query)
-            self._connection.commit()
+            cursor.execute(query)
+            connection.commit()
 
     @_retry
     def get_current_timestamp(self) -> Optional[Timestamp]:
-        with self._connection.cursor() as cursor:
-            query = """SELECT CURRENT_TIMESTAMP(6);"""
-            cursor.execute(query=query)
+        with self._pool.connection() as connection, connection.cursor() as cursor:
+            cursor.execute("SELECT CURRENT_TIMESTAMP(6);")
             data = cursor.fetchall()
         timestamp = Timestamp()
         timestamp.FromDatetime(next(iter(data[0].values())))
         return timestamp
 
+    @_retry
     def get_studies(self, timestamp: Optional[Timestamp] = None) -> List[StudyInfo]:
-        with self._connection.cursor() as cursor:
+        with self._pool.connection() as connection, connection.cursor() as cursor:
             if timestamp is None:
-                query = """SELECT info FROM study_info;"""
+                cursor.execute("SELECT info FROM study_info;")
             else:
-                ms = timestamp.ToMilliseconds()
-                query = f"""SELECT info FROM study_info INNER JOIN (
+                query = """SELECT info FROM study_info INNER JOIN (
                     SELECT study_id FROM study
-                    WHERE timestamp >= FROM_UNIXTIME({ms}/1000)
+                    WHERE timestamp >= FROM_UNIXTIME(%s / 1000)
                 ) as ts ON study_info.study_id = ts.study_id;
                 """
-            cursor.execute(query=query)
+                cursor.execute(query, (timestamp.ToMilliseconds(),))
             data = cursor.fetchall()
         return [StudyInfo.FromString(row["info"]) for row in data]
 
@@ -133,35 +219,37 @@ class MySQLBackend(StorageBackend):
     def get_trials(
         self, study_id: Optional[str] = None, timestamp: Optional[Timestamp] = None
     ) -> List[TrialProto]:
+        args: List[Any] = []
         if study_id is None:
             if timestamp is None:
                 query = """SELECT data from trial_data;"""
             else:
-                ms = timestamp.ToMilliseconds()
-                query = f"""SELECT data from trial_data INNER JOIN (
-                    SELECT trial_id FROM trial WHERE timestamp >= FROM_UNIXTIME({ms}/1000)
+                query = """SELECT data from trial_data INNER JOIN (
+                    SELECT trial_id FROM trial WHERE timestamp >= FROM_UNIXTIME(%s / 1000)
                 ) as tt ON tt.trial_id = trial_data.trial_id;"""
+                args = [timestamp.ToMilliseconds()]
         else:
             if timestamp is None:
-                query = f"""SELECT data from trial_data INNER JOIN (
-                    SELECT trial_id FROM trial WHERE study_id = '{study_id}'
+                query = """SELECT data from trial_data INNER JOIN (
+                    SELECT trial_id FROM trial WHERE study_id = %s
                 ) as tt ON tt.trial_id = trial_data.trial_id;"""
+                args = [study_id]
             else:
-                ms = timestamp.ToMilliseconds()
-                query = f"""SELECT data from trial_data INNER JOIN (
+                query = """SELECT data from trial_data INNER JOIN (
                     SELECT trial_id FROM trial
-                    WHERE study_id = '{study_id}' AND timestamp >= FROM_UNIXTIME({ms}/1000)
+                    WHERE study_id = %s AND timestamp >= FROM_UNIXTIME(%s / 1000)
                 ) as tt ON tt.trial_id = trial_data.trial_id;"""
-        with self._connection.cursor() as cursor:
-            cursor.execute(query=query)
+                args = [study_id, timestamp.ToMilliseconds()]
+        with self._pool.connection() as connection, connection.cursor() as cursor:
+            cursor.execute(query, args)
             data = cursor.fetchall()
         return [TrialProto.FromString(row["data"]) for row in data]
 
     @_retry
     def get_trial(self, trial_id: str, study_id: Optional[str] = None) -> TrialProto:
-        query = f"""SELECT data FROM trial_data WHERE trial_id = '{trial_id}';"""
-        with self._connection.cursor() as cursor:
-            cursor.execute(query=query)
+        query = """SELECT data FROM trial_data WHERE trial_id = %s;"""
+        with self._pool.connection() as connection, connection.cursor() as cursor:
+            cursor.execute(query, (trial_id,))
             data = cursor.fetchall()
         if not data:
             raise NotFoundError("")
@@ -169,37 +257,99 @@ class MySQLBackend(StorageBackend):
 
     @_retry
     def write_study(self, study: StudyInfo) -> None:
-        with self._connection.cursor() as cursor:
-            self._connection.begin()
-            query = f"""
-            INSERT INTO study VALUES('{study.study_id}', CURRENT_TIMESTAMP(6))
+        with self._pool.connection() as connection, connection.cursor() as cursor:
+            connection.begin()
+            query = """
+            INSERT INTO study VALUES(%s, CURRENT_TIMESTAMP(6))
             ON DUPLICATE KEY UPDATE timestamp = CURRENT_TIMESTAMP(6);
             """
-            cursor.execute(query=query)
-            hex_data = study.SerializeToString().hex()
-            query = f"""
-            INSERT INTO study_info VALUES('{study.study_id}', x'{hex_data}')
+            cursor.execute(query, (study.study_id,))
+            # Blobs are sent as binary parameters, not as hex literals.
+            query = """
+            INSERT INTO study_info VALUES(%s, %s)
             ON DUPLICATE KEY UPDATE info = VALUES(info);
             """
-            cursor.execute(query=query)
-            self._connection.commit()
+            cursor.execute(query, (study.study_id, study.SerializeToString()))
+            connection.commit()
 
     @_retry
     def write_trial(self, trial: TrialProto) -> None:
         import pymysql
 
-        with self._connection.cursor() as cursor:
-            self._connection.begin()
-            query = f"""
-            INSERT INTO trial VALUES('{trial.trial_id}', '{trial.study_id}', CURRENT_TIMESTAMP(6))
+        with self._pool.connection() as connection, connection.cursor() as cursor:
+            connection.begin()
+            query = """
+            INSERT INTO trial VALUES(%s, %s, CURRENT_TIMESTAMP(6))
+            ON DUPLICATE KEY UPDATE study_id = VALUES(study_id), timestamp = CURRENT_TIMESTAMP(6);
+            """
+            try:
+                cursor.execute(query, (trial.trial_id, trial.study_id))
+            except pymysql.err.IntegrityError:
+                raise NotFoundError("")  # TODO(tsuzuku)
+            query = """
+            INSERT INTO trial_data VALUES(%s, %s)
+            ON DUPLICATE KEY UPDATE data = VALUES(data);
+            """
+            cursor.execute(query, (trial.trial_id, trial.SerializeToString()))
+            connection.commit()
+
+    @_retry
+    def compare_and_write_trial(self, trial: TrialProto, expected: Optional[TrialProto]) -> None:
+        import pymysql
+
+        with self._pool.connection() as connection, connection.cursor() as cursor:
+            connection.begin()
+            # Lock the row (or the gap for a new trial) until the transaction ends.
+            query = """SELECT data FROM trial_data WHERE trial_id = %s FOR UPDATE;"""
+            cursor.execute(query, (trial.trial_id,))
+            data = cursor.fetchall()
+            current = TrialProto.FromString(data[0]["data"]) if data else None
+            if current != expected:
+                raise ConflictError(f"Trial with trial_id: '{trial.trial_id}' has been updated.")
+            query = """
+            INSERT INTO trial VALUES(%s, %s, CURRENT_TIMESTAMP(6))
             ON DUPLICATE KEY UPDATE study_id = VALUES(study_id), timestamp = CURRENT_TIMESTAMP(6);
             """
             try:
-                cursor.execute(query=query)
+                cursor.execute(query, (trial.trial_id, trial.study_id))
             except pymysql.err.IntegrityError:
                 raise NotFoundError("")  # TODO(tsuzuku)
-            query = f"""
-            INSERT INTO trial_data VALUES('{trial.trial_id}', x'{trial.SerializeToString().hex()}')
-            ON DUPLICATE KEY UPDATE data = x'{trial.SerializeToString().hex()}';
+            query = """
+            INSERT INTO trial_data VALUES(%s, %s)
+            ON DUPLICATE KEY UPDATE data = VALUES(data);
             """
-            cursor.execute(query=query)
+            cursor.execute(query, (trial.trial_id, trial.SerializeToString()))
+            connection.commit()
+
+    @_retry
+    def write_trials(self, trials: Sequence[TrialProto]) -> None:
+        import pymysql
+
+        if not trials:
+            return
+        with self._pool.connection() as connection, connection.cursor() as cursor:
+            connection.begin()
+            for begin in range(0, len(trials), _MAX_ROWS_PER_INSERT):
+                end = begin + _MAX_ROWS_PER_INSERT
+                chunk = trials[begin:end]
+                rows = ", ".join(["(%s, %s, CURRENT_TIMESTAMP(6))"] * len(chunk))
+                query = f"""
+                INSERT INTO trial VALUES {rows}
+                ON DUPLICATE KEY UPDATE
+                study_id = VALUES(study_id), timestamp = CURRENT_TIMESTAMP(6);
+                """
+                try:
+                    cursor.execute(
+                        query, [value for t in chunk for value in (t.trial_id, t.study_id)]
+                    )
+                except pymysql.err.IntegrityError:
+                    raise NotFoundError("")  # TODO(tsuzuku)
+                rows = ", ".join(["(%s, %s)"] * len(chunk))
+                query = f"""
+                INSERT INTO trial_data VALUES {rows}
+                ON DUPLICATE KEY UPDATE data = VALUES(data);
+                """
+                cursor.execute(
+                    query, [value for t in chunk for value in (t.trial_id, t.SerializeToString())]
+                )
+            connection.commit()
@@ -1,24 +1,41 @@
+import contextlib
+import datetime
+import os
 import shutil
+import struct
+import time
 import uuid
 from pathlib import Path
-from typing import List, Optional, Union
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Union
 
 from google.protobuf.timestamp_pb2 import Timestamp
 
-from optur.errors import NotFoundError
+from optur.errors import ConflictError, NotFoundError
 from optur.proto.study_pb2 import StudyInfo
 from optur.proto.study_pb2 import Trial as TrialProto
 from optur.storages.backends.backend import StorageBackend
 
+# Trial files modified within this margin before the given timestamp are read
+# to tolerate the coarse mtime granularity of some file systems.
+_MTIME_MARGIN_NS = 2 * 10**9
+# Seconds to wait for a trial lock held by another worker.
+_LOCK_TIMEOUT = 10.0
+# Trial locks older than this are left by crashed workers. Locks are held only while
+# a trial is compared and written, which takes far less time.
+_STALE_LOCK_AGE_NS = 60 * 10**9
+
 
 # The directory structure will be like
 # ```
 # root_dir/
 #   .tmp/
+#   .timestamp
 #   optur_study_{study_id}/
 #     study_info.pb
 #     trial_{trial_id}.pb
 #     trial_{trial_id}.pb
+#     trial_{trial_id}.lock  # Exists only while the trial is compared and written.
+#     trial_{trial_id}.lock.{random_id}.broken  # Exists only while a stale lock is broken.
 #   optur_study_{study_id}/
 # ```
 class PosixStorageBackend(StorageBackend):
@@ -33,9 +50,25 @@ class PosixStorageBackend(StorageBackend):
         # on a different storages, the move operation fails.
         self._tmpdir = self._root_dir / ".tmp"
         self._tmpdir.mkdir(exist_ok=True)
+        # The mtime of this file is used as the clock shared by all workers, so that
+        # timestamps are comparable with mtimes of trial files even when clocks of the
+        # workers are not synchronized (e.g., NFS sets mtimes by the server's clock).
+        self._timestamp_file = self._root_dir / ".timestamp"
+        self._last_timestamp_ns = 0
+        # Mapping from a trial ID to its study directory, so that `get_trial` without
+        # a study ID does not scan all studies. Trials never move to other studies.
+        self._trial_study_dirs: Dict[str, Path] = {}
 
     def get_current_timestamp(self) -> Optional[Timestamp]:
-        return None
+        self._timestamp_file.touch(exist_ok=True)
+        # Make the timestamp monotonic even if the file is touched by other workers
+        # with older clocks.
+        self._last_timestamp_ns = max(
+            self._last_timestamp_ns, self._timestamp_file.stat().st_mtime_ns
+        )
+        timestamp = Timestamp()
+        timestamp.FromNanoseconds(self._last_timestamp_ns)
+        return timestamp
 
     def _get_study_dir(self, study_id: str) -> Path:
         return self._root_dir / f"optur_study_{study_id}"
@@ -64,7 +97,6 @@ class PosixStorageBackend(StorageBackend):
         self, study_id: Optional[str] = None, timestamp: Optional[Timestamp] = None
     ) -> List[TrialProto]:
         # Note, this method is "atomic".
-        # TODO(tsuzuku): Support timestamp (as an optional feature).
         if study_id is None:
             ret: List[TrialProto] = []
             for study_dir in self._root_dir.glob("optur_study_*"):
@@ -79,20 +111,33 @@ class PosixStorageBackend(StorageBackend):
 
     def _get_trials(self, study_dir: Path, timestamp: Optional[Timestamp]) -> List[TrialProto]:
         ret: List[TrialProto] = []
-        for trial_file in study_dir.glob("trial_*.pb"):
-            if not trial_file.is_file():
-                pass
-            with trial_file.open("rb") as f:
-                ret.append(TrialProto.FromString(f.read()))
+        # Trial files are replaced on write, so their mtimes are the last write time.
+        threshold = timestamp.ToNanoseconds() - _MTIME_MARGIN_NS if timestamp is not None else None
+        with os.scandir(study_dir) as entries:
+            for entry in entries:
+                if not entry.name.startswith("trial_") or not entry.name.endswith(".pb"):
+                    continue
+                if not entry.is_file():
+                    continue
+                if threshold is not None and entry.stat().st_mtime_ns < threshold:
+                    continue
+                with open(entry.path, "rb") as f:
+                    ret.append(TrialProto.FromString(f.read()))
         return ret
 
     def get_trial(self, trial_id: str, study_id: Optional[str] = None) -> TrialProto:
         if study_id is None:
+            study_dir = self._trial_study_dirs.get(trial_id)
+            if study_dir is not None:
+                ret = self._get_trial(trial_id=trial_id, study_dir=study_dir)
+                if ret is not None:
+                    return ret
             for directory in self._root_dir.glob("optur_study_*"):
                 if not directory.is_dir():
                     continue
                 ret = self._get_trial(trial_id=trial_id, study_dir=directory)
                 if ret is not None:
+                    self._trial_study_dirs[trial_id] = directory
                     return ret
             raise NotFoundError("")  # TODO(tsuzuku)
         study_dir = self._get_study_dir(study_id=study_id)
@@ -128,3 +173,221 @@ class PosixStorageBackend(StorageBackend):
         with tmpfile.open("wb") as f:
             f.write(trial.SerializeToString())
         shutil.move(src=str(tmpfile), dst=trial_file)
+        self._trial_study_dirs[trial.trial_id] = study_dir
+
+    def write_trials(self, trials: Sequence[TrialProto]) -> None:
+        # Each trial has its own file, so there is nothing to share among trials.
+        for trial in trials:
+            self.write_trial(trial=trial)
+
+    def compare_and_write_trial(self, trial: TrialProto, expected: Optional[TrialProto]) -> None:
+        """Write the trial only if the stored trial is ``expected``.
+
+        The comparison and the write are atomic only against other calls of this method.
+        Plain :meth:`write_trial` calls do not take the lock of the trial, so they might be
+        lost if they race with this method.
+        """
+        study_dir = self._get_study_dir(study_id=trial.study_id)
+        if not study_dir.is_dir():
+            raise NotFoundError("")  # TODO(tsuzuku)
+        with self._lock_trial(study_dir=study_dir, trial_id=trial.trial_id):
+            current = self._get_trial(trial_id=trial.trial_id, study_dir=study_dir)
+            if current != expected:
+                raise ConflictError(f"Trial with trial_id: '{trial.trial_id}' has been updated.")
+            self.write_trial(trial=trial)
+
+    @contextlib.contextmanager
+    def _lock_trial(self, study_dir: Path, trial_id: str) -> Iterator[None]:
+        # `O_EXCL` makes the creation atomic, including on NFSv3 and later.
+        lock_file = study_dir / f"trial_{trial_id}.lock"
+        # The owner token tells whether the lock is still held by this call on release.
+        token = uuid.uuid4().hex.encode()
+        deadline = time.monotonic() + _LOCK_TIMEOUT
+        while True:
+            try:
+                fd = os.open(lock_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if self._break_stale_lock(lock_file):
+                    continue
+                if time.monotonic() > deadline:
+                    raise ConflictError(f"Trial with trial_id: '{trial_id}' is locked.")
+                time.sleep(0.01)
+                continue
+            try:
+                os.write(fd, token)
+            finally:
+                os.close(fd)
+            break
+        try:
+            yield
+        finally:
+            # The lock might have been broken by another worker if this call took too long.
+            if _read_lock_owner(lock_file) == token:
+                os.remove(lock_file)
+
+    def _break_stale_lock(self, lock_file: Path) -> bool:
+        """Remove the lock if it's left by a crashed worker.
+
+        Returns :obj:`True` if the lock might be taken now.
+        """
+        try:
+            stat = lock_file.stat()
+        except FileNotFoundError:
+            return True
+        # Compare the mtime with the clock of the file system, not with the local clock.
+        now = self.get_current_timestamp()
+        assert now is not None
+        if now.ToNanoseconds() - stat.st_mtime_ns <= _STALE_LOCK_AGE_NS:
+            return False
+        # The lock might have been broken and taken again by another worker after `stat`,
+        # so move the lock atomically and check that it's the stale one before removing it.
+        broken_file = lock_file.with_name(f"{lock_file.name}.{uuid.uuid4().hex}.broken")
+        try:
+            os.rename(lock_file, broken_file)
+        except FileNotFoundError:
+            # Another worker has broken the lock.
+            return True
+        moved = broken_file.stat()
+        if (moved.st_ino, moved.st_mtime_ns) != (stat.st_ino, stat.st_mtime_ns):
+            # Put back the lock of the other worker. `link` never replaces a lock taken in
+            # the meantime, which is the only case where two workers might hold the lock.
+            with contextlib.suppress(FileExistsError):
+                os.link(broken_file, lock_file)
+        os.remove(broken_file)
+        return True
+
+
+def _read_lock_owner(lock_file: Path) -> Optional[bytes]:
+    try:
+        with lock_file.open("rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+# Each record is a serialized trial prefixed by its length.
+_RECORD_HEADER = struct.Struct("<I")
+
+
+class _CachedTrial(NamedTuple):
+    trial: TrialProto
+    # Time when this instance read the trial, in nanoseconds since epoch.
+    observed_at: int
+
+
+# The directory structure will be like
+# ```
+# root_dir/
+#   .tmp/
+#   optur_study_{study_id}/
+#     study_info.pb
+#     segment_{writer_id}.log
+#     segment_{writer_id}.log
+#     trial_{trial_id}.lock
+#   optur_study_{study_id}/
+# ```
+class LogStructuredPosixStorageBackend(PosixStorageBackend):
+    """A POSIX storage backend that appends trials to log files.
+
+    Each instance appends trials only to its own segment file in each study directory,
+    so segments never have concurrent writers. Readers remember how far they have read
+    each segment and only read newly appended records.
+    When several segments have the same trial, the one with the latest
+    ``last_update_time`` wins, which is set by this class on write.
+
+    Segments are never compacted, so this backend is suitable for studies where each trial
+    is written a few times.
+    """
+
+    def __init__(self, root_dir: Union[str, Path]) -> None:
+        super().__init__(root_dir=root_dir)
+        self._writer_id = uuid.uuid4().hex
+        # Mapping from a segment to the offset that this instance has read up to.
+        self._offsets: Dict[Path, int] = {}
+        # Mapping from a study directory to the latest trials in the study.
+        self._cached_trials: Dict[Path, Dict[str, _CachedTrial]] = {}
+
+    def get_current_timestamp(self) -> Optional[Timestamp]:
+        return _now()
+
+    def _get_segment_file(self, study_dir: Path) -> Path:
+        ret: Path = study_dir / f"segment_{self._writer_id}.log"
+        return ret
+
+    def _sync_study(self, study_dir: Path) -> Dict[str, _CachedTrial]:
+        cached_trials = self._cached_trials.setdefault(study_dir, {})
+        for segment in study_dir.glob("segment_*.log"):
+            offset = self._offsets.get(segment, 0)
+            with segment.open("rb") as f:
+                f.seek(offset)
+                data = f.read()
+            observed_at = _now().ToNanoseconds()
+            pos = 0
+            # The last record might be partially written.
+            while pos + _RECORD_HEADER.size <= len(data):
+                (size,) = _RECORD_HEADER.unpack_from(data, pos)
+                record_end = pos + _RECORD_HEADER.size + size
+                if record_end > len(data):
+                    break
+                record_begin = pos + _RECORD_HEADER.size
+                trial = TrialProto.FromString(data[record_begin:record_end])
+                cached = cached_trials.get(trial.trial_id)
+                if cached is None or _is_newer(trial, cached.trial):
+                    cached_trials[trial.trial_id] = _CachedTrial(
+                        trial=trial, observed_at=observed_at
+                    )
+                pos = record_end
+            self._offsets[segment] = offset + pos
+        return cached_trials
+
+    def _get_trials(self, study_dir: Path, timestamp: Optional[Timestamp]) -> List[TrialProto]:
+        cached_trials = self._sync_study(study_dir=study_dir)
+        if timestamp is None:
+            return [cached.trial for cached in cached_trials.values()]
+        # Compare with the time when this instance read the trials rather than
+        # `last_update_time`, which depends on the clocks of writers.
+        threshold = timestamp.ToNanoseconds()
+        return [
+            cached.trial for cached in cached_trials.values() if cached.observed_at >= threshold
+        ]
+
+    def _get_trial(self, trial_id: str, study_dir: Path) -> Optional[TrialProto]:
+        cached = self._sync_study(study_dir=study_dir).get(trial_id)
+        return cached.trial if cached is not None else None
+
+    def write_trial(self, trial: TrialProto) -> None:
+        self.write_trials(trials=[trial])
+
+    def write_trials(self, trials: Sequence[TrialProto]) -> None:
+        # Records of each study are appended to the segment at once.
+        records: Dict[Path, List[bytes]] = {}
+        for trial in trials:
+            study_dir = self._get_study_dir(study_id=trial.study_id)
+            if study_dir not in records:
+                if not study_dir.is_dir():
+                    raise NotFoundError("")  # TODO(tsuzuku)
+                records[study_dir] = []
+            new_trial = TrialProto()
+            new_trial.CopyFrom(trial)
+            new_trial.last_update_time.CopyFrom(_now())
+            data = new_trial.SerializeToString()
+            records[study_dir].append(_RECORD_HEADER.pack(len(data)) + data)
+            self._trial_study_dirs[trial.trial_id] = study_dir
+        for study_dir, study_records in records.items():
+            with self._get_segment_file(study_dir=study_dir).open("ab") as f:
+                # Write records at once so that readers never see a header without
+                # the record on local file systems.
+                f.write(b"".join(study_records))
+
+
+def _now() -> Timestamp:
+    timestamp = Timestamp()
+    timestamp.FromDatetime(datetime.datetime.now())
+    return timestamp
+
+
+def _is_newer(a: TrialProto, b: TrialProto) -> bool:
+    return (a.last_update_time.seconds, a.last_update_time.nanos) >= (
+        b.last_update_time.seconds,
+        b.last_update_time.nanos,
+    )
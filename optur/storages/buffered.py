@@ -0,0 +1,114 @@
+import time
+from collections import OrderedDict
+from typing import List, Optional, Sequence
+
+from google.protobuf.timestamp_pb2 import Timestamp
+
+from optur.proto import storage_pb2
+from optur.proto.study_pb2 import StudyInfo
+from optur.proto.study_pb2 import Trial as TrialProto
+from optur.storages.storage import StorageClient
+
+_FINISHED_STATES = (
+    TrialProto.State.COMPLETED,
+    TrialProto.State.PRUNED,
+    TrialProto.State.FAILED,
+)
+
+
+class BufferedStorageClient(StorageClient):
+    """A client that buffers trial writes and sends them to the wrapped client in batches.
+
+    Writes of the same trial are coalesced, and only the latest version is sent.
+    Buffered trials are sent by :meth:`~optur.storages.StorageClient.write_trials` when
+
+    * the number of buffered trials reaches ``max_buffered_trials``,
+    * the oldest buffered write is older than ``max_delay`` seconds,
+    * a finished (completed, pruned, or failed) trial is written,
+    * a method that reads trials is called, or
+    * :meth:`flush` is called.
+
+    The delay is checked only when trials are written; there is no background thread.
+    Trials are sent in the order of their latest writes, so the storage sees the writes of
+    this client in the same order as they are made, except for the coalesced ones.
+    Call :meth:`flush` before discarding this client.
+
+    Args:
+        client:
+            A client to wrap.
+        max_buffered_trials:
+            The maximum number of trials to buffer.
+        max_delay:
+            The maximum time in seconds that a write can be buffered.
+    """
+
+    def __init__(
+        self, client: StorageClient, max_buffered_trials: int = 64, max_delay: float = 1.0
+    ) -> None:
+        if max_buffered_trials < 1:
+            raise ValueError("max_buffered_trials must be positive.")
+        self._client = client
+        self._max_buffered_trials = max_buffered_trials
+        self._max_delay = max_delay
+        self._buffer: "OrderedDict[str, TrialProto]" = OrderedDict()
+        self._oldest_write_time: Optional[float] = None
+
+    def flush(self) -> None:
+        """Send all buffered trials to the wrapped client."""
+        if not self._buffer:
+            return
+        # Keep the buffer until the write succeeds so that the trials are not lost on errors.
+        self._client.write_trials(trials=list(self._buffer.values()))
+        self._buffer.clear()
+        self._oldest_write_time = None
+
+    def get_current_timestamp(self) -> Optional[Timestamp]:
+        return self._client.get_current_timestamp()
+
+    def get_studies(self, timestamp: Optional[Timestamp] = None) -> List[StudyInfo]:
+        return self._client.get_studies(timestamp=timestamp)
+
+    def get_trials(
+        self, study_id: Optional[str] = None, timestamp: Optional[Timestamp] = None
+    ) -> List[TrialProto]:
+        self.flush()
+        return self._client.get_trials(study_id=study_id, timestamp=timestamp)
+
+    def get_trial(self, trial_id: str, study_id: Optional[str] = None) -> TrialProto:
+        self.flush()
+        return self._client.get_trial(trial_id=trial_id, study_id=study_id)
+
+    def write_study(self, study: StudyInfo) -> None:
+        self._client.write_study(study=study)
+
+    def write_trial(self, trial: TrialProto) -> None:
+        self.write_trials(trials=[trial])
+
+    def write_trials(self, trials: Sequence[TrialProto]) -> None:
+        if self._oldest_write_time is None:
+            self._oldest_write_time = time.monotonic()
+        finished = False
+        for trial in trials:
+            # Callers may keep modifying their protos after writing them.
+            new_trial = TrialProto()
+            new_trial.CopyFrom(trial)
+            self._buffer[trial.trial_id] = new_trial
+            # Keep the buffer ordered by the latest write.
+            self._buffer.move_to_end(trial.trial_id)
+            finished = finished or trial.last_known_state in _FINISHED_STATES
+        if (
+            finished
+            or len(self._buffer) >= self._max_buffered_trials
+            or time.monotonic() - self._oldest_write_time >= self._max_delay
+        ):
+            self.flush()
+
+    def compare_and_write_trial(self, trial: TrialProto, expected: Optional[TrialProto]) -> None:
+        # Buffered writes must reach the storage before the comparison.
+        self.flush()
+        self._client.compare_and_write_trial(trial=trial, expected=expected)
+
+    def execute_batch(self, requests: Sequence[storage_pb2.Request]) -> List[storage_pb2.Reply]:
+        # Requests in the batch might read the buffered trials.
+        self.flush()
+        return self._client.execute_batch(requests=requests)
@@ -1,8 +1,17 @@
+import concurrent.futures
+import functools
 import pathlib
-from typing import Union
+from typing import Optional, Union
 
+from optur.storages.async_storage import AsyncStorage
+from optur.storages.backends.backend import StorageBackend
+from optur.storages.backends.caching import CachingStorageBackend
 from optur.storages.backends.inmemory import InMemoryStorageBackend
-from optur.storages.backends.posix import PosixStorageBackend
+from optur.storages.backends.mysql import MySQLBackend
+from optur.storages.backends.posix import (
+    LogStructuredPosixStorageBackend,
+    PosixStorageBackend,
+)
 from optur.storages.storage import Storage
 
 
@@ -10,5 +19,68 @@ def create_inmemory_storage() -> Storage:
     return Storage(backend=InMemoryStorageBackend())
 
 
-def create_posix_storage(root_dir: Union[str, pathlib.Path]) -> Storage:
-    return Storage(backend=PosixStorageBackend(root_dir=root_dir))
+def create_posix_storage(
+    root_dir: Union[str, pathlib.Path], *, log_structured: bool = False, n_handlers: int = 1
+) -> Storage:
+    backend_cls = LogStructuredPosixStorageBackend if log_structured else PosixStorageBackend
+    backend_factory = functools.partial(backend_cls, root_dir=root_dir)
+    return Storage(
+        backend=backend_factory(), n_handlers=n_handlers, backend_factory=backend_factory
+    )
+
+
+def create_mysql_storage(
+    *,
+    host: str,
+    user: str,
+    port: int = 3306,
+    password: str,
+    database: str,
+    n_handlers: int = 1,
+    pool_size: Optional[int] = None,
+    max_cached_trials: Optional[int] = None,
+) -> Storage:
+    # The backend is thread-safe, so handlers share the backend and its connection pool.
+    # By default, each handler can use its own connection.
+    backend: StorageBackend = MySQLBackend(
+        host=host,
+        user=user,
+        port=port,
+        password=password,
+        database=database,
+        pool_size=pool_size or n_handlers,
+    )
+    if max_cached_trials is not None:
+        # Handlers also share the cache, so trials loaded for a client are reused for others.
+        backend = CachingStorageBackend(backend=backend, max_cached_trials=max_cached_trials)
+    return Storage(backend=backend, n_handlers=n_handlers, backend_factory=lambda: backend)
+
+
+def create_async_inmemory_storage() -> AsyncStorage:
+    # The in-memory storage never blocks, so it's called from the event loop directly.
+    return AsyncStorage(storage=create_inmemory_storage())
+
+
+def create_async_mysql_storage(
+    *,
+    host: str,
+    user: str,
+    port: int = 3306,
+    password: str,
+    database: str,
+    pool_size: int = 1,
+) -> AsyncStorage:
+    backend = MySQLBackend(
+        host=host,
+        user=user,
+        port=port,
+        password=password,
+        database=database,
+        pool_size=pool_size,
+    )
+    # The backend is thread-safe, so queries run concurrently in a thread for each connection.
+    return AsyncStorage(
+        storage=Storage(backend=backend),
+        executor=concurrent.futures.ThreadPoolExecutor(max_workers=pool_size),
+        thread_safe=True,
+    )
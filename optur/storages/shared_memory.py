@@ -0,0 +1,136 @@
+import struct
+import uuid
+from typing import TYPE_CHECKING, List, Sequence
+
+from optur.proto.study_pb2 import Trial as TrialProto
+
+if TYPE_CHECKING:
+    from multiprocessing.shared_memory import SharedMemory
+
+# The layout of the shared memory will be like
+# ```
+# header: (max_records: uint64, n_records: uint64, data_size: uint64)
+# index: uint64[max_records]  # The end offset of each record in the data region.
+# data: bytes[]  # Serialized trials.
+# ```
+_HEADER = struct.Struct("<QQQ")
+_OFFSET = struct.Struct("<Q")
+
+
+class SharedTrialLog:
+    """Append-only log of serialized trials in shared memory.
+
+    Only one process (typically the process that runs :class:`~optur.storages.Storage`)
+    appends trials to the log, and other processes read the trials without receiving them
+    through pipes.
+    The header is updated after the records and the index are written, so readers never
+    see partially written records.
+
+    Use :meth:`create` in the writer process and :meth:`attach` in reader processes.
+    """
+
+    def __init__(self, shm: "SharedMemory", *, writable: bool) -> None:
+        self._shm = shm
+        self._writable = writable
+        self._max_records: int = _HEADER.unpack_from(self._buf, 0)[0]
+        self._index_offset = _HEADER.size
+        self._data_offset = self._index_offset + _OFFSET.size * self._max_records
+
+    @classmethod
+    def create(cls, size: int, max_records: int) -> "SharedTrialLog":
+        """Create a new log.
+
+        Args:
+            size:
+                Size of the shared memory in bytes.
+            max_records:
+                The maximum number of records in the log.
+        """
+        from multiprocessing import shared_memory
+
+        if size <= _HEADER.size + _OFFSET.size * max_records:
+            raise ValueError(f"{size} bytes are too small to store {max_records} records.")
+        shm = shared_memory.SharedMemory(
+            name=f"optur_{uuid.uuid4().hex[:16]}", create=True, size=size
+        )
+        buf = shm.buf
+        assert buf is not None
+        _HEADER.pack_into(buf, 0, max_records, 0, 0)
+        return cls(shm, writable=True)
+
+    @classmethod
+    def attach(cls, name: str) -> "SharedTrialLog":
+        """Attach to an existing log created by :meth:`create`."""
+        from multiprocessing import shared_memory
+
+        return cls(shared_memory.SharedMemory(name=name), writable=False)
+
+    @property
+    def _buf(self) -> memoryview:
+        buf = self._shm.buf
+        assert buf is not None, "The log is closed."
+        return buf
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    @property
+    def n_records(self) -> int:
+        n_records: int = _HEADER.unpack_from(self._buf, 0)[1]
+        return n_records
+
+    def append(self, trials: Sequence[TrialProto]) -> bool:
+        """Append trials to the log.
+
+        Returns:
+            :obj:`False` when the log does not have enough space for the trials.
+            No trial is appended in that case.
+        """
+        assert self._writable, "Only the creator of the log can append trials."
+        buf = self._buf
+        _, n_records, data_size = _HEADER.unpack_from(buf, 0)
+        payloads = [trial.SerializeToString() for trial in trials]
+        if n_records + len(payloads) > self._max_records:
+            return False
+        if self._data_offset + data_size + sum(map(len, payloads)) > self._shm.size:
+            return False
+        for payload in payloads:
+            record_begin = self._data_offset + data_size
+            record_end = record_begin + len(payload)
+            buf[record_begin:record_end] = payload
+            data_size += len(payload)
+            _OFFSET.pack_into(buf, self._index_offset + _OFFSET.size * n_records, data_size)
+            n_records += 1
+        # Publish the new records.
+        _HEADER.pack_into(buf, 0, self._max_records, n_records, data_size)
+        return True
+
+    def read(self, begin: int, end: int) -> List[TrialProto]:
+        """Read records in ``[begin, end)``.
+
+        ``end`` must not be greater than :attr:`n_records`.
+        """
+        buf = self._buf
+        ret: List[TrialProto] = []
+        offset = 0 if begin == 0 else self._end_offset(begin - 1)
+        for idx in range(begin, end):
+            next_offset = self._end_offset(idx)
+            record_begin = self._data_offset + offset
+            record_end = self._data_offset + next_offset
+            ret.append(TrialProto.FromString(bytes(buf[record_begin:record_end])))
+            offset = next_offset
+        return ret
+
+    def _end_offset(self, idx: int) -> int:
+        index_offset = self._index_offset + _OFFSET.size * idx
+        offset: int = _OFFSET.unpack_from(self._buf, index_offset)[0]
+        return offset
+
+    def close(self) -> None:
+        self._shm.close()
+
+    def unlink(self) -> None:
+        """Close and remove the shared memory. Only the creator of the log calls this method."""
+        self._shm.close()
+        self._shm.unlink()
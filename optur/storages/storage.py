@@ -1,14 +1,28 @@
 import abc
+import bisect
+import functools
+import queue
+import threading
 from multiprocessing import Pipe, Queue
 from multiprocessing.connection import Connection
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
 
 from google.protobuf.timestamp_pb2 import Timestamp
 
+from optur.errors import ConflictError
 from optur.proto import storage_pb2
 from optur.proto.study_pb2 import StudyInfo
 from optur.proto.study_pb2 import Trial as TrialProto
 from optur.storages.backends.backend import StorageBackend
+from optur.storages.shared_memory import SharedTrialLog
+
+_DEFAULT_SHARED_TRIAL_LOG_SIZE = 32 * 1024 * 1024
+# Used to bound the size of the index of shared trial logs.
+_MIN_TRIAL_SIZE_IN_SHARED_TRIAL_LOG = 512
+# A request and the queue to put its reply.
+_LocalCommand = Tuple[storage_pb2.Request, "queue.SimpleQueue[storage_pb2.Reply]"]
+# A request and the function to send its reply.
+_Command = Tuple[storage_pb2.Request, Callable[[storage_pb2.Reply], None]]
 
 
 class StorageClient(abc.ABC):
@@ -120,6 +134,112 @@ class StorageClient(abc.ABC):
         """
         pass
 
+    @abc.abstractclassmethod
+    def write_trials(self, trials: Sequence[TrialProto]) -> None:
+        """Write multiple :class:`~optur.proto.study_pb2.Trial` to the storage at once.
+
+        Args:
+            trials:
+                A sequence of :class:`~optur.proto.study_pb2.Trial` to write.
+        """
+        pass
+
+    @abc.abstractclassmethod
+    def compare_and_write_trial(self, trial: TrialProto, expected: Optional[TrialProto]) -> None:
+        """Write :class:`~optur.proto.study_pb2.Trial` only if the stored trial is ``expected``.
+
+        Args:
+            trial:
+                A :class:`~optur.proto.study_pb2.Trial` to write.
+            expected:
+                The trial read from the storage. :obj:`None` means that the trial must not exist.
+
+        Raises:
+            :class:`~optur.errors.ConflictError`:
+                If the stored trial is not ``expected``.
+        """
+        pass
+
+    @abc.abstractclassmethod
+    def execute_batch(self, requests: Sequence[storage_pb2.Request]) -> List[storage_pb2.Reply]:
+        """Execute several requests at once.
+
+        Requests are executed in order, and the replies are returned in the same order.
+        Clients that communicate with the storage via IPC send all the requests in a single
+        round trip, so batching independent operations (e.g., fetching the current timestamp
+        and trials) reduces the latency and the load on the storage.
+
+        Args:
+            requests:
+                A sequence of :class:`~optur.proto.storage_pb2.Request`.
+                The ``thread_id`` field of the requests is ignored.
+
+        Returns:
+            A list of :class:`~optur.proto.storage_pb2.Reply`.
+            Invalid requests in the batch, i.e., ``stop`` requests, get empty replies.
+        """
+        pass
+
+
+class _TrialVersions:
+    """Versions of trials that the storage has published.
+
+    A sequence number is assigned to each distinct content of each trial,
+    so that unchanged trials are not published twice.
+    """
+
+    def __init__(self) -> None:
+        # Mapping from trial_id to (digest, sequence number).
+        self._versions: Dict[str, Tuple[int, int]] = {}
+        self._n_versions = 0
+
+    @property
+    def n_versions(self) -> int:
+        return self._n_versions
+
+    def update(self, trial: TrialProto) -> int:
+        """Record the trial and return the sequence number of its content."""
+        digest = hash(trial.SerializeToString(deterministic=True))
+        version = self._versions.get(trial.trial_id)
+        if version is not None and version[0] == digest:
+            return version[1]
+        self._n_versions += 1
+        self._versions[trial.trial_id] = (digest, self._n_versions)
+        return self._n_versions
+
+
+class _TrialPublication:
+    """Trials of a study published to a shared trial log."""
+
+    def __init__(self, log: SharedTrialLog) -> None:
+        self.log = log
+        self.versions = _TrialVersions()
+        self.available = True
+        # Server-timestamp taken just before the last publication.
+        self.timestamp: Optional[Timestamp] = None
+        # Server-timestamp (in nanoseconds) and the number of records
+        # taken just before each publication.
+        self.mark_timestamps: List[int] = []
+        self.mark_n_records: List[int] = []
+
+    def find_first_record(self, timestamp: Optional[Timestamp]) -> int:
+        """Find the first record that might be updated on or after the timestamp."""
+        if timestamp is None:
+            return 0
+        # Trials updated on or after the timestamp are fetched by the last publication
+        # that started before the timestamp or the subsequent publications.
+        idx = bisect.bisect_right(self.mark_timestamps, timestamp.ToNanoseconds()) - 1
+        return self.mark_n_records[idx] if idx >= 0 else 0
+
+
+class _SyncCursor(NamedTuple):
+    cursor: int
+    # Server-timestamp taken just before the last sync.
+    timestamp: Optional[Timestamp]
+    # Trials read by the last sync, which the client already has.
+    # Trials updated after the timestamp are read again by the next sync.
+    trials: Dict[str, TrialProto]
+
 
 class Storage(StorageClient):
     """Storage class that has a StorageBackend.
@@ -135,35 +255,220 @@ class Storage(StorageClient):
     To circumvent the restrictions, this class provides `create_trial` method.
     This method creates a `StorageClient` instance that communicates to the storage backend
     via this class.
+
+    By default, :meth:`run` handles requests from the clients one by one.
+    When ``n_handlers`` is greater than one, :meth:`run` handles requests in
+    ``n_handlers`` threads, and each thread uses its own backend created by
+    ``backend_factory``. The backends must share the same data, e.g., the same database.
+
+    For :class:`~optur.proto.storage_pb2.SyncTrialsRequest`, this class keeps a cursor per
+    client (i.e., per ``thread_id``) and study, which holds the trials read by the last sync
+    of the client, so that only trials changed since then are sent to the client.
+
+    Args:
+        backend:
+            The backend used by this instance.
+        n_handlers:
+            The number of threads that handle requests from the clients in :meth:`run`.
+        backend_factory:
+            A function that creates a backend for each handler thread.
+            Required when ``n_handlers`` is greater than one.
     """
 
-    def __init__(self, backend: StorageBackend) -> None:
+    def __init__(
+        self,
+        backend: StorageBackend,
+        *,
+        n_handlers: int = 1,
+        backend_factory: Optional[Callable[[], StorageBackend]] = None,
+    ) -> None:
         super().__init__()
+        if n_handlers < 1:
+            raise ValueError("n_handlers must be positive.")
+        if n_handlers > 1 and backend_factory is None:
+            raise ValueError("backend_factory is required to run multiple handlers.")
         self._backend = backend
+        self._n_handlers = n_handlers
+        self._backend_factory = backend_factory
+        # Holds the backend of each handler thread.
+        self._local = threading.local()
+        # Guards `_publications`.
+        self._publication_lock = threading.Lock()
         self._cmd_queue: "Queue[bytes]" = Queue()
         self._write_conns: Dict[int, Connection] = {}
+        # Requests from clients in the same process. See `create_client`.
+        self._local_cmd_queue: "queue.SimpleQueue[_LocalCommand]" = queue.SimpleQueue()
+        self._use_multiprocess: Optional[bool] = None
+        # Mapping from study_id to trials published to the shared memory.
+        self._publications: Dict[str, _TrialPublication] = {}
+        # Guards `_sync_cursors` and `_n_sync_cursors`.
+        self._sync_lock = threading.Lock()
+        # Mapping from (thread_id, study_id) to the cursor of the last sync of the client.
+        self._sync_cursors: Dict[Tuple[int, str], _SyncCursor] = {}
+        self._n_sync_cursors = 0
 
     def get_current_timestamp(self) -> Optional[Timestamp]:
-        return self._backend.get_current_timestamp()
+        return self._get_backend().get_current_timestamp()
 
     def get_studies(self, timestamp: Optional[Timestamp] = None) -> List[StudyInfo]:
-        return self._backend.get_studies(timestamp=timestamp)
+        return self._get_backend().get_studies(timestamp=timestamp)
 
     def get_trials(
         self, study_id: Optional[str] = None, timestamp: Optional[Timestamp] = None
     ) -> List[TrialProto]:
-        return self._backend.get_trials(study_id=study_id, timestamp=timestamp)
+        return self._get_backend().get_trials(study_id=study_id, timestamp=timestamp)
 
     def get_trial(self, trial_id: str, study_id: Optional[str] = None) -> TrialProto:
-        return self._backend.get_trial(trial_id=trial_id, study_id=study_id)
+        return self._get_backend().get_trial(trial_id=trial_id, study_id=study_id)
 
     def write_study(self, study: StudyInfo) -> None:
-        return self._backend.write_study(study=study)
+        return self._get_backend().write_study(study=study)
 
     def write_trial(self, trial: TrialProto) -> None:
-        return self._backend.write_trial(trial=trial)
+        return self._get_backend().write_trial(trial=trial)
+
+    def write_trials(self, trials: Sequence[TrialProto]) -> None:
+        return self._get_backend().write_trials(trials=trials)
+
+    def compare_and_write_trial(self, trial: TrialProto, expected: Optional[TrialProto]) -> None:
+        return self._get_backend().compare_and_write_trial(trial=trial, expected=expected)
 
-    def create_client(self, thread_id: int) -> StorageClient:
+    def _get_backend(self) -> StorageBackend:
+        backend: StorageBackend = getattr(self._local, "backend", self._backend)
+        return backend
+
+    def execute_batch(self, requests: Sequence[storage_pb2.Request]) -> List[storage_pb2.Reply]:
+        return self._handle_batch(requests=requests, thread_id=0)
+
+    def _handle_batch(
+        self, requests: Sequence[storage_pb2.Request], thread_id: int
+    ) -> List[storage_pb2.Reply]:
+        replies: List[storage_pb2.Reply] = []
+        for request in requests:
+            if request.HasField("stop"):
+                # `stop` is not a valid request in a batch, and it gets an empty reply.
+                replies.append(storage_pb2.Reply())
+            else:
+                replies.append(self._handle_request(request=request, thread_id=thread_id))
+        return replies
+
+    def create_shared_trial_log(
+        self, study_id: str, size: int = _DEFAULT_SHARED_TRIAL_LOG_SIZE
+    ) -> Optional[str]:
+        """Publish trials of the study to a :class:`~optur.storages.SharedTrialLog`.
+
+        Clients in other processes can read the trials of the study from the shared memory
+        through :class:`~optur.storages.SharedTrialLogClient`.
+        The log is append-only. When the log gets full, clients fall back to
+        :meth:`get_trials`.
+
+        Args:
+            study_id:
+                ID of the study to publish.
+            size:
+                Size of the shared memory in bytes.
+
+        Returns:
+            The name of the log, or :obj:`None` if shared memory is not available.
+        """
+        if study_id in self._publications:
+            return self._publications[study_id].log.name
+        try:
+            log = SharedTrialLog.create(
+                size=size, max_records=size // _MIN_TRIAL_SIZE_IN_SHARED_TRIAL_LOG
+            )
+        except (ImportError, OSError):
+            return None
+        self._publications[study_id] = _TrialPublication(log=log)
+        return log.name
+
+    def close_shared_trial_logs(self) -> None:
+        """Remove all shared trial logs created by this storage."""
+        for publication in self._publications.values():
+            publication.log.unlink()
+        self._publications.clear()
+
+    def _publish_trials(
+        self, study_id: str, timestamp: Optional[Timestamp]
+    ) -> storage_pb2.PublishTrialsReply:
+        # The log has a single writer, so publications are serialized.
+        with self._publication_lock:
+            publication = self._publications.get(study_id)
+            if publication is None or not publication.available:
+                return storage_pb2.PublishTrialsReply(unavailable=True)
+            new_timestamp = self.get_current_timestamp()
+            n_records = publication.log.n_records
+            n_versions = publication.versions.n_versions
+            trials = self.get_trials(study_id=study_id, timestamp=publication.timestamp)
+            new_trials = [
+                trial for trial in trials if publication.versions.update(trial) > n_versions
+            ]
+            if not publication.log.append(new_trials):
+                publication.available = False
+                return storage_pb2.PublishTrialsReply(unavailable=True)
+            publication.timestamp = new_timestamp
+            if new_timestamp is not None:
+                publication.mark_timestamps.append(new_timestamp.ToNanoseconds())
+                publication.mark_n_records.append(n_records)
+            return storage_pb2.PublishTrialsReply(
+                begin=publication.find_first_record(timestamp=timestamp),
+                end=publication.log.n_records,
+            )
+
+    def _sync_trials(
+        self, request: storage_pb2.SyncTrialsRequest, thread_id: int
+    ) -> storage_pb2.SyncTrialsReply:
+        key = (thread_id, request.study_id)
+        with self._sync_lock:
+            cursor = self._sync_cursors.get(key)
+            self._n_sync_cursors += 1
+            new_cursor_id = self._n_sync_cursors
+        if cursor is None or request.cursor == 0 or cursor.cursor != request.cursor:
+            # The client did not sync with the last cursor, e.g., other consumers share
+            # the thread_id (`Storage` used directly is thread_id 0), or the client lost
+            # the last reply. Fall back to the timestamp of the client.
+            cursor = _SyncCursor(
+                cursor=0,
+                timestamp=request.timestamp if request.HasField("timestamp") else None,
+                trials={},
+            )
+        new_timestamp = self.get_current_timestamp()
+        trials = self.get_trials(study_id=request.study_id, timestamp=cursor.timestamp)
+        # Trials updated between the timestamp and the read of the last sync are read again.
+        new_trials = [trial for trial in trials if cursor.trials.get(trial.trial_id) != trial]
+        with self._sync_lock:
+            self._sync_cursors[key] = _SyncCursor(
+                cursor=new_cursor_id,
+                timestamp=new_timestamp,
+                trials={trial.trial_id: trial for trial in trials},
+            )
+        return storage_pb2.SyncTrialsReply(
+            trials=new_trials,
+            timestamp=new_timestamp,
+            cursor=new_cursor_id,
+            unchanged=not new_trials,
+        )
+
+    def create_client(self, thread_id: int, use_multiprocess: bool = True) -> StorageClient:
+        """Create a client that sends requests to :meth:`run`.
+
+        Clients must be created before :meth:`run` is called, and they can be used until
+        :meth:`run` returns.
+
+        Args:
+            thread_id:
+                ID of the client.
+            use_multiprocess:
+                If :obj:`True`, the client can be passed to other processes.
+                Otherwise, the client can be used only by threads in this process, and
+                requests and replies are passed without serialization.
+                Clients of the two kinds cannot be served by the same :meth:`run` call.
+        """
+        if self._use_multiprocess is not None and self._use_multiprocess != use_multiprocess:
+            raise ValueError("Clients for threads and processes cannot be served together.")
+        self._use_multiprocess = use_multiprocess
+        if not use_multiprocess:
+            return _ThreadStorageClientImpl(cmd_queue=self._local_cmd_queue, thread_id=thread_id)
         parent_conn, child_conn = Pipe()
         self._write_conns[thread_id] = parent_conn
         return StorageClientImpl(
@@ -173,111 +478,201 @@ class Storage(StorageClient):
         )
 
     def stop(self) -> None:
-        self._cmd_queue.put(storage_pb2.Request(stop=True).SerializeToString())
+        request = storage_pb2.Request(stop=True)
+        if self._use_multiprocess is False:
+            self._local_cmd_queue.put((request, queue.SimpleQueue()))
+        else:
+            self._cmd_queue.put(request.SerializeToString())
 
     def run(self) -> None:
+        if self._n_handlers == 1:
+            while True:
+                request, send_reply = self._receive()
+                if request.HasField("stop"):
+                    break
+                send_reply(self._handle_request(request=request, thread_id=request.thread_id))
+        else:
+            self._run_handlers()
+        # Clients are no longer served, so clients of the other kind can be created.
+        self._use_multiprocess = None
+
+    def _receive(self) -> _Command:
+        if self._use_multiprocess is False:
+            request, replies = self._local_cmd_queue.get()
+            return request, replies.put
+        request = storage_pb2.Request.FromString(self._cmd_queue.get())
+        return request, functools.partial(self._send_reply, request.thread_id)
+
+    def _send_reply(self, thread_id: int, reply: storage_pb2.Reply) -> None:
+        self._write_conns[thread_id].send(reply.SerializeToString())
+
+    def _run_handlers(self) -> None:
+        commands: "queue.SimpleQueue[Optional[_Command]]" = queue.SimpleQueue()
+        handlers = [
+            threading.Thread(target=self._run_handler, args=(commands,), daemon=True)
+            for _ in range(self._n_handlers)
+        ]
+        for handler in handlers:
+            handler.start()
+        try:
+            while True:
+                command = self._receive()
+                if command[0].HasField("stop"):
+                    return
+                # Clients wait for the reply before sending the next request, so requests
+                # of each client are handled in order even if they go to different handlers.
+                commands.put(command)
+        finally:
+            for _ in handlers:
+                commands.put(None)
+            for handler in handlers:
+                handler.join()
+
+    def _run_handler(self, commands: "queue.SimpleQueue[Optional[_Command]]") -> None:
+        assert self._backend_factory is not None
+        self._local.backend = self._backend_factory()
         while True:
-            request = storage_pb2.Request.FromString(self._cmd_queue.get())
-            if request.HasField("stop"):
+            command = commands.get()
+            if command is None:
                 return
-            elif request.HasField("get_current_timestamp"):
-                timestamp = self.get_current_timestamp()
-                ret = storage_pb2.Reply(
-                    get_current_timestamp=storage_pb2.GetCurrentTimestampReply(
-                        timestamp=timestamp,
-                    )
-                )
-                self._write_conns[request.thread_id].send(ret.SerializeToString())
-            elif request.HasField("get_studies"):
-                timestamp = (
-                    request.get_studies.timestamp
-                    if request.get_studies.HasField("timestamp")
-                    else None
+            request, send_reply = command
+            send_reply(self._handle_request(request=request, thread_id=request.thread_id))
+
+    def _handle_request(self, request: storage_pb2.Request, thread_id: int) -> storage_pb2.Reply:
+        if request.HasField("get_current_timestamp"):
+            return storage_pb2.Reply(
+                get_current_timestamp=storage_pb2.GetCurrentTimestampReply(
+                    timestamp=self.get_current_timestamp(),
                 )
-                ret = storage_pb2.Reply(
-                    get_studies=storage_pb2.GetStudiesReply(
-                        studies=self.get_studies(timestamp=timestamp),
-                    )
-                )
-                self._write_conns[request.thread_id].send(ret.SerializeToString())
-            elif request.HasField("get_trials"):
-                timestamp = (
-                    request.get_trials.timestamp
-                    if request.get_trials.HasField("timestamp")
-                    else None
+            )
+        elif request.HasField("get_studies"):
+            timestamp = (
+                request.get_studies.timestamp
+                if request.get_studies.HasField("timestamp")
+                else None
+            )
+            return storage_pb2.Reply(
+                get_studies=storage_pb2.GetStudiesReply(
+                    studies=self.get_studies(timestamp=timestamp),
                 )
-                study_id = (
-                    request.get_trials.study_id.string_value
-                    if request.get_trials.HasField("study_id")
-                    else None
+            )
+        elif request.HasField("get_trials"):
+            timestamp = (
+                request.get_trials.timestamp if request.get_trials.HasField("timestamp") else None
+            )
+            study_id = (
+                request.get_trials.study_id.string_value
+                if request.get_trials.HasField("study_id")
+                else None
+            )
+            return storage_pb2.Reply(
+                get_trials=storage_pb2.GetTrialsReply(
+                    trials=self.get_trials(study_id=study_id, timestamp=timestamp)
                 )
-                ret = storage_pb2.Reply(
-                    get_trials=storage_pb2.GetTrialsReply(
-                        trials=self.get_trials(study_id=study_id, timestamp=timestamp)
+            )
+        elif request.HasField("get_trial"):
+            study_id = (
+                request.get_trial.study_id.string_value
+                if request.get_trial.HasField("study_id")
+                else None
+            )
+            return storage_pb2.Reply(
+                get_trial=storage_pb2.GetTrialReply(
+                    trial=self.get_trial(
+                        trial_id=request.get_trial.trial_id,
+                        study_id=study_id,
                     )
                 )
-                self._write_conns[request.thread_id].send(ret.SerializeToString())
-            elif request.HasField("get_trial"):
-                study_id = (
-                    request.get_trial.study_id.string_value
-                    if request.get_trial.HasField("study_id")
-                    else None
+            )
+        elif request.HasField("write_study"):
+            self.write_study(study=request.write_study.study_info)
+            return storage_pb2.Reply(write_study=storage_pb2.WriteStudyReply())
+        elif request.HasField("write_trial"):
+            self.write_trial(trial=request.write_trial.trial)
+            return storage_pb2.Reply(write_trial=storage_pb2.WriteTrialReply())
+        elif request.HasField("write_trials"):
+            self.write_trials(trials=request.write_trials.trials)
+            return storage_pb2.Reply(write_trials=storage_pb2.WriteTrialsReply())
+        elif request.HasField("compare_and_write_trial"):
+            try:
+                self.compare_and_write_trial(
+                    trial=request.compare_and_write_trial.trial,
+                    expected=(
+                        request.compare_and_write_trial.expected
+                        if request.compare_and_write_trial.HasField("expected")
+                        else None
+                    ),
+                )
+            except ConflictError:
+                conflict = True
+            else:
+                conflict = False
+            return storage_pb2.Reply(
+                compare_and_write_trial=storage_pb2.CompareAndWriteTrialReply(conflict=conflict)
+            )
+        elif request.HasField("publish_trials"):
+            return storage_pb2.Reply(
+                publish_trials=self._publish_trials(
+                    study_id=request.publish_trials.study_id,
+                    timestamp=(
+                        request.publish_trials.timestamp
+                        if request.publish_trials.HasField("timestamp")
+                        else None
+                    ),
                 )
-                ret = storage_pb2.Reply(
-                    get_trial=storage_pb2.GetTrialReply(
-                        trial=self.get_trial(
-                            trial_id=request.get_trial.trial_id,
-                            study_id=study_id,
-                        )
+            )
+        elif request.HasField("sync_trials"):
+            return storage_pb2.Reply(
+                sync_trials=self._sync_trials(request=request.sync_trials, thread_id=thread_id)
+            )
+        elif request.HasField("batch"):
+            return storage_pb2.Reply(
+                batch=storage_pb2.BatchReply(
+                    replies=self._handle_batch(
+                        requests=request.batch.requests, thread_id=thread_id
                     )
                 )
-                self._write_conns[request.thread_id].send(ret.SerializeToString())
-            elif request.HasField("write_study"):
-                self.write_study(study=request.write_study.study_info)
-                ret = storage_pb2.Reply(write_study=storage_pb2.WriteStudyReply())
-                self._write_conns[request.thread_id].send(ret.SerializeToString())
-            elif request.HasField("write_trial"):
-                self.write_trial(trial=request.write_trial.trial)
-                ret = storage_pb2.Reply(write_trial=storage_pb2.WriteTrialReply())
-                self._write_conns[request.thread_id].send(ret.SerializeToString())
-            else:
-                raise NotImplementedError("")
+            )
+        else:
+            raise NotImplementedError("")
 
 
-class StorageClientImpl(StorageClient):
-    def __init__(self, cmd_queue: "Queue[bytes]", result_conn: Connection, thread_id: int) -> None:
-        self._cmd_queue = cmd_queue
-        self._result_cnn = result_conn
+class _ProxyStorageClient(StorageClient):
+    """A client that sends requests to :meth:`Storage.run`."""
+
+    def __init__(self, thread_id: int) -> None:
         self._thread_id = thread_id
 
+    @abc.abstractmethod
+    def _send(self, request: storage_pb2.Request) -> storage_pb2.Reply:
+        pass
+
     def get_current_timestamp(self) -> Optional[Timestamp]:
-        self._cmd_queue.put(
+        data = self._send(
             storage_pb2.Request(
                 get_current_timestamp=storage_pb2.GetCurrentTimestampRequest(),
                 thread_id=self._thread_id,
-            ).SerializeToString()
+            )
         )
-        data = storage_pb2.Reply.FromString(self._result_cnn.recv())
         assert data.HasField("get_current_timestamp")
         return data.get_current_timestamp.timestamp
 
     def get_studies(self, timestamp: Optional[Timestamp] = None) -> List[StudyInfo]:
-        self._cmd_queue.put(
+        data = self._send(
             storage_pb2.Request(
                 thread_id=self._thread_id,
                 get_studies=storage_pb2.GetStudiesRequest(
                     timestamp=timestamp,
                 ),
-            ).SerializeToString()
+            )
         )
-        data = storage_pb2.Reply.FromString(self._result_cnn.recv())
         assert data.HasField("get_studies")
         return list(data.get_studies.studies)
 
     def get_trials(
         self, study_id: Optional[str] = None, timestamp: Optional[Timestamp] = None
     ) -> List[TrialProto]:
-        self._cmd_queue.put(
+        data = self._send(
             storage_pb2.Request(
                 thread_id=self._thread_id,
                 get_trials=storage_pb2.GetTrialsRequest(
@@ -286,14 +681,13 @@ class StorageClientImpl(StorageClient):
                     else None,
                     timestamp=timestamp,
                 ),
-            ).SerializeToString()
+            )
         )
-        data = storage_pb2.Reply.FromString(self._result_cnn.recv())
         assert data.HasField("get_trials")
         return list(data.get_trials.trials)
 
     def get_trial(self, trial_id: str, study_id: Optional[str] = None) -> TrialProto:
-        self._cmd_queue.put(
+        data = self._send(
             storage_pb2.Request(
                 thread_id=self._thread_id,
                 get_trial=storage_pb2.GetTrialRequest(
@@ -302,32 +696,259 @@ class StorageClientImpl(StorageClient):
                     if study_id is not None
                     else None,
                 ),
-            ).SerializeToString()
+            )
         )
-        data = storage_pb2.Reply.FromString(self._result_cnn.recv())
         assert data.HasField("get_trial")
         return data.get_trial.trial
 
     def write_study(self, study: StudyInfo) -> None:
-        self._cmd_queue.put(
+        data = self._send(
             storage_pb2.Request(
                 thread_id=self._thread_id,
                 write_study=storage_pb2.WriteStudyRequest(
                     study_info=study,
                 ),
-            ).SerializeToString()
+            )
         )
-        data = storage_pb2.Reply.FromString(self._result_cnn.recv())
         assert data.HasField("write_study")
 
     def write_trial(self, trial: TrialProto) -> None:
-        self._cmd_queue.put(
+        data = self._send(
             storage_pb2.Request(
                 thread_id=self._thread_id,
                 write_trial=storage_pb2.WriteTrialRequest(
                     trial=trial,
                 ),
-            ).SerializeToString()
+            )
         )
-        data = storage_pb2.Reply.FromString(self._result_cnn.recv())
         assert data.HasField("write_trial")
+
+    def write_trials(self, trials: Sequence[TrialProto]) -> None:
+        data = self._send(
+            storage_pb2.Request(
+                thread_id=self._thread_id,
+                write_trials=storage_pb2.WriteTrialsRequest(
+                    trials=trials,
+                ),
+            )
+        )
+        assert data.HasField("write_trials")
+
+    def compare_and_write_trial(self, trial: TrialProto, expected: Optional[TrialProto]) -> None:
+        data = self._send(
+            storage_pb2.Request(
+                thread_id=self._thread_id,
+                compare_and_write_trial=storage_pb2.CompareAndWriteTrialRequest(
+                    trial=trial,
+                    expected=expected,
+                ),
+            )
+        )
+        assert data.HasField("compare_and_write_trial")
+        if data.compare_and_write_trial.conflict:
+            raise ConflictError(f"Trial with trial_id: '{trial.trial_id}' has been updated.")
+
+    def execute_batch(self, requests: Sequence[storage_pb2.Request]) -> List[storage_pb2.Reply]:
+        data = self._send(
+            storage_pb2.Request(
+                thread_id=self._thread_id,
+                batch=storage_pb2.BatchRequest(requests=requests),
+            )
+        )
+        assert data.HasField("batch")
+        return list(data.batch.replies)
+
+
+class StorageClientImpl(_ProxyStorageClient):
+    """A client that can be passed to other processes.
+
+    Requests and replies are serialized and sent through a queue and a pipe.
+    """
+
+    def __init__(self, cmd_queue: "Queue[bytes]", result_conn: Connection, thread_id: int) -> None:
+        super().__init__(thread_id=thread_id)
+        self._cmd_queue = cmd_queue
+        self._result_cnn = result_conn
+
+    def _send(self, request: storage_pb2.Request) -> storage_pb2.Reply:
+        self._cmd_queue.put(request.SerializeToString())
+        return storage_pb2.Reply.FromString(self._result_cnn.recv())
+
+
+class _ThreadStorageClientImpl(_ProxyStorageClient):
+    """A client for threads in the process that runs :meth:`Storage.run`.
+
+    Requests and replies are passed as they are, without serialization.
+    """
+
+    def __init__(self, cmd_queue: "queue.SimpleQueue[_LocalCommand]", thread_id: int) -> None:
+        super().__init__(thread_id=thread_id)
+        self._cmd_queue = cmd_queue
+        # Each client waits for at most one reply at a time, so the queue is reused.
+        self._replies: "queue.SimpleQueue[storage_pb2.Reply]" = queue.SimpleQueue()
+
+    def _send(self, request: storage_pb2.Request) -> storage_pb2.Reply:
+        self._cmd_queue.put((request, self._replies))
+        return self._replies.get()
+
+
+class SharedTrialLogClient(StorageClient):
+    """A client that reads trials of a study from a shared trial log.
+
+    Trials of the study are read from the shared memory published by
+    :meth:`Storage.create_shared_trial_log`, and only small control messages and
+    write operations go through the wrapped client.
+    Other operations are delegated to the wrapped client as they are.
+
+    Args:
+        client:
+            A client that communicates with the :class:`~optur.storages.Storage` that
+            created the log.
+        study_id:
+            ID of the published study.
+        log_name:
+            Name of the log returned by :meth:`Storage.create_shared_trial_log`.
+    """
+
+    def __init__(self, client: StorageClient, study_id: str, log_name: str) -> None:
+        self._client = client
+        self._study_id = study_id
+        self._log_name = log_name
+        # The log is attached lazily because this class is passed to other processes.
+        self._log: Optional[SharedTrialLog] = None
+        self._available = True
+
+    def __del__(self) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Detach from the shared trial log. The log is attached again when it's needed."""
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+    def get_current_timestamp(self) -> Optional[Timestamp]:
+        return self._client.get_current_timestamp()
+
+    def get_studies(self, timestamp: Optional[Timestamp] = None) -> List[StudyInfo]:
+        return self._client.get_studies(timestamp=timestamp)
+
+    def get_trials(
+        self, study_id: Optional[str] = None, timestamp: Optional[Timestamp] = None
+    ) -> List[TrialProto]:
+        if study_id != self._study_id or not self._available:
+            return self._client.get_trials(study_id=study_id, timestamp=timestamp)
+        (reply,) = self._client.execute_batch(
+            [
+                storage_pb2.Request(
+                    publish_trials=storage_pb2.PublishTrialsRequest(
+                        study_id=study_id, timestamp=timestamp
+                    )
+                )
+            ]
+        )
+        return self._read_published_trials(reply=reply.publish_trials, timestamp=timestamp)
+
+    def _read_published_trials(
+        self, reply: storage_pb2.PublishTrialsReply, timestamp: Optional[Timestamp]
+    ) -> List[TrialProto]:
+        if reply.unavailable:
+            self._available = False
+            return self._client.get_trials(study_id=self._study_id, timestamp=timestamp)
+        if self._log is None:
+            self._log = SharedTrialLog.attach(name=self._log_name)
+        trials = self._log.read(begin=reply.begin, end=reply.end)
+        # The log might contain several versions of the same trial. Newer versions come later.
+        return list({trial.trial_id: trial for trial in trials}.values())
+
+    def get_trial(self, trial_id: str, study_id: Optional[str] = None) -> TrialProto:
+        return self._client.get_trial(trial_id=trial_id, study_id=study_id)
+
+    def write_study(self, study: StudyInfo) -> None:
+        self._client.write_study(study=study)
+
+    def write_trial(self, trial: TrialProto) -> None:
+        self._client.write_trial(trial=trial)
+
+    def write_trials(self, trials: Sequence[TrialProto]) -> None:
+        self._client.write_trials(trials=trials)
+
+    def compare_and_write_trial(self, trial: TrialProto, expected: Optional[TrialProto]) -> None:
+        self._client.compare_and_write_trial(trial=trial, expected=expected)
+
+    def execute_batch(self, requests: Sequence[storage_pb2.Request]) -> List[storage_pb2.Reply]:
+        # `get_trials` and `sync_trials` requests of the published study are answered from
+        # the log.
+        published = [
+            idx
+            for idx, request in enumerate(requests)
+            if self._available and self._is_published_study_request(request)
+        ]
+        if not published:
+            return self._client.execute_batch(requests=requests)
+        new_requests = list(requests)
+        for idx in published:
+            request = requests[idx]
+            if request.HasField("get_trials"):
+                new_requests[idx] = storage_pb2.Request(
+                    publish_trials=storage_pb2.PublishTrialsRequest(
+                        study_id=self._study_id, timestamp=_get_timestamp(request.get_trials)
+                    )
+                )
+            else:
+                # The log has no cursor, so the timestamp of the client is used instead.
+                new_requests[idx] = storage_pb2.Request(
+                    batch=storage_pb2.BatchRequest(
+                        requests=[
+                            storage_pb2.Request(
+                                get_current_timestamp=storage_pb2.GetCurrentTimestampRequest()
+                            ),
+                            storage_pb2.Request(
+                                publish_trials=storage_pb2.PublishTrialsRequest(
+                                    study_id=self._study_id,
+                                    timestamp=_get_timestamp(request.sync_trials),
+                                )
+                            ),
+                        ]
+                    )
+                )
+        replies = self._client.execute_batch(requests=new_requests)
+        for idx in published:
+            request = requests[idx]
+            if request.HasField("get_trials"):
+                trials = self._read_published_trials(
+                    reply=replies[idx].publish_trials,
+                    timestamp=_get_timestamp(request.get_trials),
+                )
+                replies[idx] = storage_pb2.Reply(
+                    get_trials=storage_pb2.GetTrialsReply(trials=trials)
+                )
+            else:
+                timestamp_reply, publish_reply = replies[idx].batch.replies
+                timestamp = timestamp_reply.get_current_timestamp
+                trials = self._read_published_trials(
+                    reply=publish_reply.publish_trials,
+                    timestamp=_get_timestamp(request.sync_trials),
+                )
+                replies[idx] = storage_pb2.Reply(
+                    sync_trials=storage_pb2.SyncTrialsReply(
+                        trials=trials,
+                        timestamp=timestamp.timestamp if timestamp.HasField("timestamp") else None,
+                        unchanged=not trials,
+                    )
+                )
+        return replies
+
+    def _is_published_study_request(self, request: storage_pb2.Request) -> bool:
+        if request.HasField("get_trials"):
+            return (
+                request.get_trials.HasField("study_id")
+                and request.get_trials.study_id.string_value == self._study_id
+            )
+        return request.HasField("sync_trials") and request.sync_trials.study_id == self._study_id
+
+
+def _get_timestamp(
+    request: Union[storage_pb2.GetTrialsRequest, storage_pb2.SyncTrialsRequest],
+) -> Optional[Timestamp]:
+    return request.timestamp if request.HasField("timestamp") else None
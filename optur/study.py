@@ -1,23 +1,56 @@
+import asyncio
+import collections
 import concurrent.futures
+import heapq
 import itertools
 import math
 import uuid
 from collections.abc import Sequence as SequenceType
 from threading import Thread
-from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Type, Union
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Type,
+    Union,
+)
 
 from google.protobuf.timestamp_pb2 import Timestamp
 
-from optur.errors import PrunedException
+from optur.errors import ConflictError, PrunedException
+from optur.proto import storage_pb2
 from optur.proto.sampler_pb2 import SamplerConfig
 from optur.proto.study_pb2 import ObjectiveValue, StudyInfo, Target
 from optur.proto.study_pb2 import Trial as TrialProto
 from optur.proto.study_pb2 import WorkerID
 from optur.samplers import Sampler, create_sampler
-from optur.storages import Storage, StorageClient
+from optur.storages import (
+    AsyncStorage,
+    BufferedStorageClient,
+    SharedTrialLogClient,
+    Storage,
+    StorageClient,
+)
 from optur.trial import Trial
 
 ObjectiveFuncType = Callable[[Trial], Union[float, Sequence[float]]]
+AsyncObjectiveFuncType = Callable[[Trial], Awaitable[Union[float, Sequence[float]]]]
+
+_FINISHED_STATES = (
+    TrialProto.State.COMPLETED,
+    TrialProto.State.PRUNED,
+    TrialProto.State.FAILED,
+)
+# Key of the system attribute that holds the priority of a waiting trial.
+_PRIORITY_KEY = "queue.priority"
 
 
 class Study:
@@ -37,11 +70,25 @@ class Study:
         # Thus, they are re-instantiated in Study.optimize() function.
         # These three are instantated here for study.ask() and study.tell() APIs.
         self._sampler = sampler
+        self._sampler.init(
+            search_space=None, targets=study_info.targets
+        )  # TODO(tsuzuku): Set the search space.
         self._last_update_time = Timestamp(seconds=0, nanos=0)
         self._trial_queue = _TrialQueue(
             states=(TrialProto.State.WAITING,),
             worker_id=WorkerID(client_id=self._client_id, thread_id=0),
         )
+        self._sync_stats = SyncStats()
+
+    @property
+    def sync_stats(self) -> "SyncStats":
+        """Counters of trials fetched from the storage by this study.
+
+        Fetches by :meth:`ask`, :meth:`ask_batch`, :meth:`prefetch`, :meth:`optimize`, and
+        :meth:`optimize_async` are counted. Workers of :meth:`optimize` add their counts
+        when they finish.
+        """
+        return self._sync_stats
 
     def ask(self) -> Trial:
         return _ask(
@@ -50,20 +97,145 @@ class Study:
             storage=self._storage,
             trial_queue=self._trial_queue,
             worker_id=WorkerID(client_id=self._client_id, thread_id=0),
+            sync_stats=self._sync_stats,
         )
 
+    def ask_batch(self, n: int) -> List[Trial]:
+        """Ask ``n`` trials at once.
+
+        Unlike calling :meth:`ask` ``n`` times, the trial queue and the sampler are synced with
+        the storage only once, new trials are sampled by
+        :meth:`~optur.samplers.Sampler.joint_sample_batch`, and all trials are written
+        to the storage as running trials by a single
+        :meth:`~optur.storages.StorageClient.write_trials` call.
+        """
+        return _ask_batch(
+            study_info=self._study_info,
+            sampler=self._sampler,
+            storage=self._storage,
+            trial_queue=self._trial_queue,
+            worker_id=WorkerID(client_id=self._client_id, thread_id=0),
+            n=n,
+            sync_stats=self._sync_stats,
+        )
+
+    def prefetch(self, n: int) -> None:
+        """Sample ``n`` trials in a batch and queue them for the following :meth:`ask` calls.
+
+        Samplers can share the computation among the trials via
+        :meth:`~optur.samplers.Sampler.joint_sample_batch`.
+        The trials are kept in this study object, and they are written to the storage
+        when they finish.
+        """
+        # The trial queue is synced together so that it does not fall behind the sampler.
+        fetched = _fetch_trials(
+            storage=self._storage,
+            study_id=self._study_info.study_id,
+            trial_queue=self._trial_queue,
+            sampler=self._sampler,
+        )
+        _sync(
+            fetched=fetched,
+            trial_queue=self._trial_queue,
+            sampler=self._sampler,
+            sync_stats=self._sync_stats,
+        )
+        timestamp = fetched.timestamp
+        worker_id = WorkerID(client_id=self._client_id, thread_id=0)
+        for result in self._sampler.joint_sample_batch(n=n):
+            trial = _create_trial_proto(
+                study_info=self._study_info, timestamp=timestamp, worker_id=worker_id
+            )
+            trial.last_known_state = TrialProto.State.WAITING
+            for name, value in result.parameters.items():
+                trial.parameters[name].value.CopyFrom(value)
+            for key, attr in result.system_attrs.items():
+                trial.system_attrs[key].CopyFrom(attr)
+            self._trial_queue.put(trial=trial)
+
     def tell(
         self,
         trial_id: str,
         state: int,  # `TrialProto.State` is not a valid type.
         values: Union[Sequence[ObjectiveValue], Dict[str, ObjectiveValue]],
         *,
-        study_id: str,  # Make operation faster when there are no index of trial-id.
+        study_id: Optional[str] = None,
     ) -> None:
-        # Read trial
-        # Update trial
-        # Write trial
-        pass
+        """Finish a trial by its ID.
+
+        The trial is read from the storage, updated, and written back by
+        :meth:`~optur.storages.StorageClient.compare_and_write_trial`, so concurrent
+        updates of the trial are never overwritten. When the trial is updated concurrently,
+        the update is retried unless the trial has already finished.
+
+        Args:
+            trial_id:
+                ID of the trial to finish.
+            state:
+                The new state of the trial.
+            values:
+                Objective values of the trial. A mapping is keyed by the names of the targets.
+            study_id:
+                ID of the study to which the trial belongs.
+                Storages use it to speed up the lookup when available.
+
+        Raises:
+            :class:`~optur.errors.ConflictError`:
+                If the trial has already finished.
+        """
+        if isinstance(values, dict):
+            values = [values[target.name] for target in self._study_info.targets]
+        while True:
+            current = self._storage.get_trial(trial_id=trial_id, study_id=study_id)
+            if current.last_known_state in _FINISHED_STATES:
+                raise ConflictError(f"Trial with trial_id: '{trial_id}' has already finished.")
+            trial = TrialProto()
+            trial.CopyFrom(current)
+            del trial.values[:]
+            trial.values.extend(values)
+            trial.last_known_state = state  # type: ignore[assignment]
+            try:
+                self._storage.compare_and_write_trial(trial=trial, expected=current)
+            except ConflictError:
+                continue
+            return
+
+    def tell_batch(
+        self,
+        trials: Sequence[Trial],
+        values: Sequence[Optional[Union[float, Sequence[float]]]],
+        *,
+        states: "Optional[Sequence[Optional[TrialProto.State.ValueType]]]" = None,
+    ) -> None:
+        """Finish trials returned by :meth:`ask_batch` and write them by a single request.
+
+        Args:
+            trials:
+                Trials to finish.
+            values:
+                Objective values of the trials. Use :obj:`None` for trials without values,
+                such as pruned or failed trials.
+            states:
+                States of the trials. When the state of a trial is not given,
+                it is inferred from the objective values.
+        """
+        if len(values) != len(trials):
+            raise ValueError("The number of values must be equal to the number of trials.")
+        if states is not None and len(states) != len(trials):
+            raise ValueError("The number of states must be equal to the number of trials.")
+        protos = []
+        for idx, (trial, trial_values) in enumerate(zip(trials, values)):
+            if trial_values is None:
+                proto = trial.get_proto()
+            else:
+                proto = _finish_trial(trial=trial, values=trial_values)
+            state = states[idx] if states is not None else None
+            if state is not None:
+                proto.last_known_state = state
+            elif trial_values is None:
+                raise ValueError("Either a value or a state is required to finish a trial.")
+            protos.append(proto)
+        self._storage.write_trials(trials=protos)
 
     def optimize(
         self,
@@ -75,7 +247,16 @@ class Study:
         catch: Tuple[Type[Exception], ...] = (),
         callbacks: Optional[List[Callable[[Trial], None]]] = None,
         use_multiprocess: bool = False,
+        buffer_writes: bool = False,
     ) -> None:
+        """Run the objective.
+
+        Args:
+            buffer_writes:
+                If :obj:`True`, intermediate writes of trials, such as :meth:`Trial.flush`,
+                are buffered by :class:`~optur.storages.BufferedStorageClient` and sent to the
+                storage in batches. Trials are always written when they finish.
+        """
         _optimize(
             objective=objective,
             study_info=self._study_info,
@@ -88,13 +269,96 @@ class Study:
             catch=catch,
             callbacks=callbacks,
             use_multiprocess=use_multiprocess,
+            buffer_writes=buffer_writes,
+            sync_stats=self._sync_stats,
         )
 
+    async def optimize_async(
+        self,
+        objective: AsyncObjectiveFuncType,
+        *,
+        n_trials: Optional[int] = None,
+        timeout: Optional[float] = None,
+        n_concurrency: int = 1,
+        catch: Tuple[Type[Exception], ...] = (),
+        callbacks: Optional[List[Callable[[Trial], None]]] = None,
+        storage: Optional[AsyncStorage] = None,
+    ) -> None:
+        """Run awaitable objectives concurrently on the running event loop.
+
+        Unlike :meth:`optimize`, ``n_trials`` is the total number of trials, and
+        up to ``n_concurrency`` objectives are awaited at the same time.
+
+        Objectives should use :meth:`~optur.Trial.flush_async` instead of
+        :meth:`~optur.Trial.flush`, which blocks the event loop.
+
+        Args:
+            storage:
+                An async view of the storage of this study.
+                By default, the storage of this study is called from a single worker thread
+                so that the event loop is not blocked by I/O.
+                Pass an :class:`~optur.storages.AsyncStorage` without an executor
+                (e.g., :func:`~optur.storages.create_async_inmemory_storage`) to call
+                storages that never block from the event loop directly.
+        """
+        async_storage = storage
+        if async_storage is None:
+            # `Storage` must not be used concurrently, so a single worker is used.
+            async_storage = AsyncStorage(
+                storage=self._storage,
+                executor=concurrent.futures.ThreadPoolExecutor(max_workers=1),
+            )
+        try:
+            await _optimize_async(
+                objective=objective,
+                study_info=self._study_info,
+                sampler_config=self._sampler.to_sampler_config(),
+                client_id=self._client_id,
+                storage=async_storage,
+                n_trials=n_trials,
+                timeout=timeout,
+                n_concurrency=n_concurrency,
+                catch=catch,
+                callbacks=callbacks,
+                sync_stats=self._sync_stats,
+            )
+        finally:
+            if storage is None:
+                async_storage.shutdown()
+
     def add_trial(self, trial: TrialProto) -> None:
         pass
 
-    def enqueue_trial(self, trial: TrialProto) -> None:
-        pass
+    def enqueue_trial(
+        self, trial: TrialProto, *, worker_id: Optional[WorkerID] = None, priority: int = 0
+    ) -> None:
+        """Write a waiting trial to the storage so that a worker evaluates its parameters.
+
+        Waiting trials are taken before new trials are sampled, in descending order of
+        ``priority`` and in the order they are synced among trials with the same priority.
+
+        Args:
+            trial:
+                A trial with the parameters to evaluate.
+                A new ``trial_id`` is generated when it's empty.
+            worker_id:
+                The worker that runs the trial. A worker runs trials of its ``client_id``
+                with the same ``thread_id``, and a worker with ``thread_id`` 0 (e.g.,
+                :meth:`ask`) runs all trials of its ``client_id``.
+                The ownership is checked once when the trial is synced with the worker.
+                Defaults to ``thread_id`` 0 of this study.
+            priority:
+                Priority of the trial.
+        """
+        proto = TrialProto()
+        proto.CopyFrom(trial)
+        if not proto.trial_id:
+            proto.trial_id = uuid.uuid4().hex
+        proto.study_id = self._study_info.study_id
+        proto.last_known_state = TrialProto.State.WAITING
+        proto.worker_id.CopyFrom(worker_id or WorkerID(client_id=self._client_id, thread_id=0))
+        proto.system_attrs[_PRIORITY_KEY].int_value = priority
+        self._storage.write_trial(trial=proto)
 
 
 def create_study(
@@ -118,14 +382,107 @@ def create_study(
     )
 
 
+class _PriorityFIFO:
+    """Trial IDs popped in descending order of priority and in FIFO order within a priority.
+
+    Removed IDs are skipped when they are popped, and the queue is compacted once removed IDs
+    outnumber the others so that they do not pile up.
+    """
+
+    def __init__(self) -> None:
+        # Negated priorities that have a deque.
+        self._heap: List[int] = []
+        self._deques: Dict[int, Deque[str]] = {}
+        # Counts of removed entries in the deques by the trial ID and the priority.
+        self._removed: "collections.Counter[Tuple[str, int]]" = collections.Counter()
+        self._n_removed = 0
+        self._n_entries = 0
+
+    def push(self, trial_id: str, priority: int) -> None:
+        ids = self._deques.get(priority)
+        if ids is None:
+            ids = collections.deque()
+            self._deques[priority] = ids
+            heapq.heappush(self._heap, -priority)
+        ids.append(trial_id)
+        self._n_entries += 1
+
+    def remove(self, trial_id: str, priority: int) -> None:
+        """Remove the oldest entry of the trial ID with the priority."""
+        self._removed[(trial_id, priority)] += 1
+        self._n_removed += 1
+        if 2 * self._n_removed > self._n_entries:
+            self._compact()
+
+    def pop(self) -> Optional[str]:
+        while self._heap:
+            priority = -self._heap[0]
+            ids = self._deques[priority]
+            while ids:
+                trial_id = ids.popleft()
+                self._n_entries -= 1
+                if not self._discard_removed(trial_id, priority):
+                    return trial_id
+            heapq.heappop(self._heap)
+            del self._deques[priority]
+        return None
+
+    def _discard_removed(self, trial_id: str, priority: int) -> bool:
+        key = (trial_id, priority)
+        count = self._removed.get(key, 0)
+        if count == 0:
+            return False
+        if count == 1:
+            del self._removed[key]
+        else:
+            self._removed[key] = count - 1
+        self._n_removed -= 1
+        return True
+
+    def _compact(self) -> None:
+        deques: Dict[int, Deque[str]] = {}
+        for priority, ids in self._deques.items():
+            kept = collections.deque(
+                trial_id for trial_id in ids if not self._discard_removed(trial_id, priority)
+            )
+            if kept:
+                deques[priority] = kept
+        self._deques = deques
+        self._heap = [-priority for priority in deques]
+        heapq.heapify(self._heap)
+        self._n_entries = sum(len(ids) for ids in deques.values())
+
+
+def _get_priority(trial: TrialProto) -> int:
+    if _PRIORITY_KEY in trial.system_attrs:
+        return trial.system_attrs[_PRIORITY_KEY].int_value
+    return 0
+
+
 class _TrialQueue:
-    """Trial queue for managing WAITING trials."""
+    """Trial queue for managing WAITING trials.
+
+    Trials with higher priority (see :meth:`Study.enqueue_trial`) are returned first,
+    and trials with the same priority are returned in the order they are added.
+    Trials that are updated to other states or priorities are moved or removed on sync.
+    """
 
     def __init__(
         self, states: "Sequence[TrialProto.State.ValueType]", worker_id: WorkerID
     ) -> None:
+        # The latest versions of queued trials.
         self._trials: Dict[str, TrialProto] = {}
+        # Mapping from trial_id to the state and the priority of its queue entry.
+        self._keys: Dict[str, Tuple[int, int]] = {}
+        self._queues: Dict[int, _PriorityFIFO] = {}
+        # IDs of trials returned by `get_trial(s)`.
+        # The queue might receive them again from a fetch older than its own timestamp,
+        # e.g., when the sampler is behind, before they are written to the storage.
+        # IDs are discarded once the trials are observed in other states.
+        self._taken: Set[str] = set()
         self._timestamp: Optional[Timestamp] = None
+        # The cursor of the sync that took the timestamp. See `SyncTrialsRequest`.
+        self._sync_cursor = 0
         self._states = states
         self._worker_id = worker_id
 
@@ -138,26 +495,68 @@ class _TrialQueue:
     def last_update_time(self) -> Optional[Timestamp]:
         return self._timestamp
 
-    def update_timestamp(self, timestamp: Optional[Timestamp]) -> None:
+    @property
+    def sync_cursor(self) -> int:
+        return self._sync_cursor
+
+    def update_timestamp(self, timestamp: Optional[Timestamp], cursor: int = 0) -> None:
         self._timestamp = timestamp
+        self._sync_cursor = cursor
 
     def sync(self, trials: Sequence[TrialProto]) -> None:
         for trial in trials:
-            if trial.trial_id in self._trials:
-                if self._is_target_trial(trial):
-                    self._trials[trial.trial_id] = trial
-                else:
-                    del self._trials[trial.trial_id]
-            else:
-                if self._is_target_trial(trial):
-                    self._trials[trial.trial_id] = trial
+            if trial.trial_id in self._taken:
+                if trial.last_known_state not in self._states:
+                    self._taken.discard(trial.trial_id)
+                continue
+            if self._is_target_trial(trial):
+                self._add(trial)
+            elif trial.trial_id in self._keys:
+                self._remove(trial.trial_id)
+
+    def _remove(self, trial_id: str) -> None:
+        state, priority = self._keys.pop(trial_id)
+        self._queues[state].remove(trial_id=trial_id, priority=priority)
+        del self._trials[trial_id]
+
+    def _add(self, trial: TrialProto) -> None:
+        key = (trial.last_known_state, _get_priority(trial))
+        # Updates that keep the state and the priority keep the position in the queue.
+        if self._keys.get(trial.trial_id) != key:
+            if trial.trial_id in self._keys:
+                self._remove(trial.trial_id)
+            self._keys[trial.trial_id] = key
+            state, priority = key
+            if state not in self._queues:
+                self._queues[state] = _PriorityFIFO()
+            self._queues[state].push(trial_id=trial.trial_id, priority=priority)
+        self._trials[trial.trial_id] = trial
+
+    def put(self, trial: TrialProto) -> None:
+        """Add a trial that is not in the storage yet."""
+        assert self._is_target_trial(trial)
+        self._add(trial)
+
+    def get_trials(self, state: "TrialProto.State.ValueType", n: int) -> List[TrialProto]:
+        """Pop at most ``n`` trials with the state."""
+        ret: List[TrialProto] = []
+        while len(ret) < n:
+            trial = self.get_trial(state=state)
+            if trial is None:
+                break
+            ret.append(trial)
+        return ret
 
     def get_trial(self, state: "TrialProto.State.ValueType") -> Optional[TrialProto]:
-        for trial in self._trials.values():
-            if trial.last_known_state == state:
-                del self._trials[trial.trial_id]
-                return trial
-        return None
+        queue = self._queues.get(state)
+        if queue is None:
+            return None
+        trial_id = queue.pop()
+        if trial_id is None:
+            return None
+        del self._keys[trial_id]
+        self._taken.add(trial_id)
+        return self._trials.pop(trial_id)
 
 
 def _does_own_trial(owner_worker_id: WorkerID, trial_worker_id: WorkerID) -> bool:
@@ -166,12 +565,130 @@ def _does_own_trial(owner_worker_id: WorkerID, trial_worker_id: WorkerID) -> boo
     return owner_worker_id.thread_id == 0 or owner_worker_id == trial_worker_id
 
 
+class SyncStats:
+    """Counters of trials fetched to sync trial queues and samplers with the storage.
+
+    Attributes:
+        n_fetches:
+            The number of fetches.
+        n_fetched_trials:
+            The number of fetched trials.
+        n_redundant_trials:
+            The number of trials fetched only because one of the trial queue and the sampler
+            was behind, i.e., trials updated before the timestamp of the other.
+            Backends that do not set ``last_update_time`` on writes might inflate this count.
+    """
+
+    def __init__(self) -> None:
+        self.n_fetches = 0
+        self.n_fetched_trials = 0
+        self.n_redundant_trials = 0
+
+    def add(self, other: "SyncStats") -> None:
+        self.n_fetches += other.n_fetches
+        self.n_fetched_trials += other.n_fetched_trials
+        self.n_redundant_trials += other.n_redundant_trials
+
+
+def _timestamp_to_tuple(timestamp: Timestamp) -> Tuple[int, int]:
+    return (timestamp.seconds, timestamp.nanos)
+
+
+def _sync_timestamp(trial_queue: _TrialQueue, sampler: Sampler) -> Optional[Timestamp]:
+    """Return the timestamp to fetch trials for both the trial queue and the sampler."""
+    queue_timestamp = trial_queue.last_update_time
+    sampler_timestamp = sampler.last_update_time
+    if queue_timestamp is None or sampler_timestamp is None:
+        return None
+    return min(queue_timestamp, sampler_timestamp, key=_timestamp_to_tuple)
+
+
+class _FetchResult(NamedTuple):
+    timestamp: Optional[Timestamp]
+    # The cursor to send with the next fetch. See `SyncTrialsRequest`.
+    cursor: int
+    trials: List[TrialProto]
+    # No trial has changed since the last fetch.
+    unchanged: bool
+
+
+def _fetch_trials(
+    storage: StorageClient, study_id: str, trial_queue: _TrialQueue, sampler: Sampler
+) -> _FetchResult:
+    """Get trials changed since the last fetch of the trial queue and the sampler."""
+    replies = storage.execute_batch(
+        _fetch_trials_requests(study_id=study_id, trial_queue=trial_queue, sampler=sampler)
+    )
+    return _parse_fetch_trials_replies(replies)
+
+
+def _fetch_trials_requests(
+    study_id: str, trial_queue: _TrialQueue, sampler: Sampler
+) -> List[storage_pb2.Request]:
+    # The cursor of the storage is valid only if both of them are synced by the last fetch.
+    cursor = (
+        trial_queue.sync_cursor if trial_queue.last_update_time == sampler.last_update_time else 0
+    )
+    return [
+        storage_pb2.Request(
+            sync_trials=storage_pb2.SyncTrialsRequest(
+                study_id=study_id,
+                cursor=cursor,
+                timestamp=_sync_timestamp(trial_queue=trial_queue, sampler=sampler),
+            )
+        ),
+    ]
+
+
+def _parse_fetch_trials_replies(replies: Sequence[storage_pb2.Reply]) -> _FetchResult:
+    (reply,) = replies
+    assert reply.HasField("sync_trials")
+    return _FetchResult(
+        timestamp=(
+            reply.sync_trials.timestamp if reply.sync_trials.HasField("timestamp") else None
+        ),
+        cursor=reply.sync_trials.cursor,
+        trials=list(reply.sync_trials.trials),
+        unchanged=reply.sync_trials.unchanged,
+    )
+
+
+def _sync(
+    fetched: _FetchResult,
+    trial_queue: _TrialQueue,
+    sampler: Sampler,
+    sync_stats: Optional[SyncStats] = None,
+) -> None:
+    """Pass trials fetched by :func:`_fetch_trials` to the trial queue and the sampler.
+
+    Both of them ignore or overwrite the trials they already have.
+    """
+    trials = fetched.trials
+    if sync_stats is not None:
+        timestamps = [
+            t for t in (trial_queue.last_update_time, sampler.last_update_time) if t is not None
+        ]
+        sync_stats.n_fetches += 1
+        sync_stats.n_fetched_trials += len(trials)
+        if timestamps and trial_queue.last_update_time != sampler.last_update_time:
+            newer = max(map(_timestamp_to_tuple, timestamps))
+            sync_stats.n_redundant_trials += sum(
+                _timestamp_to_tuple(trial.last_update_time) < newer for trial in trials
+            )
+    if not fetched.unchanged:
+        trial_queue.sync(trials=trials)
+        sampler.sync(trials=trials)
+    trial_queue.update_timestamp(timestamp=fetched.timestamp, cursor=fetched.cursor)
+    sampler.update_timestamp(timestamp=fetched.timestamp)
+
+
 def _ask(
     study_info: StudyInfo,
     sampler: Sampler,
     storage: StorageClient,
     trial_queue: _TrialQueue,
     worker_id: WorkerID,
+    sync_stats: Optional[SyncStats] = None,
 ) -> Trial:
     """Ask method.
 
@@ -181,30 +698,18 @@ def _ask(
     * write the new or fetched trial to the storage (if required).
     * call joint_sample of the sampler and set to the trial.
     """
-    # Sync trial_queue and storage.
-    queue_timestamp = trial_queue.last_update_time
-    new_timestamp = storage.get_current_timestamp()
-    trials = storage.get_trials(study_id=study_info.study_id, timestamp=queue_timestamp)
-    trial_queue.sync(trials=trials)
-    trial_queue.update_timestamp(timestamp=new_timestamp)
+    # Sync trial_queue, sampler, and storage.
+    fetched = _fetch_trials(
+        storage=storage, study_id=study_info.study_id, trial_queue=trial_queue, sampler=sampler
+    )
+    _sync(fetched=fetched, trial_queue=trial_queue, sampler=sampler, sync_stats=sync_stats)
+    new_timestamp = fetched.timestamp
     # Get waiting trial if exists.
     initial_trial = trial_queue.get_trial(state=TrialProto.State.WAITING)
     if initial_trial is None:
-        initial_trial = TrialProto(
-            trial_id=uuid.uuid4().hex,
-            study_id=study_info.study_id,
-            create_time=new_timestamp,
-            last_update_time=new_timestamp,
-            last_known_state=TrialProto.State.CREATED,
-            worker_id=worker_id,
+        initial_trial = _create_trial_proto(
+            study_info=study_info, timestamp=new_timestamp, worker_id=worker_id
         )
-    # Sync sampler and storage.
-    sampler_timestamp = sampler.last_update_time
-    if queue_timestamp != sampler_timestamp:
-        new_timestamp = storage.get_current_timestamp()
-        trials = storage.get_trials(study_id=study_info.study_id, timestamp=sampler_timestamp)
-    sampler.sync(trials=trials)
-    sampler.update_timestamp(timestamp=new_timestamp)
     # TODO(tsuzuku): Persist trial when necessary.
     # Call joint_sample of sampler
     ret = Trial(trial_proto=initial_trial, study_info=study_info, storage=storage, sampler=sampler)
@@ -212,6 +717,97 @@ def _ask(
     return ret
 
 
+def _ask_batch(
+    study_info: StudyInfo,
+    sampler: Sampler,
+    storage: StorageClient,
+    trial_queue: _TrialQueue,
+    worker_id: WorkerID,
+    n: int,
+    sync_stats: Optional[SyncStats] = None,
+) -> List[Trial]:
+    """Batch version of :func:`_ask`.
+
+    The returned trials are written to the storage as running trials.
+    """
+    # Sync trial_queue, sampler, and storage.
+    fetched = _fetch_trials(
+        storage=storage, study_id=study_info.study_id, trial_queue=trial_queue, sampler=sampler
+    )
+    _sync(fetched=fetched, trial_queue=trial_queue, sampler=sampler, sync_stats=sync_stats)
+    new_timestamp = fetched.timestamp
+    # Waiting trials have precedence over new trials.
+    waiting_trials = trial_queue.get_trials(state=TrialProto.State.WAITING, n=n)
+    new_trials = [
+        _create_trial_proto(study_info=study_info, timestamp=new_timestamp, worker_id=worker_id)
+        for _ in range(n - len(waiting_trials))
+    ]
+    for proto in itertools.chain(waiting_trials, new_trials):
+        proto.last_known_state = TrialProto.State.RUNNING
+    storage.write_trials(trials=waiting_trials + new_trials)
+    ret: List[Trial] = []
+    # Waiting trials might have different fixed parameters, so they are sampled one by one.
+    for proto in waiting_trials:
+        trial = Trial(trial_proto=proto, study_info=study_info, storage=storage, sampler=sampler)
+        trial.reset(hard=False, reload=False)
+        ret.append(trial)
+    results = sampler.joint_sample_batch(n=len(new_trials)) if new_trials else []
+    for proto, result in zip(new_trials, results):
+        trial = Trial(trial_proto=proto, study_info=study_info, storage=storage, sampler=sampler)
+        trial._set_joint_sample_result(result)
+        ret.append(trial)
+    return ret
+
+
+async def _ask_async(
+    study_info: StudyInfo,
+    sampler: Sampler,
+    storage: AsyncStorage,
+    trial_queue: _TrialQueue,
+    worker_id: WorkerID,
+    sync_stats: Optional[SyncStats] = None,
+) -> Trial:
+    """Awaitable version of :func:`_ask`.
+
+    The sampler and the trial queue might be shared by coroutines on the same event loop.
+    """
+    replies = await storage.execute_batch(
+        _fetch_trials_requests(
+            study_id=study_info.study_id, trial_queue=trial_queue, sampler=sampler
+        )
+    )
+    fetched = _parse_fetch_trials_replies(replies)
+    _sync(fetched=fetched, trial_queue=trial_queue, sampler=sampler, sync_stats=sync_stats)
+    new_timestamp = fetched.timestamp
+    initial_trial = trial_queue.get_trial(state=TrialProto.State.WAITING)
+    if initial_trial is None:
+        initial_trial = _create_trial_proto(
+            study_info=study_info, timestamp=new_timestamp, worker_id=worker_id
+        )
+    ret = Trial(
+        trial_proto=initial_trial,
+        study_info=study_info,
+        storage=storage.blocking_client,
+        sampler=sampler,
+        async_storage=storage,
+    )
+    ret.reset(hard=False, reload=False)
+    return ret
+
+
+def _create_trial_proto(
+    study_info: StudyInfo, timestamp: Optional[Timestamp], worker_id: WorkerID
+) -> TrialProto:
+    return TrialProto(
+        trial_id=uuid.uuid4().hex,
+        study_id=study_info.study_id,
+        create_time=timestamp,
+        last_update_time=timestamp,
+        last_known_state=TrialProto.State.CREATED,
+        worker_id=worker_id,
+    )
+
+
 def _optimize(
     objective: ObjectiveFuncType,
     study_info: StudyInfo,
@@ -224,53 +820,101 @@ def _optimize(
     catch: Tuple[Type[Exception], ...],
     callbacks: Optional[Sequence[Callable[[Trial], None]]],
     use_multiprocess: bool,
+    buffer_writes: bool,
+    sync_stats: Optional[SyncStats] = None,
 ) -> None:
-    if n_jobs > 1:
+    if n_jobs > 1 or use_multiprocess:
         # Storage instance cannot be shared by multiple threads
         # or processes. See :class:`~optur.storage.Storage`'s
         # classdoc for more details.
-        clients = [(idx + 1, storage.create_client(thread_id=idx + 1)) for idx in range(n_jobs)]
+        clients = [
+            (idx + 1, storage.create_client(thread_id=idx + 1, use_multiprocess=use_multiprocess))
+            for idx in range(n_jobs)
+        ]
     else:
         # Avoid using storage's clients to reduce runtime overhead.
         # TODO(tsuzuku): Benchmark.
         clients = [(0, storage)]
-    if n_jobs > 1:
+    if use_multiprocess:
+        # Let processes read trials from the shared memory instead of pipes.
+        log_name = storage.create_shared_trial_log(study_id=study_info.study_id)
+        if log_name is not None:
+            clients = [
+                (
+                    thread_id,
+                    SharedTrialLogClient(
+                        client=client, study_id=study_info.study_id, log_name=log_name
+                    ),
+                )
+                for thread_id, client in clients
+            ]
+    if n_jobs > 1 or use_multiprocess:
         thread: Optional[Thread] = Thread(target=storage.run, daemon=True)
         assert thread is not None
         thread.start()
     else:
         thread = None
-    executor_class = (
-        concurrent.futures.ProcessPoolExecutor
-        if use_multiprocess
-        else concurrent.futures.ThreadPoolExecutor
-    )
-    with executor_class(max_workers=n_jobs) as executor:
+    executor: concurrent.futures.Executor
+    if use_multiprocess:
+        # Clients have pipes, which can be passed to other processes only when
+        # the processes are created.
+        executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=n_jobs,
+            initializer=_init_process_worker,
+            initargs=(dict(clients),),
+        )
+    else:
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=n_jobs)
+    with executor:
         futures: List[concurrent.futures.Future[Any]] = []
         for thread_id, client in clients:
             # Prefer submit over map for readability.
-            future = executor.submit(
-                _run_trials,
+            kwargs: Dict[str, Any] = dict(
                 objective=objective,
                 study_info=study_info,
                 sampler_config=sampler_config,
                 worker_id=WorkerID(client_id=client_id, thread_id=thread_id),
-                storage_client=client,
                 n_trials=n_trials,
                 catch=catch,
                 callbacks=callbacks,
+                buffer_writes=buffer_writes,
             )
+            if use_multiprocess:
+                future = executor.submit(_run_trials_in_process, thread_id=thread_id, **kwargs)
+            else:
+                future = executor.submit(_run_trials, storage_client=client, **kwargs)
             futures.append(future)
         try:
             for future in futures:
-                future.result(timeout=timeout)
+                worker_sync_stats = future.result(timeout=timeout)
+                if sync_stats is not None:
+                    sync_stats.add(worker_sync_stats)
         except concurrent.futures.TimeoutError:
             # TODO(tsuzuku): Log a timeout message.
             pass
-        if n_jobs > 1:
+        if n_jobs > 1 or use_multiprocess:
             storage.stop()
             assert thread is not None
             thread.join()
+    if use_multiprocess:
+        storage.close_shared_trial_logs()
+
+
+# Storage clients of the current process. This is set by `_init_process_worker`.
+_process_storage_clients: Dict[int, StorageClient] = {}
+
+
+def _init_process_worker(storage_clients: Dict[int, StorageClient]) -> None:
+    _process_storage_clients.update(storage_clients)
+
+
+def _run_trials_in_process(thread_id: int, **kwargs: Any) -> SyncStats:
+    storage_client = _process_storage_clients[thread_id]
+    try:
+        return _run_trials(storage_client=storage_client, **kwargs)
+    finally:
+        if isinstance(storage_client, SharedTrialLogClient):
+            storage_client.close()
 
 
 def _run_trials(
@@ -282,7 +926,9 @@ def _run_trials(
     n_trials: Optional[int],
     catch: Tuple[Type[Exception], ...],
     callbacks: Optional[Sequence[Callable[[Trial], None]]],
-) -> None:
+    buffer_writes: bool,
+) -> SyncStats:
+    """Run trials in a worker and return the counters of its fetches."""
     # We need to create sampler instances per thread because
     # they are neither thread-safe nor process-safe.
     # Additionally, if we share sampler instances among workers,
@@ -291,7 +937,7 @@ def _run_trials(
     # Unlike optuna, it is less likely that the update breaks
     # sampler algorithms in optur, but still, we want to ensure that samplers
     # see the same cache in all `joint_sample` and `sample` calls for the same trial.
-    sampler = create_sampler(sampler_config=sampler_config)
+    sampler = create_sampler(sampler_config=sampler_config, worker_id=worker_id)
     sampler.init(
         search_space=None, targets=study_info.targets
     )  # TODO(tsuzuku): Set the search space.
@@ -299,17 +945,29 @@ def _run_trials(
     # with worker-id.
     trial_queue = _TrialQueue([TrialProto.State.WAITING], worker_id=worker_id)
     trial_counter = itertools.count() if n_trials is None else range(n_trials)
-    for _ in trial_counter:
-        _run_trial(
-            study_info=study_info,
-            objective=objective,
-            sampler=sampler,
-            storage_client=storage_client,
-            worker_id=worker_id,
-            catch=catch,
-            callbacks=callbacks,
-            trial_queue=trial_queue,
-        )
+    # Each worker has its own counters, which are added to the study's when it finishes.
+    sync_stats = SyncStats()
+    # Buffers are per worker so that the order of writes by each worker is kept.
+    buffered_client = BufferedStorageClient(client=storage_client) if buffer_writes else None
+    if buffered_client is not None:
+        storage_client = buffered_client
+    try:
+        for _ in trial_counter:
+            _run_trial(
+                study_info=study_info,
+                objective=objective,
+                sampler=sampler,
+                storage_client=storage_client,
+                worker_id=worker_id,
+                catch=catch,
+                callbacks=callbacks,
+                trial_queue=trial_queue,
+                sync_stats=sync_stats,
+            )
+    finally:
+        if buffered_client is not None:
+            buffered_client.flush()
+    return sync_stats
 
 
 def _run_trial(
@@ -321,6 +979,7 @@ def _run_trial(
     catch: Tuple[Type[Exception], ...],
     callbacks: Optional[Sequence[Callable[[Trial], None]]],
     trial_queue: _TrialQueue,
+    sync_stats: Optional[SyncStats] = None,
 ) -> None:
     trial = _ask(
         study_info=study_info,
@@ -328,6 +987,7 @@ def _run_trial(
         storage=storage_client,
         worker_id=worker_id,
         trial_queue=trial_queue,
+        sync_stats=sync_stats,
     )
     try:
         values = objective(trial)
@@ -338,14 +998,7 @@ def _run_trial(
         proto = trial.get_proto()
         proto.last_known_state = TrialProto.State.FAILED
     else:
-        proto = trial.get_proto()
-        if isinstance(values, SequenceType):
-            objective_values = [_value_to_objective_value(value=float(value)) for value in values]
-        else:
-            objective_values = [_value_to_objective_value(value=float(values))]
-        del proto.values[:]
-        proto.values.extend(objective_values)
-        proto.last_known_state = _infer_trial_state_from_objective_values(objective_values)
+        proto = _finish_trial(trial=trial, values=values)
     if callbacks:
         for callback in callbacks:
             # TODO(tsuzuku): Think about a better type to pass callbacks.
@@ -353,6 +1006,102 @@ def _run_trial(
     storage_client.write_trial(trial=proto)
 
 
+async def _optimize_async(
+    objective: AsyncObjectiveFuncType,
+    study_info: StudyInfo,
+    sampler_config: SamplerConfig,
+    client_id: str,
+    storage: AsyncStorage,
+    n_trials: Optional[int],
+    timeout: Optional[float],
+    n_concurrency: int,
+    catch: Tuple[Type[Exception], ...],
+    callbacks: Optional[Sequence[Callable[[Trial], None]]],
+    sync_stats: Optional[SyncStats] = None,
+) -> None:
+    # All coroutines run on the same thread, so they share the sampler and the trial queue
+    # as `Study.ask` does.
+    worker_id = WorkerID(client_id=client_id, thread_id=0)
+    sampler = create_sampler(sampler_config=sampler_config, worker_id=worker_id)
+    sampler.init(
+        search_space=None, targets=study_info.targets
+    )  # TODO(tsuzuku): Set the search space.
+    trial_queue = _TrialQueue([TrialProto.State.WAITING], worker_id=worker_id)
+    # Shared by coroutines so that `n_trials` limits the total number of trials.
+    trial_counter = itertools.count() if n_trials is None else iter(range(n_trials))
+
+    async def _run_trials_async() -> None:
+        for _ in trial_counter:
+            await _run_trial_async(
+                objective=objective,
+                study_info=study_info,
+                sampler=sampler,
+                storage=storage,
+                worker_id=worker_id,
+                catch=catch,
+                callbacks=callbacks,
+                trial_queue=trial_queue,
+                sync_stats=sync_stats,
+            )
+
+    tasks = [asyncio.ensure_future(_run_trials_async()) for _ in range(n_concurrency)]
+    try:
+        await asyncio.wait_for(asyncio.gather(*tasks), timeout=timeout)
+    except asyncio.TimeoutError:
+        # TODO(tsuzuku): Log a timeout message.
+        pass
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def _run_trial_async(
+    objective: AsyncObjectiveFuncType,
+    study_info: StudyInfo,
+    sampler: Sampler,
+    storage: AsyncStorage,
+    worker_id: WorkerID,
+    catch: Tuple[Type[Exception], ...],
+    callbacks: Optional[Sequence[Callable[[Trial], None]]],
+    trial_queue: _TrialQueue,
+    sync_stats: Optional[SyncStats] = None,
+) -> None:
+    trial = await _ask_async(
+        study_info=study_info,
+        sampler=sampler,
+        storage=storage,
+        worker_id=worker_id,
+        trial_queue=trial_queue,
+        sync_stats=sync_stats,
+    )
+    try:
+        values = await objective(trial)
+    except PrunedException:
+        proto = trial.get_proto()
+        proto.last_known_state = TrialProto.State.PRUNED
+    except catch:
+        proto = trial.get_proto()
+        proto.last_known_state = TrialProto.State.FAILED
+    else:
+        proto = _finish_trial(trial=trial, values=values)
+    if callbacks:
+        for callback in callbacks:
+            callback(trial)
+    await storage.write_trial(trial=proto)
+
+
+def _finish_trial(trial: Trial, values: Union[float, Sequence[float]]) -> TrialProto:
+    proto = trial.get_proto()
+    if isinstance(values, SequenceType):
+        objective_values = [_value_to_objective_value(value=float(value)) for value in values]
+    else:
+        objective_values = [_value_to_objective_value(value=float(values))]
+    del proto.values[:]
+    proto.values.extend(objective_values)
+    proto.last_known_state = _infer_trial_state_from_objective_values(objective_values)
+    return proto
+
+
 def _value_to_objective_value(value: float) -> ObjectiveValue:
     if math.isnan(value):
         return ObjectiveValue(status=ObjectiveValue.Status.NAN)
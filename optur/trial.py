@@ -4,7 +4,8 @@ from optur.proto.search_space_pb2 import Distribution, ParameterValue
 from optur.proto.study_pb2 import Parameter, StudyInfo
 from optur.proto.study_pb2 import Trial as TrialProto
 from optur.samplers import Sampler
-from optur.storages import StorageClient
+from optur.samplers.sampler import JointSampleResult
+from optur.storages import AsyncStorageClient, StorageClient
 
 
 class Trial:
@@ -14,12 +15,14 @@ class Trial:
         study_info: StudyInfo,
         storage: StorageClient,
         sampler: Sampler,
+        async_storage: Optional[AsyncStorageClient] = None,
     ) -> None:
         self._initial_trial_proto = trial_proto
         self._trial_proto = TrialProto()
         self._trial_proto.CopyFrom(trial_proto)
         self._study_info = study_info
         self._storage = storage
+        self._async_storage = async_storage
         self._sampler = sampler
         self._suggested_parameters: Dict[str, ParameterValue] = {}
 
@@ -197,18 +200,34 @@ class Trial:
             )
             self._sampler.sync(trials)
             self._sampler.update_timestamp(timestamp)
-        self._suggested_parameters, system_attrs = self._sampler.joint_sample(
-            fixed_parameters={
-                key: param.value for key, param in self._initial_trial_proto.parameters.items()
-            },
+        self._set_joint_sample_result(
+            self._sampler.joint_sample(
+                fixed_parameters={
+                    key: param.value for key, param in self._initial_trial_proto.parameters.items()
+                },
+            )
         )
-        for key, attr in system_attrs.items():
+
+    def _set_joint_sample_result(self, result: JointSampleResult) -> None:
+        self._suggested_parameters = result.parameters
+        for key, attr in result.system_attrs.items():
             self._trial_proto.system_attrs[key].CopyFrom(attr)
 
     def flush(self) -> None:
         """Write this trial to the storage."""
         self._storage.write_trial(self._trial_proto)
 
+    async def flush_async(self) -> None:
+        """Awaitable version of :meth:`flush`.
+
+        Trials created by :meth:`~optur.Study.optimize_async` write themselves through the
+        async storage, so that the event loop is not blocked.
+        """
+        if self._async_storage is None:
+            self.flush()
+            return
+        await self._async_storage.write_trial(self.get_proto())
+
 
 def _value_to_parameter_value(value: Union[int, float, str]) -> ParameterValue:
     if isinstance(value, int):
@@ -1,5 +1,12 @@
 import math
-from typing import Callable, List, Optional, Sequence
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    import numpy.typing as npt
+except ImportError:
+    pass
 
 from optur.proto.study_pb2 import Target, Trial
 
@@ -80,6 +87,13 @@ class TrialComparator:
 
 
 class SortedTrials:
+    """Trials sorted by their keys.
+
+    Trials are stored in columnar layout: keys are stored in a float64 array alongside
+    trial ids and trials, so that merges are done by NumPy instead of Python loops.
+    Keys are computed only once per version of a trial.
+    """
+
     def __init__(
         self,
         trial_filter: Callable[[Trial], bool],
@@ -90,7 +104,15 @@ class SortedTrials:
         self._trial_filter = trial_filter
         self._trial_key_generator = trial_key_generator
         self._trial_comparator = trial_comparator
-        self._sorted_trials: List[Trial] = []
+        self._keys: "npt.NDArray[np.float64]" = np.empty(shape=(0,), dtype=np.float64)
+        self._trial_ids: "npt.NDArray[np.object_]" = np.empty(shape=(0,), dtype=np.object_)
+        self._sorted_trials: "npt.NDArray[np.object_]" = np.empty(shape=(0,), dtype=np.object_)
+        # Cache of `to_list`.
+        self._sorted_trial_list: Optional[List[Trial]] = []
+        # Mapping from trial_id to the stored version of the trial and its key.
+        self._trials: Dict[str, Trial] = {}
+        self._trial_keys: Dict[str, float] = {}
+        self._generation = 0
         if self._trial_key_generator is None:
             raise NotImplementedError("Multi-objective is not supported yet.")
 
@@ -100,53 +122,94 @@ class SortedTrials:
         When there are duplicated trials, new trials replace old ones.
 
         Let M be the number of trials and N be the length of this list before the sync.
-        In single-objective study, this operation takes O(Mlog(M) + N).
+        In single-objective study, this operation takes O(Mlog(M) + N), where the O(N) part
+        is done by vectorized NumPy operations.
         In multi-objective study, this operation takes O(M(M + N)).
         """
+        assert self._trial_key_generator is not None, "Only single objective is supported."
+        # The last one wins when the trials contain the same trial more than once.
+        latest_trials = {trial.trial_id: trial for trial in trials if self._trial_filter(trial)}
+        # Trials that are already stored with the same contents are skipped so that
+        # the generation does not change when the same trials are synced again.
+        trials = [
+            trial
+            for trial_id, trial in latest_trials.items()
+            if self._trials.get(trial_id) != trial
+        ]
         if not trials:
             return
-        assert self._trial_key_generator is not None, "Only single objective is supported."
-        sorted_trials = list(
-            sorted(filter(self._trial_filter, trials), key=self._trial_key_generator)
+        keys = np.fromiter(
+            (self._trial_key_generator(trial) for trial in trials),
+            dtype=np.float64,
+            count=len(trials),
         )
-        new_trials = {trial.trial_id for trial in sorted_trials}
-        old_trials = [trial for trial in self._sorted_trials if trial.trial_id not in new_trials]
-        self._sorted_trials = self._merge_sorted_trials(
-            old_trials, sorted_trials, self._trial_key_generator
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        new_trials = _to_object_array(trials)[order]
+        new_trial_ids = _to_object_array([trial.trial_id for trial in trials])[order]
+        # Remove old versions of the trials.
+        removed = self._find_indices(
+            [trial.trial_id for trial in trials if trial.trial_id in self._trials]
         )
-
-    @staticmethod
-    def _merge_sorted_trials(
-        a: Sequence[Trial], b: Sequence[Trial], trial_key_generator: Callable[[Trial], float]
-    ) -> List[Trial]:
-        ret: List[Trial] = []
-        a_idx = 0
-        b_idx = 0
-        while a_idx < len(a) and b_idx < len(b):
-            if trial_key_generator(a[a_idx]) < trial_key_generator(b[b_idx]):
-                ret.append(a[a_idx])
-                a_idx += 1
-            else:
-                ret.append(b[b_idx])
-                b_idx += 1
-        if a_idx == len(a):
-            ret.extend(b[b_idx:])
-        else:
-            ret.extend(a[a_idx:])
+        old_keys = np.delete(self._keys, removed)
+        # New trials come before old trials with the same key.
+        positions = np.searchsorted(old_keys, keys, side="left")
+        self._keys = np.insert(old_keys, positions, keys)
+        self._trial_ids = np.insert(np.delete(self._trial_ids, removed), positions, new_trial_ids)
+        self._sorted_trials = np.insert(
+            np.delete(self._sorted_trials, removed), positions, new_trials
+        )
+        self._trial_keys.update(zip(new_trial_ids.tolist(), keys.tolist()))
+        self._sorted_trial_list = None
+        self._trials.update((trial.trial_id, trial) for trial in trials)
+        self._generation += 1
+
+    def _find_indices(self, trial_ids: Sequence[str]) -> List[int]:
+        # Stored trials are looked up by their keys, so this takes O(log(N)) per trial
+        # unless many trials have the same key.
+        ret: List[int] = []
+        for trial_id in trial_ids:
+            key = self._trial_keys[trial_id]
+            left = int(np.searchsorted(self._keys, key, side="left"))
+            right = int(np.searchsorted(self._keys, key, side="right"))
+            ret.extend(idx for idx in range(left, right) if self._trial_ids[idx] == trial_id)
         return ret
 
     def to_list(self) -> List[Trial]:
         """Convert trials into a list.
 
         Let N be the number of stored trials. Then, this operation takes at most O(N).
+        The returned list is cached until the next update, and it must not be modified.
         """
         assert self._trial_key_generator is not None, "Only single objective is supported."
-        return self._sorted_trials
+        if self._sorted_trial_list is None:
+            self._sorted_trial_list = self._sorted_trials.tolist()
+        return self._sorted_trial_list
+
+    @property
+    def keys(self) -> "npt.NDArray[np.float64]":
+        """Keys of the stored trials in the sorted order."""
+        return self._keys
+
+    @property
+    def generation(self) -> int:
+        """A counter that is incremented whenever the stored trials change.
+
+        Callers can use this value to invalidate caches derived from :meth:`to_list`.
+        """
+        return self._generation
 
     def n_trials(self) -> int:
         """The number of stored trials."""
         assert self._trial_key_generator is not None, "Only single objective is supported."
-        return len(self._sorted_trials)
+        return len(self._keys)
 
     def get_best_trials(self) -> List[Trial]:
         pass
+
+
+def _to_object_array(values: Sequence[Any]) -> "npt.NDArray[np.object_]":
+    ret = np.empty(shape=(len(values),), dtype=np.object_)
+    for idx, value in enumerate(values):
+        ret[idx] = value
+    return ret
@@ -1,6 +1,13 @@
+import asyncio
+import concurrent.futures
+
 import pytest
 
 import optur
+from optur.errors import ConflictError
+from optur.proto.study_pb2 import ObjectiveValue
+from optur.proto.study_pb2 import Trial as TrialProto
+from optur.proto.study_pb2 import WorkerID
 
 
 def test_optimize() -> None:
@@ -24,6 +31,27 @@ def test_multithread_parallel_optimize() -> None:
         return sum((trial.suggest_float(f"f{i}", 0, 1) for i in range(10)), 0.0)
 
     study.optimize(objective=_objective, n_trials=100, n_jobs=4)
+    # Each worker fetches trials once per trial.
+    assert study.sync_stats.n_fetches == 400
+
+
+@pytest.mark.timeout(5)
+def test_optimize_with_buffer_writes() -> None:
+    sampler = optur.samplers.create_random_sampler()
+    storage = optur.storages.create_inmemory_storage()
+    study = optur.create_study(storage=storage, sampler=sampler)
+
+    def _objective(trial: optur.Trial) -> float:
+        value = 0.0
+        for i in range(10):
+            value += trial.suggest_float(f"f{i}", 0, 1)
+            trial.flush()
+        return value
+
+    study.optimize(objective=_objective, n_trials=10, n_jobs=2, buffer_writes=True)
+    trials = storage.get_trials(study_id=study._study_info.study_id)
+    assert len(trials) == 20
+    assert all(t.last_known_state == TrialProto.State.COMPLETED for t in trials)
 
 
 # The objective function must be picklable.
@@ -49,3 +77,138 @@ def test_optimize_tpe() -> None:
         return sum((trial.suggest_float(f"f{i}", 0, 1) for i in range(10)), 0.0)
 
     study.optimize(objective=_objective, n_trials=100)
+
+
+@pytest.mark.timeout(10)
+def test_multiprocess_parallel_optimize_with_use_multiprocess() -> None:
+    sampler = optur.samplers.create_random_sampler()
+    storage = optur.storages.create_inmemory_storage()
+    study = optur.create_study(storage=storage, sampler=sampler)
+
+    study.optimize(objective=_multiprocess_objective, n_trials=10, n_jobs=4, use_multiprocess=True)
+    assert len(storage.get_trials(study_id=study._study_info.study_id)) == 40
+    assert study.sync_stats.n_fetches == 40
+
+
+@pytest.mark.timeout(5)
+def test_optimize_async() -> None:
+    sampler = optur.samplers.create_random_sampler()
+    storage = optur.storages.create_inmemory_storage()
+    study = optur.create_study(storage=storage, sampler=sampler)
+    n_running = 0
+    max_running = 0
+
+    async def _objective(trial: optur.Trial) -> float:
+        nonlocal n_running, max_running
+        n_running += 1
+        max_running = max(max_running, n_running)
+        await asyncio.sleep(0.01)
+        n_running -= 1
+        return sum((trial.suggest_float(f"f{i}", 0, 1) for i in range(10)), 0.0)
+
+    asyncio.run(study.optimize_async(objective=_objective, n_trials=100, n_concurrency=20))
+    trials = storage.get_trials(study_id=study._study_info.study_id)
+    assert len(trials) == 100
+    assert all(trial.last_known_state == TrialProto.State.COMPLETED for trial in trials)
+    assert max_running == 20
+    assert study.sync_stats.n_fetches == 100
+
+
+@pytest.mark.timeout(5)
+def test_optimize_async_with_executor() -> None:
+    sampler = optur.samplers.create_random_sampler()
+    storage = optur.storages.create_inmemory_storage()
+    study = optur.create_study(storage=storage, sampler=sampler)
+    async_storage = optur.storages.AsyncStorage(
+        storage=storage, executor=concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    )
+
+    async def _objective(trial: optur.Trial) -> float:
+        await asyncio.sleep(0)
+        x = trial.suggest_float("x", 0, 1)
+        await trial.flush_async()
+        trial_id = trial.get_proto().trial_id
+        assert storage.get_trial(trial_id=trial_id).last_known_state == TrialProto.State.CREATED
+        return x
+
+    try:
+        asyncio.run(
+            study.optimize_async(
+                objective=_objective, n_trials=10, n_concurrency=4, storage=async_storage
+            )
+        )
+    finally:
+        async_storage.shutdown()
+    assert len(storage.get_trials(study_id=study._study_info.study_id)) == 10
+
+
+def test_prefetch() -> None:
+    sampler = optur.samplers.create_tpe_sampler()
+    storage = optur.storages.create_inmemory_storage()
+    study = optur.create_study(storage=storage, sampler=sampler)
+
+    def _objective(trial: optur.Trial) -> float:
+        return trial.suggest_float("x", 0, 1) + trial.suggest_int("y", 0, 10)
+
+    study.optimize(objective=_objective, n_trials=20)
+    study.prefetch(n=8)
+    for _ in range(8):
+        trial = study.ask()
+        assert trial.get_proto().last_known_state == TrialProto.State.WAITING
+        assert 0 <= trial.suggest_float("x", 0, 1) <= 1
+        assert 0 <= trial.suggest_int("y", 0, 10) <= 10
+    assert study.ask().get_proto().last_known_state == TrialProto.State.CREATED
+
+
+def test_ask_batch_and_tell_batch() -> None:
+    sampler = optur.samplers.create_tpe_sampler()
+    storage = optur.storages.create_inmemory_storage()
+    study = optur.create_study(storage=storage, sampler=sampler)
+    study_id = study._study_info.study_id
+    for _ in range(3):
+        trials = study.ask_batch(n=8)
+        assert len({t.get_proto().trial_id for t in trials}) == 8
+        running_trials = storage.get_trials(study_id=study_id)
+        assert sum(t.last_known_state == TrialProto.State.RUNNING for t in running_trials) == 8
+        values = [trial.suggest_float("x", 0, 1) for trial in trials]
+        study.tell_batch(
+            trials,
+            [*values[:-1], None],
+            states=[*[None] * 7, TrialProto.State.FAILED],
+        )
+    stored_trials = storage.get_trials(study_id=study_id)
+    assert len(stored_trials) == 24
+    assert sum(t.last_known_state == TrialProto.State.COMPLETED for t in stored_trials) == 21
+    assert sum(t.last_known_state == TrialProto.State.FAILED for t in stored_trials) == 3
+
+
+def test_ask_and_tell() -> None:
+    sampler = optur.samplers.create_random_sampler()
+    storage = optur.storages.create_inmemory_storage()
+    study = optur.create_study(storage=storage, sampler=sampler)
+    (trial,) = study.ask_batch(n=1)
+    trial_id = trial.get_proto().trial_id
+    x = trial.suggest_float("x", 0, 1)
+    value = ObjectiveValue(status=ObjectiveValue.Status.VALID, value=x)
+    study.tell(trial_id, TrialProto.State.COMPLETED, [value])
+    stored_trial = storage.get_trial(trial_id=trial_id)
+    assert stored_trial.last_known_state == TrialProto.State.COMPLETED
+    assert list(stored_trial.values) == [value]
+    with pytest.raises(ConflictError):
+        study.tell(trial_id, TrialProto.State.FAILED, [])
+
+
+def test_enqueue_trial() -> None:
+    sampler = optur.samplers.create_random_sampler()
+    storage = optur.storages.create_inmemory_storage()
+    study = optur.create_study(storage=storage, sampler=sampler)
+    for x, priority in [(0.1, 0), (0.2, 1), (0.3, 0), (0.4, 1)]:
+        trial = TrialProto()
+        trial.parameters["x"].value.double_value = x
+        study.enqueue_trial(trial, priority=priority)
+    # Trials for other workers are not taken.
+    study.enqueue_trial(TrialProto(), worker_id=WorkerID(client_id="foo"), priority=2)
+    trials = [study.ask() for _ in range(4)]
+    assert all(t.get_proto().last_known_state == TrialProto.State.WAITING for t in trials)
+    assert [t.suggest_float("x", 0, 1) for t in trials] == [0.2, 0.4, 0.1, 0.3]
+    assert study.ask().get_proto().last_known_state == TrialProto.State.CREATED
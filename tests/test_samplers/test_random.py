@@ -1,5 +1,11 @@
+from typing import List
+
+import numpy as np
+
 from optur.proto.sampler_pb2 import RandomSamplerConfig, SamplerConfig
-from optur.proto.search_space_pb2 import Distribution, ParameterValue
+from optur.proto.search_space_pb2 import Distribution, ParameterValue, SearchSpace
+from optur.proto.study_pb2 import WorkerID
+from optur.samplers import Sampler, create_sampler
 from optur.samplers.random import RandomSampler
 
 FD = Distribution.FloatDistribution
@@ -61,3 +67,79 @@ def test_random_sampler_joint_sample_respects_fixed_parameters() -> None:
     parameters, _ = sampler.joint_sample(fixed_parameters=fixed_parameters)
     assert set(parameters.keys()) == {"foo", "bar"}
     assert all(parameters[key] == fixed_parameters[key] for key in {"foo", "bar"})
+
+
+def test_random_sampler_log_scale_distributions() -> None:
+    sampler = RandomSampler(sampler_config=SamplerConfig(random=RandomSamplerConfig()))
+    search_space = SearchSpace(
+        distributions={
+            "int": Distribution(int_distribution=ID(low=1, high=1000, log_scale=True)),
+            "float": Distribution(float_distribution=FD(low=1e-3, high=1e3, log_scale=True)),
+        }
+    )
+    samples = sampler.sample_batch(search_space=search_space, n=10000)
+    assert samples["int"].shape == (10000,)
+    assert samples["float"].shape == (10000,)
+    assert samples["int"].min() >= 1 and samples["int"].max() <= 1000
+    assert samples["float"].min() >= 1e-3 and samples["float"].max() <= 1e3
+    # Half of the samples are below the geometric mean.
+    assert 0.45 < np.mean(samples["int"] <= 22) < 0.55
+    assert 0.45 < np.mean(samples["float"] < 1) < 0.55
+
+
+def test_random_sampler_sample_batch_returns_categorical_indices() -> None:
+    sampler = RandomSampler(sampler_config=SamplerConfig(random=RandomSamplerConfig()))
+    choices = [ParameterValue(string_value="foo"), ParameterValue(int_value=46)]
+    search_space = SearchSpace(
+        distributions={"cat": Distribution(categorical_distribution=CD(choices=choices))}
+    )
+    samples = sampler.sample_batch(search_space=search_space, n=100)
+    assert set(samples["cat"].tolist()) == {0, 1}
+
+
+def test_random_sampler_joint_sample_with_search_space() -> None:
+    sampler = RandomSampler(sampler_config=SamplerConfig(random=RandomSamplerConfig()))
+    choices = [ParameterValue(string_value="foo"), ParameterValue(int_value=46)]
+    search_space = SearchSpace(
+        distributions={
+            "int": Distribution(int_distribution=ID(low=1, high=10, log_scale=True)),
+            "float": Distribution(float_distribution=FD(low=0, high=1, log_scale=False)),
+            "cat": Distribution(categorical_distribution=CD(choices=choices)),
+            "unknown": Distribution(unknown_distribution=Distribution.UnknownDistribution()),
+        }
+    )
+    sampler.init(search_space=search_space, targets=[])
+    fixed_parameters = {"float": ParameterValue(double_value=2.4)}
+    results = sampler.joint_sample_batch(n=5, fixed_parameters=fixed_parameters)
+    assert len(results) == 5
+    for parameters, _ in results:
+        assert set(parameters.keys()) == {"int", "float", "cat"}
+        assert 1 <= parameters["int"].int_value <= 10
+        assert parameters["float"] == fixed_parameters["float"]
+        assert any(parameters["cat"] == c for c in choices)
+
+
+def _sample_floats(sampler: Sampler) -> List[float]:
+    distribution = Distribution(float_distribution=FD(low=0, high=1, log_scale=False))
+    return [sampler.sample(distribution=distribution).double_value for _ in range(10)]
+
+
+def test_random_sampler_with_seed_is_reproducible() -> None:
+    config = SamplerConfig(random=RandomSamplerConfig(), seed=42)
+    assert _sample_floats(create_sampler(config)) == _sample_floats(create_sampler(config))
+    unseeded_config = SamplerConfig(random=RandomSamplerConfig())
+    assert _sample_floats(create_sampler(unseeded_config)) != _sample_floats(
+        create_sampler(unseeded_config)
+    )
+
+
+def test_random_samplers_of_workers_use_independent_streams() -> None:
+    config = SamplerConfig(random=RandomSamplerConfig(), seed=42)
+    worker_ids = [
+        WorkerID(client_id="foo", thread_id=0),
+        WorkerID(client_id="foo", thread_id=1),
+        WorkerID(client_id="bar", thread_id=1),
+    ]
+    samples = [_sample_floats(create_sampler(config, worker_id=w)) for w in worker_ids]
+    assert len({tuple(s) for s in samples}) == len(worker_ids)
+    assert _sample_floats(create_sampler(config, worker_id=worker_ids[1])) == samples[1]
@@ -5,7 +5,10 @@ import pytest
 
 from optur.proto.search_space_pb2 import Distribution, ParameterValue
 from optur.proto.study_pb2 import Parameter, Trial
-from optur.samplers.tpe import _MixturedDistribution
+from optur.samplers.tpe import (
+    _MixturedDistribution,
+    _TruncatedLogisticMixturedDistribution,
+)
 
 
 def int_distribution(low: int, high: int, log_scale: bool = False) -> Distribution:
@@ -122,3 +125,19 @@ def test_float_distribution_calculates_valid_log_pdf(log_scale: bool) -> None:
         np.exp(dist.log_pdf(np.asarray([random.random() * 20.0 + 10.0]))).mean()
         > np.exp(dist.log_pdf(np.asarray([random.random() * 20.0 + 60.0]))).mean()
     )
+
+
+def test_truncated_logistic_log_pdf_is_normalized() -> None:
+    dist = _TruncatedLogisticMixturedDistribution(
+        low=-1.0,
+        high=2.0,
+        loc=np.asarray([-1.0, 0.5, 1.5, 100.0]),
+        scale=np.asarray([0.1, 1.0, 0.01, 300.0]),
+    )
+    # Midpoints of a fine grid on the support.
+    x = np.linspace(-1.0, 2.0, 300000, endpoint=False) + 0.5e-5
+    pdf = np.exp(dist.log_pdf(x))
+    assert pdf.shape == (len(x), 4)
+    np.testing.assert_allclose(pdf.mean(axis=0) * 3.0, 1.0, rtol=1e-3)
+    # Far from the locations, the log-density is finite.
+    assert np.isfinite(dist.log_pdf(np.asarray([1e6]))).all()
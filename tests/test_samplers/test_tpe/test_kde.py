@@ -1,11 +1,13 @@
 import random
+from typing import Optional
+from unittest.mock import patch
 
 import numpy as np
 import pytest
 
 from optur.proto.search_space_pb2 import Distribution, ParameterValue, SearchSpace
 from optur.proto.study_pb2 import Parameter, Trial
-from optur.samplers.tpe import _UnivariateKDE
+from optur.samplers.tpe import _MixturedDistribution, _UnivariateKDE
 
 
 def int_distribution(low: int, high: int, log_scale: bool = False) -> Distribution:
@@ -85,3 +87,54 @@ def test_univariate_kde_calcuates_valid_pdf(int_log_scale: bool, float_log_scale
     assert log_pdf.shape == (17,)
     assert log_pdf.dtype == np.dtype("float64")  # type: ignore
     assert (np.exp(log_pdf) <= 1.0).all()
+
+
+@pytest.mark.parametrize("chunk_size", [None, 1, 7, 1000])
+def test_univariate_kde_log_pdf_matches_mixture(chunk_size: Optional[int]) -> None:
+    weights = np.random.random(99)
+    weights /= weights.sum()
+    search_space = SearchSpace(
+        distributions={
+            "foo": float_distribution(low=10.0, high=220.0, log_scale=True),
+            "bar": int_distribution(low=1, high=9),
+        }
+    )
+    trials = [
+        Trial(
+            parameters={
+                "foo": Parameter(
+                    value=ParameterValue(double_value=random.random() * 100.0 + 50.0)
+                ),
+                "bar": Parameter(value=ParameterValue(int_value=random.randint(3, 5))),
+            }
+        )
+        for _ in range(99)
+    ]
+    kde = _UnivariateKDE(search_space=search_space, trials=trials, weights=weights)
+    samples = kde.sample(fixed_parameters={}, k=17)
+    expected = 0.0
+    for name, distribution in search_space.distributions.items():
+        kernel = _MixturedDistribution(
+            name=name, distribution=distribution, trials=trials, n_distribution=2
+        )
+        expected += np.log((np.exp(kernel.log_pdf(samples[name])) * weights).sum(axis=1))
+    np.testing.assert_allclose(kde.log_pdf(samples, chunk_size=chunk_size), expected)
+
+
+def test_univariate_kde_samples_components_by_weights() -> None:
+    weights = np.zeros(50)
+    weights[7] = 1.0
+    kde = _UnivariateKDE(
+        search_space=SearchSpace(distributions={"foo": float_distribution(low=0.0, high=1.0)}),
+        trials=[
+            Trial(parameters={"foo": Parameter(value=ParameterValue(double_value=0.5))})
+            for _ in range(50)
+        ],
+        weights=weights,
+    )
+    distribution = kde._distributions["foo"]
+    with patch.object(distribution, "sample", wraps=distribution.sample) as sample:
+        kde.sample(fixed_parameters={}, k=1000)
+    _, kwargs = sample.call_args
+    assert kwargs["active_indices"].shape == (1000,)
+    assert (kwargs["active_indices"] == 7).all()
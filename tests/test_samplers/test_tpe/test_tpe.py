@@ -1,9 +1,20 @@
 import random
+import uuid
+from typing import List, Optional
+
+import numpy as np
+import pytest
 
 from optur.proto.sampler_pb2 import SamplerConfig, TPESamplerConfig
 from optur.proto.search_space_pb2 import Distribution, ParameterValue, SearchSpace
-from optur.proto.study_pb2 import ObjectiveValue, Parameter, Target, Trial
-from optur.samplers.tpe import TPESampler
+from optur.proto.study_pb2 import (
+    AttributeValue,
+    ObjectiveValue,
+    Parameter,
+    Target,
+    Trial,
+)
+from optur.samplers.tpe import TPESampler, _AliasTable, _ObservationColumns
 
 
 def int_distribution(low: int, high: int, log_scale: bool = False) -> Distribution:
@@ -18,17 +29,14 @@ def float_distribution(low: float, high: float, log_scale: bool = False) -> Dist
     )
 
 
-def test_tpe_sampler_joint_sample_respects_fixed_parameters() -> None:
-    # TODO(tsuzuku): Test this method.
-    pass
-
-
-def test_tpe_sampler_joint_sample_respects_int_range() -> None:
+def _create_sampler(seed: Optional[int] = None) -> TPESampler:
     sampler = TPESampler(
         sampler_config=SamplerConfig(
             tpe=TPESamplerConfig(n_ei_candidates=14),
+            seed=seed,
         ),
     )
+    rng = random.Random(seed)
     sampler.init(
         search_space=SearchSpace(
             distributions={
@@ -41,15 +49,16 @@ def test_tpe_sampler_joint_sample_respects_int_range() -> None:
     sampler.sync(
         [
             Trial(
+                trial_id=uuid.uuid4().hex,
                 last_known_state=Trial.State.COMPLETED,
-                values=[ObjectiveValue(value=random.random(), status=ObjectiveValue.Status.VALID)],
+                values=[ObjectiveValue(value=rng.random(), status=ObjectiveValue.Status.VALID)],
                 parameters={
                     "foo": Parameter(
-                        value=ParameterValue(int_value=random.randint(2, 12)),
+                        value=ParameterValue(int_value=rng.randint(2, 12)),
                         distribution=int_distribution(low=2, high=12),
                     ),
                     "bar": Parameter(
-                        value=ParameterValue(double_value=random.random() * 2.0),
+                        value=ParameterValue(double_value=rng.random() * 2.0),
                         distribution=float_distribution(low=-2.3, high=3.4),
                     ),
                 },
@@ -57,4 +66,135 @@ def test_tpe_sampler_joint_sample_respects_int_range() -> None:
             for _ in range(40)
         ]
     )
-    _, _ = sampler.joint_sample(fixed_parameters={})
+    return sampler
+
+
+def test_tpe_sampler_joint_sample_respects_fixed_parameters() -> None:
+    sampler = _create_sampler()
+    fixed_parameters = {"foo": ParameterValue(int_value=100)}
+    parameters, _ = sampler.joint_sample(fixed_parameters=fixed_parameters)
+    assert parameters["foo"] == ParameterValue(int_value=100)
+    assert -2.3 <= parameters["bar"].double_value <= 3.4
+
+
+def test_tpe_sampler_joint_sample_respects_int_range() -> None:
+    sampler = _create_sampler()
+    parameters, _ = sampler.joint_sample(fixed_parameters={})
+    assert 2 <= parameters["foo"].int_value <= 12
+    assert -2.3 <= parameters["bar"].double_value <= 3.4
+
+
+def test_tpe_sampler_joint_sample_batch() -> None:
+    sampler = _create_sampler()
+    results = sampler.joint_sample_batch(n=64, fixed_parameters={})
+    assert len(results) == 64
+    for parameters, system_attrs in results:
+        assert 2 <= parameters["foo"].int_value <= 12
+        assert -2.3 <= parameters["bar"].double_value <= 3.4
+        assert system_attrs["smpl.tpe.n"].int_value == 40
+    assert len({parameters["bar"].double_value for parameters, _ in results}) > 1
+
+
+def test_tpe_sampler_joint_sample_batch_with_all_parameters_fixed() -> None:
+    sampler = _create_sampler()
+    fixed_parameters = {
+        "foo": ParameterValue(int_value=3),
+        "bar": ParameterValue(double_value=0.5),
+    }
+    results = sampler.joint_sample_batch(n=3, fixed_parameters=fixed_parameters)
+    assert [parameters for parameters, _ in results] == [fixed_parameters] * 3
+
+
+def test_observation_columns() -> None:
+    columns = _ObservationColumns()
+    trials = [
+        Trial(
+            trial_id=uuid.uuid4().hex,
+            parameters={"foo": Parameter(value=ParameterValue(int_value=i))},
+            system_attrs={"smpl.tpe.n": AttributeValue(int_value=i)},
+        )
+        for i in range(5)
+    ]
+    columns.sync(trials)
+    columns.sync(
+        [
+            Trial(
+                trial_id=trials[2].trial_id,
+                parameters={"bar": Parameter(value=ParameterValue(double_value=0.5))},
+            )
+        ]
+    )
+    slots = columns.slots([trials[4], trials[2], trials[0]])
+    search_space = SearchSpace(
+        distributions={"foo": int_distribution(0, 10), "bar": float_distribution(0, 1)}
+    )
+    observations = columns.get(search_space, slots)
+    assert observations["foo"][0][[0, 2]].tolist() == [4.0, 0.0]
+    assert observations["foo"][1].tolist() == [True, False, True]
+    assert observations["bar"][0][1] == 0.5
+    assert observations["bar"][1].tolist() == [False, True, False]
+    assert columns.weights(slots).tolist() == [5 / 7, 1 / 7, 1 / 7]
+
+
+def test_tpe_sampler_reuses_sorted_slots() -> None:
+    sampler = _create_sampler()
+    sampler.joint_sample()
+    slots = sampler._get_sorted_slots()
+    sampler.joint_sample()
+    assert sampler._get_sorted_slots() is slots
+
+
+def test_tpe_sampler_reuses_alias_tables_until_sync() -> None:
+    sampler = _create_sampler()
+    sampler.joint_sample()
+    assert sampler._alias_tables is not None
+    alias_tables = sampler._alias_tables[1]
+    sampler.joint_sample()
+    assert sampler._alias_tables[1] is alias_tables
+    sampler.sync([Trial(trial_id=uuid.uuid4().hex, last_known_state=Trial.State.RUNNING)])
+    sampler.joint_sample()
+    assert sampler._alias_tables[1] is not alias_tables
+
+
+@pytest.mark.parametrize(
+    "weights",
+    [
+        [1.0],
+        [0.25, 0.25, 0.25, 0.25],
+        [0.0, 1.0, 0.0],
+        [0.7, 0.1, 0.1, 0.05, 0.05],
+        [0.01, 0.01, 0.3, 0.01, 0.27, 0.4],
+        # Cumulative deficits and excesses tie.
+        [2 / 15, 4 / 15, 1 / 15, 4 / 15, 4 / 15],
+        [4 / 18, 4 / 18, 3 / 18, 4 / 18, 2 / 18, 1 / 18],
+    ],
+)
+def test_alias_table_represents_weights(weights: List[float]) -> None:
+    table = _AliasTable(np.asarray(weights))
+    assert ((0.0 <= table.prob) & (table.prob <= 1.0)).all()
+    # Each cell has probability `1 / n`, which is split into the index and the alias.
+    probabilities = table.prob.copy()
+    np.add.at(probabilities, table.alias, 1.0 - table.prob)
+    np.testing.assert_allclose(probabilities / len(weights), weights, atol=1e-12)
+    samples = table.sample(1000, rng=np.random.default_rng())
+    assert samples.shape == (1000,)
+    assert set(samples) <= {i for i, w in enumerate(weights) if w > 0}
+
+
+@pytest.mark.parametrize("n", [2, 3, 5, 8, 13, 50, 200])
+def test_alias_table_represents_integer_weights(n: int) -> None:
+    # TPE weights are often small integers normalized to sum up to one, which cause ties.
+    rng = np.random.default_rng(n)
+    for _ in range(200):
+        weights = rng.integers(1, 6, size=n).astype(np.float64)
+        weights /= weights.sum()
+        table = _AliasTable(weights)
+        probabilities = table.prob.copy()
+        np.add.at(probabilities, table.alias, 1.0 - table.prob)
+        np.testing.assert_allclose(probabilities / n, weights, atol=1e-12)
+
+
+def test_tpe_sampler_with_seed_is_reproducible() -> None:
+    results = [_create_sampler(seed=42).joint_sample_batch(n=3) for _ in range(2)]
+    assert results[0] == results[1]
+    assert _create_sampler(seed=43).joint_sample_batch(n=3) != results[0]
@@ -0,0 +1,159 @@
+import uuid
+from typing import Callable, List, Optional
+from unittest.mock import MagicMock
+
+import pytest
+from google.protobuf.timestamp_pb2 import Timestamp
+
+from optur.proto.study_pb2 import StudyInfo, Trial
+from optur.storages.backends.caching import CachingStorageBackend
+from optur.storages.backends.inmemory import InMemoryStorageBackend
+
+
+def _create_study(backend: InMemoryStorageBackend, n_trials: int) -> StudyInfo:
+    study = StudyInfo(study_id=uuid.uuid4().hex)
+    backend.write_study(study=study)
+    backend.write_trials(
+        trials=[Trial(trial_id=uuid.uuid4().hex, study_id=study.study_id) for _ in range(n_trials)]
+    )
+    return study
+
+
+def test_invalid_max_cached_trials() -> None:
+    with pytest.raises(ValueError):
+        CachingStorageBackend(InMemoryStorageBackend(), max_cached_trials=0)
+
+
+def test_get_trials_loads_only_new_trials() -> None:
+    backend = InMemoryStorageBackend()
+    study = _create_study(backend, n_trials=5)
+    caching = CachingStorageBackend(backend)
+    backend.get_trials = MagicMock(wraps=backend.get_trials)  # type: ignore
+    assert len(caching.get_trials(study_id=study.study_id)) == 5
+    assert backend.get_trials.call_count == 1
+    _, kwargs = backend.get_trials.call_args
+    assert kwargs["timestamp"] is None
+    new_trial = Trial(trial_id=uuid.uuid4().hex, study_id=study.study_id)
+    backend.write_trial(trial=new_trial)
+    loaded_trials = caching.get_trials(study_id=study.study_id)
+    assert len(loaded_trials) == 6
+    assert new_trial.trial_id in {t.trial_id for t in loaded_trials}
+    _, kwargs = backend.get_trials.call_args
+    assert kwargs["timestamp"] is not None
+
+
+def test_get_trials_with_timestamp() -> None:
+    backend = InMemoryStorageBackend()
+    study = _create_study(backend, n_trials=5)
+    caching = CachingStorageBackend(backend)
+    caching.get_trials(study_id=study.study_id)
+    timestamp = caching.get_current_timestamp()
+    new_trial = Trial(trial_id=uuid.uuid4().hex, study_id=study.study_id)
+    caching.write_trial(trial=new_trial)
+    # A reader that has not synced since the timestamp.
+    loaded_trials = caching.get_trials(study_id=study.study_id, timestamp=timestamp)
+    assert [t.trial_id for t in loaded_trials] == [new_trial.trial_id]
+    # Another reader with the same timestamp gets the trial from the cache.
+    loaded_trials = caching.get_trials(study_id=study.study_id, timestamp=timestamp)
+    assert [t.trial_id for t in loaded_trials] == [new_trial.trial_id]
+    new_trial.last_known_state = Trial.State.COMPLETED
+    caching.write_trial(trial=new_trial)
+    loaded_trials = caching.get_trials(study_id=study.study_id, timestamp=timestamp)
+    assert [t.last_known_state for t in loaded_trials] == [Trial.State.COMPLETED]
+
+
+def test_get_trials_returns_copies() -> None:
+    backend = InMemoryStorageBackend()
+    study = _create_study(backend, n_trials=1)
+    caching = CachingStorageBackend(backend)
+    (trial,) = caching.get_trials(study_id=study.study_id)
+    trial.last_known_state = Trial.State.FAILED
+    (trial,) = caching.get_trials(study_id=study.study_id)
+    assert trial.last_known_state != Trial.State.FAILED
+
+
+def test_least_recently_used_study_is_evicted() -> None:
+    backend = InMemoryStorageBackend()
+    study1 = _create_study(backend, n_trials=2)
+    study2 = _create_study(backend, n_trials=2)
+    caching = CachingStorageBackend(backend, max_cached_trials=3)
+    backend.get_trials = MagicMock(wraps=backend.get_trials)  # type: ignore
+    caching.get_trials(study_id=study1.study_id)
+    caching.get_trials(study_id=study2.study_id)
+    assert len(caching.get_trials(study_id=study2.study_id)) == 2
+    _, kwargs = backend.get_trials.call_args
+    assert kwargs["timestamp"] is not None
+    # `study1` has been evicted and is loaded from scratch.
+    assert len(caching.get_trials(study_id=study1.study_id)) == 2
+    _, kwargs = backend.get_trials.call_args
+    assert kwargs["timestamp"] is None
+
+
+def test_get_trial_uses_cached_study_id() -> None:
+    backend = InMemoryStorageBackend()
+    study = _create_study(backend, n_trials=1)
+    caching = CachingStorageBackend(backend)
+    (trial,) = caching.get_trials(study_id=study.study_id)
+    backend.get_trial = MagicMock(wraps=backend.get_trial)  # type: ignore
+    assert caching.get_trial(trial_id=trial.trial_id) == trial
+    backend.get_trial.assert_called_once_with(trial_id=trial.trial_id, study_id=study.study_id)
+
+
+def test_refresh_asks_timestamp_once() -> None:
+    backend = InMemoryStorageBackend()
+    study = _create_study(backend, n_trials=2)
+    caching = CachingStorageBackend(backend)
+    caching.get_trials(study_id=study.study_id)
+    backend.get_current_timestamp = MagicMock(wraps=backend.get_current_timestamp)  # type: ignore
+    caching.get_trials(study_id=study.study_id)
+    assert backend.get_current_timestamp.call_count == 1
+
+
+def test_get_trial_serves_finished_trials_from_cache() -> None:
+    backend = InMemoryStorageBackend()
+    study = _create_study(backend, n_trials=1)
+    finished_trial = Trial(
+        trial_id=uuid.uuid4().hex,
+        study_id=study.study_id,
+        last_known_state=Trial.State.COMPLETED,
+    )
+    backend.write_trial(trial=finished_trial)
+    caching = CachingStorageBackend(backend)
+    loaded_trials = {t.trial_id: t for t in caching.get_trials(study_id=study.study_id)}
+    backend.get_trial = MagicMock(wraps=backend.get_trial)  # type: ignore
+    for trial_id, trial in loaded_trials.items():
+        assert caching.get_trial(trial_id=trial_id) == trial
+    # Only the unfinished trial is read from the backend.
+    backend.get_trial.assert_called_once()
+    _, kwargs = backend.get_trial.call_args
+    assert kwargs["trial_id"] != finished_trial.trial_id
+
+
+class _ReentrantBackend(InMemoryStorageBackend):
+    def __init__(self) -> None:
+        super().__init__()
+        self.on_get_trials: Optional[Callable[[], object]] = None
+
+    def get_trials(
+        self, study_id: Optional[str] = None, timestamp: Optional[Timestamp] = None
+    ) -> List[Trial]:
+        ret = super().get_trials(study_id=study_id, timestamp=timestamp)
+        on_get_trials, self.on_get_trials = self.on_get_trials, None
+        if on_get_trials is not None:
+            on_get_trials()
+        return ret
+
+
+def test_study_evicted_during_refresh_is_not_counted() -> None:
+    backend = _ReentrantBackend()
+    study1 = _create_study(backend, n_trials=2)
+    study2 = _create_study(backend, n_trials=2)
+    caching = CachingStorageBackend(backend, max_cached_trials=3)
+    caching.get_trials(study_id=study2.study_id)
+    # `study2` is refreshed and `study1` is evicted while `study1` is loaded.
+    backend.on_get_trials = lambda: caching.get_trials(study_id=study2.study_id)
+    assert len(caching.get_trials(study_id=study1.study_id)) == 2
+    assert caching._n_cached_trials == 2
+    assert caching.get_trial(trial_id=next(iter(caching._trial_studies))).study_id == (
+        study2.study_id
+    )
@@ -0,0 +1,72 @@
+import threading
+from typing import List
+
+import pytest
+
+from optur.storages.backends.mysql import _ConnectionPool
+
+
+class _FakeConnection:
+    def __init__(self) -> None:
+        self.open = True
+        self.closed = False
+
+    def rollback(self) -> None:
+        if not self.open:
+            raise RuntimeError()
+
+    def close(self) -> None:
+        self.closed = True
+
+    def connect(self) -> None:
+        self.open = True
+
+
+def test_connection_pool_reuses_connections() -> None:
+    connections: List[_FakeConnection] = []
+
+    def _connect() -> _FakeConnection:
+        connections.append(_FakeConnection())
+        return connections[-1]
+
+    pool = _ConnectionPool(connect=_connect, pool_size=2)
+    with pool.connection() as c1:
+        with pool.connection() as c2:
+            assert c1 is not c2
+    with pool.connection() as c3:
+        assert c3 in (c1, c2)
+    assert len(connections) == 2
+
+
+def test_connection_pool_blocks_when_exhausted() -> None:
+    pool = _ConnectionPool(connect=_FakeConnection, pool_size=1)
+    acquired = threading.Event()
+
+    def _acquire() -> None:
+        with pool.connection():
+            acquired.set()
+
+    with pool.connection() as c1:
+        thread = threading.Thread(target=_acquire)
+        thread.start()
+        assert not acquired.wait(timeout=0.1)
+    thread.join(timeout=1)
+    assert acquired.is_set()
+    assert c1.open
+
+
+def test_connection_pool_discards_broken_connections() -> None:
+    connections: List[_FakeConnection] = []
+
+    def _connect() -> _FakeConnection:
+        connections.append(_FakeConnection())
+        return connections[-1]
+
+    pool = _ConnectionPool(connect=_connect, pool_size=1)
+    with pytest.raises(ValueError):
+        with pool.connection() as connection:
+            connection.open = False
+            raise ValueError()
+    assert connections[0].closed
+    with pool.connection() as connection:
+        assert connection is connections[1]
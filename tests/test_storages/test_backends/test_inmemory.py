@@ -3,7 +3,7 @@ import uuid
 
 import pytest
 
-from optur.errors import NotFoundError
+from optur.errors import ConflictError, NotFoundError
 from optur.proto.study_pb2 import AttributeValue, StudyInfo, Target, Trial
 from optur.storages.backends.inmemory import InMemoryStorageBackend
 
@@ -150,3 +150,75 @@ def test_read_trial_with_timestamp() -> None:
     loaded_trials = backend.get_trials(study_id=study1.study_id, timestamp=timestamp)
     assert len(loaded_trials) == 5
     assert set(t.trial_id for t in loaded_trials) == set(t.trial_id for t in trials1[2:])
+
+
+def test_repeated_writes_are_compacted() -> None:
+    backend = InMemoryStorageBackend()
+    study = StudyInfo(study_id=uuid.uuid4().hex)
+    trials = [Trial(trial_id=uuid.uuid4().hex, study_id=study.study_id) for _ in range(10)]
+    backend.write_study(study=study)
+    for idx in range(5000):
+        trial = trials[idx % len(trials)]
+        trial.user_attrs["step"].CopyFrom(AttributeValue(int_value=idx))
+        backend.write_trial(trial=trial)
+    assert len(backend._studies[study.study_id].sorted_trials) <= 1024 + len(trials)
+    loaded_trials = backend.get_trials(study_id=study.study_id)
+    assert len(loaded_trials) == len(trials)
+    assert {t.user_attrs["step"].int_value for t in loaded_trials} == set(range(4990, 5000))
+
+
+def test_incremental_read_returns_latest_trials_once() -> None:
+    backend = InMemoryStorageBackend()
+    study = StudyInfo(study_id=uuid.uuid4().hex)
+    trials = [Trial(trial_id=uuid.uuid4().hex, study_id=study.study_id) for _ in range(5)]
+    backend.write_study(study=study)
+    for trial in trials:
+        backend.write_trial(trial=trial)
+    timestamp = backend.get_current_timestamp()
+    for idx in range(3):
+        trials[0].user_attrs["step"].CopyFrom(AttributeValue(int_value=idx))
+        backend.write_trial(trial=trials[0])
+    loaded_trials = backend.get_trials(study_id=study.study_id, timestamp=timestamp)
+    assert [t.trial_id for t in loaded_trials] == [trials[0].trial_id]
+    assert loaded_trials[0].user_attrs["step"].int_value == 2
+
+
+def test_write_trials() -> None:
+    backend = InMemoryStorageBackend()
+    study = StudyInfo(study_id=uuid.uuid4().hex)
+    trials = [Trial(trial_id=uuid.uuid4().hex, study_id=study.study_id) for _ in range(5)]
+    backend.write_study(study=study)
+    backend.write_trials(trials=trials)
+    loaded_trials = backend.get_trials(study_id=study.study_id)
+    assert {t.trial_id for t in loaded_trials} == {t.trial_id for t in trials}
+    assert len({t.last_update_time.ToNanoseconds() for t in loaded_trials}) == 1
+
+
+def test_write_trials_with_non_existent_study() -> None:
+    backend = InMemoryStorageBackend()
+    study = StudyInfo(study_id=uuid.uuid4().hex)
+    backend.write_study(study=study)
+    trials = [
+        Trial(trial_id=uuid.uuid4().hex, study_id=study.study_id),
+        Trial(trial_id=uuid.uuid4().hex, study_id="foo"),
+    ]
+    with pytest.raises(NotFoundError):
+        backend.write_trials(trials=trials)
+    assert backend.get_trials(study_id=study.study_id) == []
+
+
+def test_compare_and_write_trial() -> None:
+    backend = InMemoryStorageBackend()
+    study = StudyInfo(study_id=uuid.uuid4().hex)
+    backend.write_study(study=study)
+    trial = Trial(trial_id=uuid.uuid4().hex, study_id=study.study_id)
+    backend.compare_and_write_trial(trial=trial, expected=None)
+    with pytest.raises(ConflictError):
+        backend.compare_and_write_trial(trial=trial, expected=None)
+    stored_trial = backend.get_trial(trial_id=trial.trial_id)
+    trial.last_known_state = Trial.State.COMPLETED
+    backend.compare_and_write_trial(trial=trial, expected=stored_trial)
+    trial.last_known_state = Trial.State.FAILED
+    with pytest.raises(ConflictError):
+        backend.compare_and_write_trial(trial=trial, expected=stored_trial)
+    assert backend.get_trial(trial_id=trial.trial_id).last_known_state == Trial.State.COMPLETED
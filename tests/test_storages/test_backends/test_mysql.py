@@ -4,7 +4,7 @@ import uuid
 
 import pytest
 
-from optur.errors import NotFoundError
+from optur.errors import ConflictError, NotFoundError
 from optur.proto.study_pb2 import AttributeValue, StudyInfo, Target, Trial
 from optur.storages.backends.mysql import MySQLBackend
 
@@ -241,3 +241,48 @@ def test_read_trial_with_timestamp() -> None:
     assert 4 <= len(loaded_trials) < 7
     left_idx = -len(loaded_trials)
     assert set(t.trial_id for t in loaded_trials) == set(t.trial_id for t in trials1[left_idx:])
+
+
+@pytest.mark.mysql
+@pytest.mark.timeout(5)
+def test_write_trials() -> None:
+    backend = MySQLBackend(
+        user=os.environ["MYSQL_USER"],
+        host=os.environ["MYSQL_HOST"],
+        port=int(os.getenv("MYSQL_PORT", 3306)),
+        password=os.environ["MYSQL_PASSWORD"],
+        database=os.environ["MYSQL_DATABASE"],
+    )
+    backend.init()
+    backend.drop_all()
+    study = StudyInfo(study_id=uuid.uuid4().hex)
+    trials = [Trial(trial_id=uuid.uuid4().hex, study_id=study.study_id) for _ in range(5)]
+    backend.write_study(study=study)
+    backend.write_trials(trials=trials)
+    loaded_trials = backend.get_trials(study_id=study.study_id)
+    assert {t.trial_id for t in loaded_trials} == {t.trial_id for t in trials}
+
+
+@pytest.mark.mysql
+@pytest.mark.timeout(5)
+def test_compare_and_write_trial() -> None:
+    backend = MySQLBackend(
+        user=os.environ["MYSQL_USER"],
+        host=os.environ["MYSQL_HOST"],
+        port=int(os.getenv("MYSQL_PORT", 3306)),
+        password=os.environ["MYSQL_PASSWORD"],
+        database=os.environ["MYSQL_DATABASE"],
+    )
+    backend.init()
+    backend.drop_all()
+    study = StudyInfo(study_id=uuid.uuid4().hex)
+    backend.write_study(study=study)
+    trial = Trial(trial_id=uuid.uuid4().hex, study_id=study.study_id)
+    backend.compare_and_write_trial(trial=trial, expected=None)
+    with pytest.raises(ConflictError):
+        backend.compare_and_write_trial(trial=trial, expected=None)
+    stored_trial = backend.get_trial(trial_id=trial.trial_id)
+    trial.last_known_state = Trial.State.COMPLETED
+    backend.compare_and_write_trial(trial=trial, expected=stored_trial)
+    with pytest.raises(ConflictError):
+        backend.compare_and_write_trial(trial=trial, expected=stored_trial)
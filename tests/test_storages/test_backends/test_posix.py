@@ -1,12 +1,21 @@
+import os
+import pathlib
 import random
 import tempfile
+import threading
+import time
 import uuid
+from typing import List, Optional
 
 import pytest
+from google.protobuf.timestamp_pb2 import Timestamp
 
-from optur.errors import NotFoundError
+from optur.errors import ConflictError, NotFoundError
 from optur.proto.study_pb2 import AttributeValue, StudyInfo, Target, Trial
-from optur.storages.backends.posix import PosixStorageBackend
+from optur.storages.backends.posix import (
+    LogStructuredPosixStorageBackend,
+    PosixStorageBackend,
+)
 
 
 def test_read_all_study() -> None:
@@ -102,3 +111,221 @@ def test_read_trials() -> None:
         loaded_trials = backend.get_trials(study_id=study2.study_id)
         assert len(loaded_trials) == 7
         assert set(t.trial_id for t in loaded_trials) == set(t.trial_id for t in trials2)
+
+
+def test_log_structured_backend_read_write_trials() -> None:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        writer1 = LogStructuredPosixStorageBackend(root_dir=tmpdir)
+        writer2 = LogStructuredPosixStorageBackend(root_dir=tmpdir)
+        reader = LogStructuredPosixStorageBackend(root_dir=tmpdir)
+        study = StudyInfo(study_id=uuid.uuid4().hex)
+        trials = [Trial(trial_id=uuid.uuid4().hex, study_id=study.study_id) for _ in range(6)]
+        writer1.write_study(study=study)
+        for trial in trials[:3]:
+            writer1.write_trial(trial=trial)
+        for trial in trials[3:]:
+            writer2.write_trial(trial=trial)
+        loaded_trials = reader.get_trials(study_id=study.study_id)
+        assert {t.trial_id for t in loaded_trials} == {t.trial_id for t in trials}
+        timestamp = reader.get_current_timestamp()
+        assert reader.get_trials(study_id=study.study_id, timestamp=timestamp) == []
+        # Another worker updates the trial.
+        trials[0].user_attrs["foo"].CopyFrom(AttributeValue(int_value=1))
+        writer2.write_trial(trial=trials[0])
+        loaded_trials = reader.get_trials(study_id=study.study_id, timestamp=timestamp)
+        assert [t.trial_id for t in loaded_trials] == [trials[0].trial_id]
+        assert loaded_trials[0].user_attrs["foo"].int_value == 1
+        assert reader.get_trial(trial_id=trials[0].trial_id).user_attrs["foo"].int_value == 1
+        assert len(reader.get_trials()) == 6
+
+
+def test_log_structured_backend_ignores_partial_records() -> None:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        writer = LogStructuredPosixStorageBackend(root_dir=tmpdir)
+        reader = LogStructuredPosixStorageBackend(root_dir=tmpdir)
+        study = StudyInfo(study_id=uuid.uuid4().hex)
+        trial = Trial(trial_id=uuid.uuid4().hex, study_id=study.study_id)
+        writer.write_study(study=study)
+        writer.write_trial(trial=trial)
+        segment = next(pathlib.Path(tmpdir).glob("optur_study_*/segment_*.log"))
+        data = segment.read_bytes()
+        segment.write_bytes(data + data[:7])
+        assert [t.trial_id for t in reader.get_trials(study_id=study.study_id)] == [trial.trial_id]
+        with segment.open("ab") as f:
+            f.write(data[7:])
+        assert [t.trial_id for t in reader.get_trials(study_id=study.study_id)] == [trial.trial_id]
+
+
+def test_log_structured_backend_write_trial_with_non_existent_study() -> None:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        backend = LogStructuredPosixStorageBackend(root_dir=tmpdir)
+        with pytest.raises(NotFoundError):
+            backend.write_trial(trial=Trial(trial_id=uuid.uuid4().hex, study_id="foo"))
+
+
+def test_get_current_timestamp_is_ordered() -> None:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        backend = PosixStorageBackend(root_dir=tmpdir)
+        timestamps = [backend.get_current_timestamp() for _ in range(100)]
+        assert all(t is not None for t in timestamps)
+        int_timestamps = [t.ToNanoseconds() for t in timestamps if t is not None]
+        assert int_timestamps == list(sorted(int_timestamps))
+
+
+def test_read_trials_with_timestamp() -> None:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        backend = PosixStorageBackend(root_dir=tmpdir)
+        study = StudyInfo(study_id=uuid.uuid4().hex)
+        trials = [Trial(trial_id=uuid.uuid4().hex, study_id=study.study_id) for _ in range(5)]
+        backend.write_study(study=study)
+        for trial in trials[:3]:
+            backend.write_trial(trial=trial)
+        # Pretend that the trials were written a while ago.
+        for path in pathlib.Path(tmpdir).glob("optur_study_*/trial_*.pb"):
+            stat = path.stat()
+            os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns - 60 * 10**9))
+        timestamp = backend.get_current_timestamp()
+        for trial in trials[3:]:
+            backend.write_trial(trial=trial)
+        loaded_trials = backend.get_trials(study_id=study.study_id, timestamp=timestamp)
+        assert {t.trial_id for t in loaded_trials} == {t.trial_id for t in trials[3:]}
+        assert len(backend.get_trials(study_id=study.study_id)) == 5
+
+
+@pytest.mark.parametrize("backend_cls", [PosixStorageBackend, LogStructuredPosixStorageBackend])
+def test_write_trials(backend_cls: type) -> None:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        backend = backend_cls(root_dir=tmpdir)
+        studies = [StudyInfo(study_id=uuid.uuid4().hex) for _ in range(2)]
+        trials = [
+            Trial(trial_id=uuid.uuid4().hex, study_id=studies[i % 2].study_id) for i in range(6)
+        ]
+        for study in studies:
+            backend.write_study(study=study)
+        backend.write_trials(trials=trials)
+        for study in studies:
+            assert {t.trial_id for t in backend.get_trials(study_id=study.study_id)} == {
+                t.trial_id for t in trials if t.study_id == study.study_id
+            }
+
+
+@pytest.mark.parametrize("backend_cls", [PosixStorageBackend, LogStructuredPosixStorageBackend])
+def test_compare_and_write_trial(backend_cls: type) -> None:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        backend = backend_cls(root_dir=tmpdir)
+        study = StudyInfo(study_id=uuid.uuid4().hex)
+        backend.write_study(study=study)
+        trial = Trial(trial_id=uuid.uuid4().hex, study_id=study.study_id)
+        backend.compare_and_write_trial(trial=trial, expected=None)
+        with pytest.raises(ConflictError):
+            backend.compare_and_write_trial(trial=trial, expected=None)
+        stored_trial = backend.get_trial(trial_id=trial.trial_id)
+        trial.last_known_state = Trial.State.COMPLETED
+        backend.compare_and_write_trial(trial=trial, expected=stored_trial)
+        trial.last_known_state = Trial.State.FAILED
+        with pytest.raises(ConflictError):
+            backend.compare_and_write_trial(trial=trial, expected=stored_trial)
+        loaded_trial = backend.get_trial(trial_id=trial.trial_id)
+        assert loaded_trial.last_known_state == Trial.State.COMPLETED
+        assert not list(pathlib.Path(tmpdir).glob("optur_study_*/*.lock"))
+
+
+def test_compare_and_write_trial_breaks_stale_lock(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr("optur.storages.backends.posix._LOCK_TIMEOUT", 0.0)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        backend = PosixStorageBackend(root_dir=tmpdir)
+        study = StudyInfo(study_id=uuid.uuid4().hex)
+        backend.write_study(study=study)
+        trial = Trial(trial_id=uuid.uuid4().hex, study_id=study.study_id)
+        study_dir = pathlib.Path(tmpdir) / f"optur_study_{study.study_id}"
+        lock_file = study_dir / f"trial_{trial.trial_id}.lock"
+        lock_file.touch()
+        # A lock held by another worker.
+        with pytest.raises(ConflictError):
+            backend.compare_and_write_trial(trial=trial, expected=None)
+        # A lock left by a crashed worker.
+        stat = lock_file.stat()
+        os.utime(lock_file, ns=(stat.st_atime_ns, stat.st_mtime_ns - 120 * 10**9))
+        backend.compare_and_write_trial(trial=trial, expected=None)
+        assert backend.get_trial(trial_id=trial.trial_id) == trial
+        assert not lock_file.exists()
+
+
+class _SlowPosixStorageBackend(PosixStorageBackend):
+    def __init__(
+        self, root_dir: str, clock_delay: float, counter: List[int], max_counter: List[int]
+    ) -> None:
+        super().__init__(root_dir=root_dir)
+        self._clock_delay = clock_delay
+        self._counter = counter
+        self._max_counter = max_counter
+        self._counter_lock = threading.Lock()
+
+    def get_current_timestamp(self) -> Optional[Timestamp]:
+        # Widen the window between checking and breaking a stale lock.
+        time.sleep(self._clock_delay)
+        return super().get_current_timestamp()
+
+    def write_trial(self, trial: Trial) -> None:
+        # Count writers inside the lock of the trial.
+        with self._counter_lock:
+            self._counter[0] += 1
+            self._max_counter[0] = max(self._max_counter[0], self._counter[0])
+        time.sleep(0.05)
+        super().write_trial(trial=trial)
+        with self._counter_lock:
+            self._counter[0] -= 1
+
+
+def test_compare_and_write_trial_breaks_stale_lock_once() -> None:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        counter, max_counter = [0], [0]
+        # The second worker breaks the stale lock after the first one has taken the lock.
+        backends = [
+            _SlowPosixStorageBackend(tmpdir, delay, counter, max_counter) for delay in [0.0, 0.02]
+        ]
+        study = StudyInfo(study_id=uuid.uuid4().hex)
+        backends[0].write_study(study=study)
+        trial = Trial(trial_id=uuid.uuid4().hex, study_id=study.study_id)
+        study_dir = pathlib.Path(tmpdir) / f"optur_study_{study.study_id}"
+        lock_file = study_dir / f"trial_{trial.trial_id}.lock"
+        lock_file.write_bytes(b"crashed")
+        stat = lock_file.stat()
+        os.utime(lock_file, ns=(stat.st_atime_ns, stat.st_mtime_ns - 120 * 10**9))
+        barrier = threading.Barrier(2)
+        errors: List[Exception] = []
+
+        def _write(backend: PosixStorageBackend) -> None:
+            barrier.wait()
+            try:
+                backend.compare_and_write_trial(trial=trial, expected=None)
+            except ConflictError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=_write, args=(backend,)) for backend in backends]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # Exactly one of the workers wrote the trial, and they never held the lock together.
+        assert len(errors) == 1
+        assert max_counter[0] == 1
+        assert backends[0].get_trial(trial_id=trial.trial_id) == trial
+        assert not list(study_dir.glob("*.lock*"))
+
+
+def test_get_trial_without_study_id() -> None:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        studies = [StudyInfo(study_id=uuid.uuid4().hex) for _ in range(3)]
+        trial = Trial(trial_id=uuid.uuid4().hex, study_id=studies[1].study_id)
+        writer = PosixStorageBackend(root_dir=tmpdir)
+        for study in studies:
+            writer.write_study(study=study)
+        writer.write_trial(trial=trial)
+        assert writer.get_trial(trial_id=trial.trial_id).study_id == trial.study_id
+        # Other instances find the trial by scanning the studies and remember it.
+        reader = PosixStorageBackend(root_dir=tmpdir)
+        assert reader.get_trial(trial_id=trial.trial_id).study_id == trial.study_id
+        assert reader.get_trial(trial_id=trial.trial_id).study_id == trial.study_id
+        with pytest.raises(NotFoundError):
+            reader.get_trial(trial_id=uuid.uuid4().hex)
@@ -0,0 +1,89 @@
+import uuid
+from unittest.mock import MagicMock
+
+import pytest
+
+from optur.proto.study_pb2 import StudyInfo, Trial
+from optur.storages import BufferedStorageClient, create_inmemory_storage
+
+
+def test_buffered_client_coalesces_writes() -> None:
+    storage = create_inmemory_storage()
+    study = StudyInfo(study_id=uuid.uuid4().hex)
+    storage.write_study(study=study)
+    client = BufferedStorageClient(client=storage, max_buffered_trials=10, max_delay=60.0)
+    trial = Trial(trial_id=uuid.uuid4().hex, study_id=study.study_id)
+    for i in range(5):
+        trial.user_attrs["step"].int_value = i
+        client.write_trial(trial=trial)
+    assert storage.get_trials(study_id=study.study_id) == []
+    storage.write_trials = MagicMock(wraps=storage.write_trials)  # type: ignore
+    client.flush()
+    (loaded_trial,) = storage.get_trials(study_id=study.study_id)
+    assert loaded_trial.user_attrs["step"].int_value == 4
+    # All writes are coalesced into a single write.
+    _, kwargs = storage.write_trials.call_args
+    assert len(kwargs["trials"]) == 1
+
+
+def test_buffered_client_keeps_trials_on_write_errors() -> None:
+    storage = create_inmemory_storage()
+    study = StudyInfo(study_id=uuid.uuid4().hex)
+    storage.write_study(study=study)
+    client = BufferedStorageClient(client=storage, max_buffered_trials=10, max_delay=60.0)
+    trial = Trial(trial_id=uuid.uuid4().hex, study_id=study.study_id)
+    client.write_trial(trial=trial)
+    write_trials = storage.write_trials
+    storage.write_trials = MagicMock(side_effect=RuntimeError())  # type: ignore
+    with pytest.raises(RuntimeError):
+        client.flush()
+    storage.write_trials = write_trials  # type: ignore
+    client.flush()
+    assert [t.trial_id for t in storage.get_trials(study_id=study.study_id)] == [trial.trial_id]
+
+
+def test_buffered_client_flushes_on_budget() -> None:
+    storage = create_inmemory_storage()
+    study = StudyInfo(study_id=uuid.uuid4().hex)
+    storage.write_study(study=study)
+    trials = [Trial(trial_id=uuid.uuid4().hex, study_id=study.study_id) for _ in range(3)]
+    client = BufferedStorageClient(client=storage, max_buffered_trials=3, max_delay=60.0)
+    for trial in trials[:2]:
+        client.write_trial(trial=trial)
+    assert storage.get_trials(study_id=study.study_id) == []
+    client.write_trial(trial=trials[2])
+    assert len(storage.get_trials(study_id=study.study_id)) == 3
+
+    client = BufferedStorageClient(client=storage, max_buffered_trials=3, max_delay=0.0)
+    trial = Trial(trial_id=uuid.uuid4().hex, study_id=study.study_id)
+    client.write_trial(trial=trial)
+    assert storage.get_trial(trial_id=trial.trial_id).trial_id == trial.trial_id
+
+
+def test_buffered_client_flushes_finished_trials() -> None:
+    storage = create_inmemory_storage()
+    study = StudyInfo(study_id=uuid.uuid4().hex)
+    storage.write_study(study=study)
+    client = BufferedStorageClient(client=storage, max_buffered_trials=10, max_delay=60.0)
+    running_trial = Trial(
+        trial_id=uuid.uuid4().hex, study_id=study.study_id, last_known_state=Trial.State.RUNNING
+    )
+    completed_trial = Trial(
+        trial_id=uuid.uuid4().hex, study_id=study.study_id, last_known_state=Trial.State.COMPLETED
+    )
+    client.write_trial(trial=running_trial)
+    client.write_trial(trial=completed_trial)
+    assert {t.trial_id for t in storage.get_trials(study_id=study.study_id)} == {
+        running_trial.trial_id,
+        completed_trial.trial_id,
+    }
+
+
+def test_buffered_client_flushes_before_reads() -> None:
+    storage = create_inmemory_storage()
+    study = StudyInfo(study_id=uuid.uuid4().hex)
+    storage.write_study(study=study)
+    client = BufferedStorageClient(client=storage, max_buffered_trials=10, max_delay=60.0)
+    trial = Trial(trial_id=uuid.uuid4().hex, study_id=study.study_id)
+    client.write_trial(trial=trial)
+    assert [t.trial_id for t in client.get_trials(study_id=study.study_id)] == [trial.trial_id]
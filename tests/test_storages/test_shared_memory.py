@@ -0,0 +1,62 @@
+import uuid
+
+import pytest
+
+from optur.proto.study_pb2 import AttributeValue, Trial
+from optur.storages.shared_memory import SharedTrialLog
+
+# Python 3.7 does not have `multiprocessing.shared_memory`.
+pytest.importorskip("multiprocessing.shared_memory")
+
+
+def test_append_and_read_trials() -> None:
+    log = SharedTrialLog.create(size=4096, max_records=16)
+    try:
+        trials = [
+            Trial(
+                trial_id=uuid.uuid4().hex,
+                system_attrs={"foo": AttributeValue(int_value=idx)},
+            )
+            for idx in range(5)
+        ]
+        assert log.n_records == 0
+        assert log.append(trials[:2])
+        assert log.append([])
+        assert log.append(trials[2:])
+        reader = SharedTrialLog.attach(name=log.name)
+        try:
+            assert reader.n_records == 5
+            assert reader.read(begin=0, end=5) == trials
+            assert reader.read(begin=2, end=4) == trials[2:4]
+            assert reader.read(begin=3, end=3) == []
+        finally:
+            reader.close()
+    finally:
+        log.unlink()
+
+
+def test_append_to_full_log() -> None:
+    log = SharedTrialLog.create(size=4096, max_records=3)
+    try:
+        trials = [Trial(trial_id=uuid.uuid4().hex) for _ in range(4)]
+        assert log.append(trials[:2])
+        assert not log.append(trials[2:])
+        assert log.n_records == 2
+        assert log.append(trials[2:3])
+        assert log.read(begin=0, end=3) == trials[:3]
+    finally:
+        log.unlink()
+
+
+def test_append_too_large_trials() -> None:
+    log = SharedTrialLog.create(size=256, max_records=3)
+    try:
+        assert not log.append([Trial(trial_id="x" * 256)])
+        assert log.n_records == 0
+    finally:
+        log.unlink()
+
+
+def test_create_too_small_log() -> None:
+    with pytest.raises(ValueError):
+        SharedTrialLog.create(size=64, max_records=16)
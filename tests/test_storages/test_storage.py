@@ -0,0 +1,472 @@
+import asyncio
+import concurrent.futures
+import sys
+import tempfile
+import threading
+import uuid
+from threading import Thread
+
+import pytest
+from google.protobuf.timestamp_pb2 import Timestamp
+
+from optur.errors import ConflictError
+from optur.proto import storage_pb2
+from optur.proto.study_pb2 import StudyInfo, Trial
+from optur.storages import (
+    AsyncStorage,
+    SharedTrialLogClient,
+    Storage,
+    StorageClient,
+    create_inmemory_storage,
+    create_posix_storage,
+)
+from optur.storages.backends.inmemory import InMemoryStorageBackend
+
+requires_shared_memory = pytest.mark.skipif(
+    sys.version_info < (3, 8), reason="multiprocessing.shared_memory requires Python 3.8."
+)
+
+
+def test_execute_batch() -> None:
+    storage = create_inmemory_storage()
+    study = StudyInfo(study_id=uuid.uuid4().hex)
+    trial = Trial(trial_id=uuid.uuid4().hex, study_id=study.study_id)
+    replies = storage.execute_batch(
+        [
+            storage_pb2.Request(write_study=storage_pb2.WriteStudyRequest(study_info=study)),
+            storage_pb2.Request(write_trial=storage_pb2.WriteTrialRequest(trial=trial)),
+            storage_pb2.Request(get_current_timestamp=storage_pb2.GetCurrentTimestampRequest()),
+            storage_pb2.Request(
+                get_trials=storage_pb2.GetTrialsRequest(
+                    study_id=storage_pb2.OptionalID(string_value=study.study_id)
+                )
+            ),
+        ]
+    )
+    assert [reply.WhichOneof("reply") for reply in replies] == [
+        "write_study",
+        "write_trial",
+        "get_current_timestamp",
+        "get_trials",
+    ]
+    assert [t.trial_id for t in replies[3].get_trials.trials] == [trial.trial_id]
+
+
+def test_client_execute_batch() -> None:
+    storage = create_inmemory_storage()
+    study = StudyInfo(study_id=uuid.uuid4().hex)
+    trials = [Trial(trial_id=uuid.uuid4().hex, study_id=study.study_id) for _ in range(3)]
+    storage.write_study(study=study)
+    client = storage.create_client(thread_id=1)
+    thread = Thread(target=storage.run, daemon=True)
+    thread.start()
+    try:
+        replies = client.execute_batch(
+            [
+                storage_pb2.Request(write_trial=storage_pb2.WriteTrialRequest(trial=trial))
+                for trial in trials
+            ]
+            + [
+                storage_pb2.Request(
+                    get_trials=storage_pb2.GetTrialsRequest(
+                        study_id=storage_pb2.OptionalID(string_value=study.study_id)
+                    )
+                )
+            ]
+        )
+    finally:
+        storage.stop()
+        thread.join()
+    assert len(replies) == 4
+    assert {t.trial_id for t in replies[-1].get_trials.trials} == {t.trial_id for t in trials}
+
+
+def test_client_execute_batch_rejects_stop() -> None:
+    storage = create_inmemory_storage()
+    client = storage.create_client(thread_id=1)
+    thread = Thread(target=storage.run, daemon=True)
+    thread.start()
+    try:
+        replies = client.execute_batch(
+            [
+                storage_pb2.Request(stop=True),
+                storage_pb2.Request(
+                    get_current_timestamp=storage_pb2.GetCurrentTimestampRequest()
+                ),
+            ]
+        )
+        assert [reply.WhichOneof("reply") for reply in replies] == [
+            None,
+            "get_current_timestamp",
+        ]
+        # The storage keeps serving the client.
+        client.get_current_timestamp()
+    finally:
+        storage.stop()
+        thread.join()
+
+
+def _sync_trials(
+    client: StorageClient, study_id: str, reply: storage_pb2.SyncTrialsReply
+) -> storage_pb2.SyncTrialsReply:
+    """Sync trials with the cursor and the timestamp of the last reply."""
+    (new_reply,) = client.execute_batch(
+        [
+            storage_pb2.Request(
+                sync_trials=storage_pb2.SyncTrialsRequest(
+                    study_id=study_id,
+                    cursor=reply.cursor,
+                    timestamp=reply.timestamp if reply.HasField("timestamp") else None,
+                )
+            )
+        ]
+    )
+    return new_reply.sync_trials
+
+
+def test_sync_trials_sends_only_changed_trials() -> None:
+    storage = create_inmemory_storage()
+    study = StudyInfo(study_id=uuid.uuid4().hex)
+    trials = [Trial(trial_id=uuid.uuid4().hex, study_id=study.study_id) for _ in range(5)]
+    storage.write_study(study=study)
+    client1 = storage.create_client(thread_id=1)
+    client2 = storage.create_client(thread_id=2)
+    thread = Thread(target=storage.run, daemon=True)
+    thread.start()
+    try:
+        for trial in trials[:3]:
+            client1.write_trial(trial=trial)
+        reply = _sync_trials(client1, study.study_id, storage_pb2.SyncTrialsReply())
+        assert {t.trial_id for t in reply.trials} == {t.trial_id for t in trials[:3]}
+        assert not reply.unchanged
+        # Trials read by the last sync are not sent again.
+        reply = _sync_trials(client1, study.study_id, reply)
+        assert reply.unchanged
+        assert list(reply.trials) == []
+        for trial in trials[3:]:
+            client1.write_trial(trial=trial)
+        updated_trial = Trial()
+        updated_trial.CopyFrom(trials[0])
+        updated_trial.last_known_state = Trial.State.COMPLETED
+        client1.write_trial(trial=updated_trial)
+        new_reply = _sync_trials(client1, study.study_id, reply)
+        assert {t.trial_id for t in new_reply.trials} == {
+            t.trial_id for t in [trials[0], trials[3], trials[4]]
+        }
+        # Each client has its own cursor.
+        reply2 = _sync_trials(client2, study.study_id, storage_pb2.SyncTrialsReply())
+        assert len(reply2.trials) == 5
+        # Without the latest cursor, trials are sent by the timestamp.
+        old_reply = _sync_trials(client1, study.study_id, reply)
+        assert {t.trial_id for t in new_reply.trials} <= {t.trial_id for t in old_reply.trials}
+    finally:
+        storage.stop()
+        thread.join()
+
+
+def test_sync_trials_of_storage_without_timestamps() -> None:
+    storage = create_inmemory_storage()
+    study = StudyInfo(study_id=uuid.uuid4().hex)
+    trials = [Trial(trial_id=uuid.uuid4().hex, study_id=study.study_id) for _ in range(3)]
+    storage.write_study(study=study)
+    # Trials are always read from the beginning.
+    storage.get_current_timestamp = lambda: None  # type: ignore
+    for trial in trials[:2]:
+        storage.write_trial(trial=trial)
+    reply = _sync_trials(storage, study.study_id, storage_pb2.SyncTrialsReply())
+    assert len(reply.trials) == 2
+    assert not reply.HasField("timestamp")
+    storage.write_trial(trial=trials[2])
+    reply = _sync_trials(storage, study.study_id, reply)
+    assert [t.trial_id for t in reply.trials] == [trials[2].trial_id]
+
+
+@requires_shared_memory
+def test_shared_trial_log_client() -> None:
+    storage = create_inmemory_storage()
+    study = StudyInfo(study_id=uuid.uuid4().hex)
+    trials = [Trial(trial_id=uuid.uuid4().hex, study_id=study.study_id) for _ in range(5)]
+    storage.write_study(study=study)
+    log_name = storage.create_shared_trial_log(study_id=study.study_id, size=1024 * 1024)
+    assert log_name is not None
+    client = SharedTrialLogClient(
+        client=storage.create_client(thread_id=1), study_id=study.study_id, log_name=log_name
+    )
+    thread = Thread(target=storage.run, daemon=True)
+    thread.start()
+    try:
+        for trial in trials[:3]:
+            client.write_trial(trial=trial)
+        timestamp = client.get_current_timestamp()
+        assert {t.trial_id for t in client.get_trials(study_id=study.study_id)} == {
+            t.trial_id for t in trials[:3]
+        }
+        updated_trial = Trial()
+        updated_trial.CopyFrom(trials[0])
+        updated_trial.last_known_state = Trial.State.COMPLETED
+        client.write_trial(trial=updated_trial)
+        for trial in trials[3:]:
+            client.write_trial(trial=trial)
+        loaded_trials = client.get_trials(study_id=study.study_id, timestamp=timestamp)
+        assert {t.trial_id for t in trials[3:]} | {trials[0].trial_id} <= {
+            t.trial_id for t in loaded_trials
+        }
+        updated_trials = [t for t in loaded_trials if t.trial_id == trials[0].trial_id]
+        assert [t.last_known_state for t in updated_trials] == [Trial.State.COMPLETED]
+        assert len(client.get_trials(study_id=study.study_id)) == 5
+        _, reply = client.execute_batch(
+            [
+                storage_pb2.Request(
+                    get_current_timestamp=storage_pb2.GetCurrentTimestampRequest()
+                ),
+                storage_pb2.Request(
+                    get_trials=storage_pb2.GetTrialsRequest(
+                        study_id=storage_pb2.OptionalID(string_value=study.study_id),
+                        timestamp=timestamp,
+                    )
+                ),
+            ]
+        )
+        assert {t.trial_id for t in loaded_trials} == {t.trial_id for t in reply.get_trials.trials}
+        client.close()
+        # The log is attached again.
+        assert len(client.get_trials(study_id=study.study_id)) == 5
+        client.close()
+    finally:
+        storage.stop()
+        thread.join()
+        storage.close_shared_trial_logs()
+
+
+@requires_shared_memory
+def test_shared_trial_log_client_answers_sync_trials() -> None:
+    storage = create_inmemory_storage()
+    study = StudyInfo(study_id=uuid.uuid4().hex)
+    trials = [Trial(trial_id=uuid.uuid4().hex, study_id=study.study_id) for _ in range(4)]
+    storage.write_study(study=study)
+    log_name = storage.create_shared_trial_log(study_id=study.study_id, size=1024 * 1024)
+    assert log_name is not None
+    client = SharedTrialLogClient(
+        client=storage.create_client(thread_id=1), study_id=study.study_id, log_name=log_name
+    )
+    thread = Thread(target=storage.run, daemon=True)
+    thread.start()
+    try:
+        for trial in trials[:2]:
+            client.write_trial(trial=trial)
+        reply = _sync_trials(client, study.study_id, storage_pb2.SyncTrialsReply())
+        assert {t.trial_id for t in reply.trials} == {t.trial_id for t in trials[:2]}
+        assert reply.HasField("timestamp")
+        # The log has no cursor.
+        assert reply.cursor == 0
+        for trial in trials[2:]:
+            client.write_trial(trial=trial)
+        reply = _sync_trials(client, study.study_id, reply)
+        assert {t.trial_id for t in trials[2:]} <= {t.trial_id for t in reply.trials}
+        client.close()
+    finally:
+        storage.stop()
+        thread.join()
+        storage.close_shared_trial_logs()
+
+
+@requires_shared_memory
+def test_shared_trial_log_client_falls_back_to_get_trials() -> None:
+    storage = create_inmemory_storage()
+    study = StudyInfo(study_id=uuid.uuid4().hex)
+    trials = [Trial(trial_id=uuid.uuid4().hex, study_id=study.study_id) for _ in range(5)]
+    storage.write_study(study=study)
+    # The log is too small to store all trials.
+    log_name = storage.create_shared_trial_log(study_id=study.study_id, size=2048)
+    assert log_name is not None
+    client = SharedTrialLogClient(
+        client=storage.create_client(thread_id=1), study_id=study.study_id, log_name=log_name
+    )
+    thread = Thread(target=storage.run, daemon=True)
+    thread.start()
+    try:
+        for trial in trials:
+            client.write_trial(trial=trial)
+        assert len(client.get_trials(study_id=study.study_id)) == 5
+    finally:
+        storage.stop()
+        thread.join()
+        storage.close_shared_trial_logs()
+
+
+def test_client_write_trials() -> None:
+    storage = create_inmemory_storage()
+    study = StudyInfo(study_id=uuid.uuid4().hex)
+    trials = [Trial(trial_id=uuid.uuid4().hex, study_id=study.study_id) for _ in range(3)]
+    storage.write_study(study=study)
+    client = storage.create_client(thread_id=1)
+    thread = Thread(target=storage.run, daemon=True)
+    thread.start()
+    try:
+        client.write_trials(trials=trials)
+        loaded_trials = client.get_trials(study_id=study.study_id)
+    finally:
+        storage.stop()
+        thread.join()
+    assert {t.trial_id for t in loaded_trials} == {t.trial_id for t in trials}
+
+
+def test_client_compare_and_write_trial() -> None:
+    storage = create_inmemory_storage()
+    study = StudyInfo(study_id=uuid.uuid4().hex)
+    trial = Trial(trial_id=uuid.uuid4().hex, study_id=study.study_id)
+    storage.write_study(study=study)
+    client = storage.create_client(thread_id=1)
+    thread = Thread(target=storage.run, daemon=True)
+    thread.start()
+    try:
+        client.compare_and_write_trial(trial=trial, expected=None)
+        stored_trial = client.get_trial(trial_id=trial.trial_id)
+        trial.last_known_state = Trial.State.COMPLETED
+        client.compare_and_write_trial(trial=trial, expected=stored_trial)
+        with pytest.raises(ConflictError):
+            client.compare_and_write_trial(trial=trial, expected=stored_trial)
+        with pytest.raises(ConflictError):
+            client.compare_and_write_trial(trial=trial, expected=None)
+    finally:
+        storage.stop()
+        thread.join()
+
+
+@pytest.mark.parametrize("use_multiprocess", [True, False])
+def test_client_read_write_trials(use_multiprocess: bool) -> None:
+    storage = create_inmemory_storage()
+    study = StudyInfo(study_id=uuid.uuid4().hex)
+    trials = [Trial(trial_id=uuid.uuid4().hex, study_id=study.study_id) for _ in range(3)]
+    storage.write_study(study=study)
+    clients = [
+        storage.create_client(thread_id=idx + 1, use_multiprocess=use_multiprocess)
+        for idx in range(2)
+    ]
+    thread = Thread(target=storage.run, daemon=True)
+    thread.start()
+    try:
+        for trial in trials:
+            clients[0].write_trial(trial=trial)
+        timestamp = clients[1].get_current_timestamp()
+        assert timestamp is not None
+        loaded_trials = clients[1].get_trials(study_id=study.study_id)
+        assert {t.trial_id for t in loaded_trials} == {t.trial_id for t in trials}
+        assert clients[1].get_trial(trial_id=trials[0].trial_id).trial_id == trials[0].trial_id
+        assert [s.study_id for s in clients[0].get_studies()] == [study.study_id]
+    finally:
+        storage.stop()
+        thread.join()
+
+
+def test_clients_for_threads_and_processes_are_not_served_together() -> None:
+    storage = create_inmemory_storage()
+    storage.create_client(thread_id=1, use_multiprocess=False)
+    with pytest.raises(ValueError):
+        storage.create_client(thread_id=2, use_multiprocess=True)
+    thread = Thread(target=storage.run, daemon=True)
+    thread.start()
+    storage.stop()
+    thread.join()
+    # Clients of the other kind can be created after `run` returns.
+    client = storage.create_client(thread_id=2, use_multiprocess=True)
+    thread = Thread(target=storage.run, daemon=True)
+    thread.start()
+    try:
+        assert client.get_current_timestamp() is not None
+    finally:
+        storage.stop()
+        thread.join()
+
+
+class _BarrierBackend(InMemoryStorageBackend):
+    def __init__(self, barrier: threading.Barrier) -> None:
+        super().__init__()
+        self._barrier = barrier
+
+    def get_current_timestamp(self) -> Timestamp:
+        # Fails unless another handler calls this method at the same time.
+        self._barrier.wait(timeout=5)
+        return super().get_current_timestamp()
+
+
+@pytest.mark.timeout(10)
+@pytest.mark.parametrize("use_multiprocess", [True, False])
+def test_handlers_handle_requests_in_parallel(use_multiprocess: bool) -> None:
+    barrier = threading.Barrier(2)
+    storage = Storage(
+        backend=InMemoryStorageBackend(),
+        n_handlers=2,
+        backend_factory=lambda: _BarrierBackend(barrier=barrier),
+    )
+    clients = [
+        storage.create_client(thread_id=idx + 1, use_multiprocess=use_multiprocess)
+        for idx in range(2)
+    ]
+    thread = Thread(target=storage.run, daemon=True)
+    thread.start()
+    try:
+        threads = [Thread(target=client.get_current_timestamp) for client in clients]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert not barrier.broken
+    finally:
+        storage.stop()
+        thread.join()
+
+
+@pytest.mark.timeout(10)
+def test_thread_safe_async_storage_runs_calls_in_parallel() -> None:
+    barrier = threading.Barrier(2)
+    storage = AsyncStorage(
+        storage=Storage(backend=_BarrierBackend(barrier=barrier)),
+        executor=concurrent.futures.ThreadPoolExecutor(max_workers=2),
+        thread_safe=True,
+    )
+
+    async def _run() -> None:
+        await asyncio.gather(storage.get_current_timestamp(), storage.get_current_timestamp())
+
+    try:
+        asyncio.run(_run())
+    finally:
+        storage.shutdown()
+    assert not barrier.broken
+
+
+@pytest.mark.timeout(10)
+def test_handlers_keep_the_order_of_writes() -> None:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        storage = create_posix_storage(tmpdir, n_handlers=4)
+        study = StudyInfo(study_id=uuid.uuid4().hex)
+        storage.write_study(study=study)
+        clients = [storage.create_client(thread_id=idx + 1) for idx in range(4)]
+
+        def _write_trials(client: StorageClient) -> None:
+            for _ in range(10):
+                trial = Trial(trial_id=uuid.uuid4().hex, study_id=study.study_id)
+                client.write_trial(trial=trial)
+                trial.last_known_state = Trial.State.COMPLETED
+                client.write_trial(trial=trial)
+
+        thread = Thread(target=storage.run, daemon=True)
+        thread.start()
+        try:
+            threads = [Thread(target=_write_trials, args=(client,)) for client in clients]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            trials = clients[0].get_trials(study_id=study.study_id)
+        finally:
+            storage.stop()
+            thread.join()
+        assert len(trials) == 40
+        assert all(t.last_known_state == Trial.State.COMPLETED for t in trials)
+
+
+def test_multiple_handlers_require_backend_factory() -> None:
+    with pytest.raises(ValueError):
+        Storage(backend=InMemoryStorageBackend(), n_handlers=2)
@@ -1,28 +1,61 @@
 import math
 import uuid
-from typing import Any
+from typing import Any, List, Sequence
 from unittest.mock import MagicMock, call
 
 import pytest
 from google.protobuf.timestamp_pb2 import Timestamp
 
 from optur.errors import PrunedException
+from optur.proto import storage_pb2
 from optur.proto.sampler_pb2 import RandomSamplerConfig, SamplerConfig
 from optur.proto.search_space_pb2 import ParameterValue
 from optur.proto.study_pb2 import ObjectiveValue, StudyInfo
 from optur.proto.study_pb2 import Trial as TrialProto
 from optur.proto.study_pb2 import WorkerID
+from optur.samplers import create_random_sampler
 from optur.samplers.sampler import JointSampleResult
+from optur.storages import create_inmemory_storage
 from optur.study import (
+    SyncStats,
     _ask,
+    _ask_batch,
     _infer_trial_state_from_objective_values,
     _optimize,
     _run_trial,
     _run_trials,
     _value_to_objective_value,
+    create_study,
 )
 
 
+def _create_storage_mock() -> MagicMock:
+    """Create a storage mock that answers batched requests with its other methods."""
+    storage = MagicMock()
+
+    def execute_batch(requests: Sequence[storage_pb2.Request]) -> List[storage_pb2.Reply]:
+        replies = []
+        for request in requests:
+            # The mock has no cursor, so trials are fetched by the timestamp.
+            assert request.HasField("sync_trials")
+            timestamp = None
+            if request.sync_trials.HasField("timestamp"):
+                timestamp = request.sync_trials.timestamp
+            new_timestamp = storage.get_current_timestamp()
+            trials = storage.get_trials(study_id=request.sync_trials.study_id, timestamp=timestamp)
+            replies.append(
+                storage_pb2.Reply(
+                    sync_trials=storage_pb2.SyncTrialsReply(
+                        trials=trials, timestamp=new_timestamp, unchanged=not trials
+                    )
+                )
+            )
+        return replies
+
+    storage.execute_batch.side_effect = execute_batch
+    return storage
+
+
 def test_infer_trial_state_from_no_objective_values() -> None:
     assert _infer_trial_state_from_objective_values([]) == TrialProto.State.UNKNOWN
 
@@ -167,7 +200,7 @@ def test_valid_value_to_objective_value() -> None:
 
 def test_ask_sets_study_id() -> None:
     sampler = MagicMock()
-    storage = MagicMock()
+    storage = _create_storage_mock()
     sampler_timestamp = Timestamp(seconds=1234)
     storage_timestamp = Timestamp(seconds=2345)
     queue_timestamp = Timestamp(seconds=3456)
@@ -192,7 +225,7 @@ def test_ask_sets_study_id() -> None:
 
 def test_ask_sync_sampler() -> None:
     sampler = MagicMock()
-    storage = MagicMock()
+    storage = _create_storage_mock()
     sampler_timestamp = Timestamp(seconds=1234)
     storage_timestamp = Timestamp(seconds=2345)
     queue_timestamp = Timestamp(seconds=3456)
@@ -212,17 +245,16 @@ def test_ask_sync_sampler() -> None:
         trial_queue=trial_queue,
         worker_id=WorkerID(),
     )
-    assert any(
-        call(study_id=study_id, timestamp=sampler_timestamp) == c
-        for c in storage.get_trials.call_args_list
-    )
+    assert storage.get_trials.call_args_list == [
+        call(study_id=study_id, timestamp=sampler_timestamp)
+    ]
     assert sampler.sync.call_args_list == [call(trials=trials)]
     assert sampler.update_timestamp.call_args_list == [call(timestamp=storage_timestamp)]
 
 
 def test_ask_sync_trial_queue() -> None:
     sampler = MagicMock()
-    storage = MagicMock()
+    storage = _create_storage_mock()
     sampler_timestamp = Timestamp(seconds=1234)
     storage_timestamp = Timestamp(seconds=2345)
     queue_timestamp = Timestamp(seconds=3456)
@@ -242,17 +274,53 @@ def test_ask_sync_trial_queue() -> None:
         trial_queue=trial_queue,
         worker_id=WorkerID(),
     )
-    assert any(
-        call(study_id=study_id, timestamp=queue_timestamp) == c
-        for c in storage.get_trials.call_args_list
+    # Trials are fetched once from the older timestamp.
+    assert storage.get_trials.call_args_list == [
+        call(study_id=study_id, timestamp=sampler_timestamp)
+    ]
+    assert trial_queue.sync.call_args_list == [call(trials=trials)]
+    assert trial_queue.update_timestamp.call_args_list == [
+        call(timestamp=storage_timestamp, cursor=0)
+    ]
+
+
+def test_ask_fetches_all_trials_once_when_sampler_is_not_synced() -> None:
+    sampler = MagicMock()
+    storage = _create_storage_mock()
+    study_id = uuid.uuid4().hex
+    trials = [
+        TrialProto(trial_id=uuid.uuid4().hex, last_update_time=Timestamp(seconds=s))
+        for s in (1000, 4000)
+    ]
+    sampler.last_update_time = None
+    sampler.joint_sample.return_value = JointSampleResult(parameters={}, system_attrs={})
+    storage.get_current_timestamp.return_value = Timestamp(seconds=5000)
+    storage.get_trials.return_value = trials
+    trial_queue = MagicMock()
+    trial_queue.get_trial.return_value = None
+    trial_queue.last_update_time = Timestamp(seconds=3456)
+    sync_stats = SyncStats()
+    _ask(
+        study_info=StudyInfo(study_id=study_id),
+        sampler=sampler,
+        storage=storage,
+        trial_queue=trial_queue,
+        worker_id=WorkerID(),
+        sync_stats=sync_stats,
     )
+    assert storage.get_trials.call_args_list == [call(study_id=study_id, timestamp=None)]
+    assert storage.get_current_timestamp.call_count == 1
     assert trial_queue.sync.call_args_list == [call(trials=trials)]
-    assert trial_queue.update_timestamp.call_args_list == [call(timestamp=storage_timestamp)]
+    assert sampler.sync.call_args_list == [call(trials=trials)]
+    assert sync_stats.n_fetches == 1
+    assert sync_stats.n_fetched_trials == 2
+    # The trial queue already knows the first trial.
+    assert sync_stats.n_redundant_trials == 1
 
 
 def test_ask_calls_joint_sample() -> None:
     sampler = MagicMock()
-    storage = MagicMock()
+    storage = _create_storage_mock()
     sampler_timestamp = Timestamp(seconds=1234)
     storage_timestamp = Timestamp(seconds=2345)
     queue_timestamp = Timestamp(seconds=3456)
@@ -275,6 +343,59 @@ def test_ask_calls_joint_sample() -> None:
     assert len(sampler.joint_sample.call_args_list) == 1
 
 
+def test_ask_batch_syncs_once_and_writes_trials_at_once() -> None:
+    sampler = MagicMock()
+    storage = _create_storage_mock()
+    storage_timestamp = Timestamp(seconds=2345)
+    study_id = uuid.uuid4().hex
+    trials = [TrialProto(trial_id=uuid.uuid4().hex)]
+    sampler.last_update_time = Timestamp(seconds=1234)
+    sampler.joint_sample_batch.return_value = [
+        JointSampleResult(parameters={"foo": ParameterValue(int_value=i)}, system_attrs={})
+        for i in range(5)
+    ]
+    storage.get_current_timestamp.return_value = storage_timestamp
+    storage.get_trials.return_value = trials
+    trial_queue = MagicMock()
+    trial_queue.get_trials.return_value = []
+    trial_queue.last_update_time = Timestamp(seconds=3456)
+    asked_trials = _ask_batch(
+        study_info=StudyInfo(study_id=study_id),
+        sampler=sampler,
+        storage=storage,
+        trial_queue=trial_queue,
+        worker_id=WorkerID(),
+        n=5,
+    )
+    assert [t.suggest_parameter("foo").int_value for t in asked_trials] == list(range(5))
+    assert trial_queue.sync.call_args_list == [call(trials=trials)]
+    assert sampler.sync.call_args_list == [call(trials=trials)]
+    assert sampler.joint_sample_batch.call_args_list == [call(n=5)]
+    assert not sampler.joint_sample.called
+    assert len(storage.write_trials.call_args_list) == 1
+    _, kwargs = storage.write_trials.call_args_list[0]
+    written_trials = kwargs["trials"]
+    assert len(written_trials) == 5
+    assert all(t.last_known_state == TrialProto.State.RUNNING for t in written_trials)
+    assert all(t.study_id == study_id for t in written_trials)
+
+
+def test_ask_syncs_with_cursor_of_last_fetch() -> None:
+    storage = create_inmemory_storage()
+    study = create_study(storage=storage, sampler=create_random_sampler())
+    study.prefetch(n=2)
+    storage.execute_batch = MagicMock(wraps=storage.execute_batch)  # type: ignore
+    study.ask()
+    study.ask()
+    (first_requests,), _ = storage.execute_batch.call_args_list[0]
+    (second_requests,), _ = storage.execute_batch.call_args_list[1]
+    # `prefetch` syncs the trial queue as well, so `ask` can use the cursor.
+    assert first_requests[0].sync_trials.cursor != 0
+    assert second_requests[0].sync_trials.cursor != 0
+    assert study.sync_stats.n_fetches == 3
+    assert study.sync_stats.n_fetched_trials == 0
+
+
 def test_ask_uses_waiting_trial() -> None:
     # TODO(tsuzuku): Test this.
     pass
@@ -288,7 +409,7 @@ def test_ask_sets_worker_id() -> None:
 def test_run_trial_uses_joint_sample() -> None:
     objective = MagicMock()
     sampler = MagicMock()
-    storage = MagicMock()
+    storage = _create_storage_mock()
     queue = MagicMock()
     objective.return_value = 0.1
     sampler.last_update_time = None
@@ -322,7 +443,7 @@ def test_run_trial_uses_joint_sample() -> None:
 def test_run_trial_uses_waiting_trial() -> None:
     objective = MagicMock()
     sampler = MagicMock()
-    storage = MagicMock()
+    storage = _create_storage_mock()
     queue = MagicMock()
     objective.return_value = 0.1
     sampler.last_update_time = None
@@ -362,7 +483,7 @@ def test_run_trial_uses_waiting_trial() -> None:
 def test_run_trial_return_value_handling(values: Any, state: "TrialProto.State.ValueType") -> None:
     objective = MagicMock()
     sampler = MagicMock()
-    storage = MagicMock()
+    storage = _create_storage_mock()
     queue = MagicMock()
     sampler.last_update_time = None
     sampler.joint_sample.return_value = JointSampleResult(parameters={}, system_attrs={})
@@ -389,7 +510,7 @@ def test_run_trial_return_value_handling(values: Any, state: "TrialProto.State.V
 def test_run_trial_sets_pruned_state() -> None:
     objective = MagicMock()
     sampler = MagicMock()
-    storage = MagicMock()
+    storage = _create_storage_mock()
     queue = MagicMock()
     sampler.last_update_time = None
     sampler.joint_sample.return_value = JointSampleResult(parameters={}, system_attrs={})
@@ -416,7 +537,7 @@ def test_run_trial_sets_pruned_state() -> None:
 def test_run_trial_catch_and_sets_failed_state() -> None:
     objective = MagicMock()
     sampler = MagicMock()
-    storage = MagicMock()
+    storage = _create_storage_mock()
     queue = MagicMock()
     sampler.last_update_time = None
     sampler.joint_sample.return_value = JointSampleResult(parameters={}, system_attrs={})
@@ -443,7 +564,7 @@ def test_run_trial_catch_and_sets_failed_state() -> None:
 def test_run_trial_does_not_catch() -> None:
     objective = MagicMock()
     sampler = MagicMock()
-    storage = MagicMock()
+    storage = _create_storage_mock()
     queue = MagicMock()
     sampler.last_update_time = None
     sampler.joint_sample.return_value = JointSampleResult(parameters={}, system_attrs={})
@@ -466,7 +587,7 @@ def test_run_trial_does_not_catch() -> None:
 
 def test_run_trials_call_objective_multiple_times() -> None:
     objective = MagicMock()
-    storage = MagicMock()
+    storage = _create_storage_mock()
     storage.get_current_timestamp.return_value = None
     storage.get_trials.return_value = []
     _run_trials(
@@ -478,13 +599,14 @@ def test_run_trials_call_objective_multiple_times() -> None:
         n_trials=7,
         catch=(),
         callbacks=(),
+        buffer_writes=False,
     )
     assert len(objective.call_args_list) == 7
 
 
 def test_optimize_single_worker_sanity_check() -> None:
     objective = MagicMock()
-    storage = MagicMock()
+    storage = _create_storage_mock()
     storage.get_current_timestamp.return_value = None
     storage.get_trials.return_value = []
     _optimize(
@@ -499,6 +621,7 @@ def test_optimize_single_worker_sanity_check() -> None:
         catch=(),
         callbacks=(),
         use_multiprocess=False,
+        buffer_writes=False,
     )
     if len(objective.call_args_list) != 7:
         if not objective.call_args_list:
@@ -3,7 +3,7 @@ import uuid
 from google.protobuf.timestamp_pb2 import Timestamp
 
 from optur.proto.study_pb2 import Trial, WorkerID
-from optur.study import _TrialQueue
+from optur.study import _PRIORITY_KEY, _PriorityFIFO, _TrialQueue
 
 
 def test_initial_timestamp_is_none() -> None:
@@ -101,3 +101,131 @@ def test_update_enqueued_trials() -> None:
         trial.trial_id for trial in [waiting_trials[0], waiting_trials[2]]
     }
     assert queue.get_trial(state=Trial.State.WAITING) is None
+
+
+def test_put_trial() -> None:
+    worker_id = WorkerID(client_id=uuid.uuid4().hex)
+    queue = _TrialQueue(states=(Trial.State.WAITING,), worker_id=worker_id)
+    trial = Trial(
+        trial_id=uuid.uuid4().hex, last_known_state=Trial.State.WAITING, worker_id=worker_id
+    )
+    queue.put(trial)
+    assert queue.get_trial(state=Trial.State.WAITING) == trial
+    assert queue.get_trial(state=Trial.State.WAITING) is None
+
+
+def test_get_trials() -> None:
+    worker_id = WorkerID(client_id=uuid.uuid4().hex)
+    queue = _TrialQueue(states=(Trial.State.WAITING,), worker_id=worker_id)
+    waiting_trials = [
+        Trial(trial_id=uuid.uuid4().hex, last_known_state=Trial.State.WAITING, worker_id=worker_id)
+        for _ in range(3)
+    ]
+    queue.sync(waiting_trials)
+    trials = queue.get_trials(state=Trial.State.WAITING, n=2)
+    assert len(trials) == 2
+    trials += queue.get_trials(state=Trial.State.WAITING, n=2)
+    assert {trial.trial_id for trial in trials} == {trial.trial_id for trial in waiting_trials}
+    assert queue.get_trials(state=Trial.State.WAITING, n=2) == []
+
+
+def test_sync_ignores_taken_trials() -> None:
+    worker_id = WorkerID(client_id=uuid.uuid4().hex)
+    queue = _TrialQueue(states=(Trial.State.WAITING,), worker_id=worker_id)
+    trial = Trial(
+        trial_id=uuid.uuid4().hex, last_known_state=Trial.State.WAITING, worker_id=worker_id
+    )
+    queue.sync([trial])
+    assert queue.get_trial(state=Trial.State.WAITING) == trial
+    # An older fetch might include the trial before it's written as a running trial.
+    queue.sync([trial])
+    assert queue.get_trial(state=Trial.State.WAITING) is None
+
+
+def test_sync_forgets_taken_trials_in_other_states() -> None:
+    worker_id = WorkerID(client_id=uuid.uuid4().hex)
+    queue = _TrialQueue(states=(Trial.State.WAITING,), worker_id=worker_id)
+    trial = Trial(
+        trial_id=uuid.uuid4().hex, last_known_state=Trial.State.WAITING, worker_id=worker_id
+    )
+    queue.sync([trial])
+    assert queue.get_trial(state=Trial.State.WAITING) == trial
+    running_trial = Trial()
+    running_trial.CopyFrom(trial)
+    running_trial.last_known_state = Trial.State.RUNNING
+    queue.sync([running_trial])
+    assert not queue._taken
+    # The trial can be queued again, e.g., when it's re-enqueued as a waiting trial.
+    queue.sync([trial])
+    assert queue.get_trial(state=Trial.State.WAITING) == trial
+
+
+def _create_waiting_trial(worker_id: WorkerID, priority: int) -> Trial:
+    trial = Trial(
+        trial_id=uuid.uuid4().hex, last_known_state=Trial.State.WAITING, worker_id=worker_id
+    )
+    trial.system_attrs[_PRIORITY_KEY].int_value = priority
+    return trial
+
+
+def test_get_trial_in_priority_order() -> None:
+    worker_id = WorkerID(client_id=uuid.uuid4().hex)
+    queue = _TrialQueue(states=(Trial.State.WAITING,), worker_id=worker_id)
+    trials = [_create_waiting_trial(worker_id, priority) for priority in [0, 2, 1, 2, 0]]
+    queue.sync(trials)
+    popped = [queue.get_trial(state=Trial.State.WAITING) for _ in range(5)]
+    assert popped == [trials[1], trials[3], trials[2], trials[0], trials[4]]
+    assert queue.get_trial(state=Trial.State.WAITING) is None
+
+
+def test_updated_trials_keep_or_change_position() -> None:
+    worker_id = WorkerID(client_id=uuid.uuid4().hex)
+    queue = _TrialQueue(states=(Trial.State.WAITING,), worker_id=worker_id)
+    trials = [_create_waiting_trial(worker_id, 0) for _ in range(3)]
+    queue.sync(trials)
+    # Updates without priority changes keep the position.
+    updated_first = Trial()
+    updated_first.CopyFrom(trials[0])
+    updated_first.parameters["x"].value.int_value = 1
+    # Priority changes move the trial.
+    updated_last = _create_waiting_trial(worker_id, 1)
+    updated_last.trial_id = trials[2].trial_id
+    queue.sync([updated_first, updated_last])
+    popped = [queue.get_trial(state=Trial.State.WAITING) for _ in range(3)]
+    assert popped == [updated_last, updated_first, trials[1]]
+    assert queue.get_trial(state=Trial.State.WAITING) is None
+
+
+def test_sync_removes_trials_leaving_the_queue() -> None:
+    worker_id = WorkerID(client_id=uuid.uuid4().hex)
+    queue = _TrialQueue(states=(Trial.State.WAITING,), worker_id=worker_id)
+    trials = [_create_waiting_trial(worker_id, priority) for priority in [0, 1, 1]]
+    queue.sync(trials)
+    taken_trials = []
+    for trial in trials[:2]:
+        taken_trial = Trial()
+        taken_trial.CopyFrom(trial)
+        taken_trial.last_known_state = Trial.State.RUNNING
+        taken_trial.worker_id.thread_id = 1
+        taken_trials.append(taken_trial)
+    queue.sync(taken_trials)
+    # Entries of the trials taken by other workers do not pile up until they are popped.
+    fifo = queue._queues[Trial.State.WAITING]
+    assert fifo._heap == [-1]
+    assert list(fifo._deques[1]) == [trials[2].trial_id]
+    assert queue.get_trial(state=Trial.State.WAITING) == trials[2]
+    assert queue.get_trial(state=Trial.State.WAITING) is None
+    assert fifo._heap == []
+
+
+def test_priority_fifo_skips_removed_entries() -> None:
+    fifo = _PriorityFIFO()
+    for trial_id in ["a", "b", "c", "d"]:
+        fifo.push(trial_id=trial_id, priority=0)
+    fifo.remove(trial_id="a", priority=0)
+    fifo.push(trial_id="a", priority=0)
+    fifo.remove(trial_id="c", priority=0)
+    # The removed entries are kept until they are popped or outnumber the others.
+    assert len(fifo._deques[0]) == 5
+    assert [fifo.pop() for _ in range(4)] == ["b", "d", "a", None]
+    assert not fifo._removed
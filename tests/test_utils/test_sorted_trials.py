@@ -152,3 +152,81 @@ def test_sorted_trials_incrementally_sort_all_trials() -> None:
         assert sorted_trials.to_list() == list(
             sorted(trials[:right], key=lambda t: uuid.UUID(hex=t.trial_id).int)
         )
+
+
+def test_sorted_trials_generation() -> None:
+    sorted_trials = SortedTrials(
+        trial_filter=lambda t: True,
+        trial_key_generator=lambda t: uuid.UUID(hex=t.trial_id).int,
+        trial_comparator=None,
+    )
+    trials = [Trial(trial_id=uuid.uuid4().hex) for _ in range(10)]
+    assert sorted_trials.generation == 0
+    sorted_trials.sync(trials=trials)
+    assert sorted_trials.generation == 1
+    sorted_trials.sync(trials=[Trial(trial_id=trial.trial_id) for trial in trials])
+    assert sorted_trials.generation == 1
+    sorted_trials.sync(
+        trials=[Trial(trial_id=trials[0].trial_id, last_known_state=Trial.State.COMPLETED)]
+    )
+    assert sorted_trials.generation == 2
+
+
+def test_sorted_trials_replace_updated_trials() -> None:
+    sorted_trials = SortedTrials(
+        trial_filter=TrialQualityFilter(filter_unknown=True),
+        trial_key_generator=TrialKeyGenerator(
+            targets=[Target(direction=Target.Direction.MINIMIZE)]
+        ),
+        trial_comparator=None,
+    )
+    trials = [
+        Trial(trial_id=uuid.uuid4().hex, last_known_state=Trial.State.RUNNING) for _ in range(5)
+    ]
+    sorted_trials.sync(trials=trials)
+    completed_trials = [
+        Trial(
+            trial_id=trial.trial_id,
+            last_known_state=Trial.State.COMPLETED,
+            values=[ObjectiveValue(status=ObjectiveValue.Status.VALID, value=value)],
+        )
+        for trial, value in zip(trials[1:4], [0.3, 0.1, 0.2])
+    ]
+    sorted_trials.sync(trials=completed_trials)
+    assert sorted_trials.n_trials() == 5
+    assert [trial.trial_id for trial in sorted_trials.to_list()[:3]] == [
+        completed_trials[1].trial_id,
+        completed_trials[2].trial_id,
+        completed_trials[0].trial_id,
+    ]
+    assert {trial.trial_id for trial in sorted_trials.to_list()[3:]} == {
+        trials[0].trial_id,
+        trials[4].trial_id,
+    }
+    assert sorted_trials.keys.tolist() == [0.1, 0.2, 0.3, math.inf, math.inf]
+
+
+def test_sorted_trials_deduplicate_trials_in_a_sync() -> None:
+    sorted_trials = SortedTrials(
+        trial_filter=TrialQualityFilter(filter_unknown=True),
+        trial_key_generator=TrialKeyGenerator(
+            targets=[Target(direction=Target.Direction.MINIMIZE)]
+        ),
+        trial_comparator=None,
+    )
+
+    def _completed(value: float) -> Trial:
+        return Trial(
+            trial_id="a",
+            last_known_state=Trial.State.COMPLETED,
+            values=[ObjectiveValue(status=ObjectiveValue.Status.VALID, value=value)],
+        )
+
+    sorted_trials.sync(
+        trials=[Trial(trial_id="a", last_known_state=Trial.State.RUNNING), _completed(0.5)]
+    )
+    assert sorted_trials.keys.tolist() == [0.5]
+    sorted_trials.sync(trials=[_completed(0.7)])
+    assert [trial.trial_id for trial in sorted_trials.to_list()] == ["a"]
+    assert sorted_trials.n_trials() == 1
+    assert sorted_trials.keys.tolist() == [0.7]